@@ -0,0 +1,23 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app import database
+from app.core.readiness import startup_state
+
+router = APIRouter(prefix="/health", tags=["Health"])
+
+@router.get("/live", include_in_schema=False)
+async def liveness():
+    """
+    The process is up and serving its event loop. Never touches the database.
+    """
+    return {"status": "alive", "phase": startup_state.phase}
+
+@router.get("/ready", include_in_schema=False)
+async def readiness():
+    """
+    200 once the pool is connected and warm, migrations are applied and background
+    services are running; 503 while starting up or shutting down.
+    """
+    ready = startup_state.ready and database.pool is not None and not database.pool.is_closing()
+    body = {"status": "ready" if ready else startup_state.phase, **startup_state.stats()}
+    return JSONResponse(body, status_code=200 if ready else 503)
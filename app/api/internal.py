@@ -0,0 +1,20 @@
+import secrets
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from app.core.config import settings
+from app.core.metrics import render_prometheus
+
+router = APIRouter(prefix="/internal", tags=["Internal"])
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics(authorization: Optional[str] = Header(None)):
+    """
+    Prometheus scrape endpoint. Disabled (404) until METRICS_TOKEN is configured,
+    then scrapers must send it as a bearer token.
+    """
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest((authorization or "").encode(), f"Bearer {settings.METRICS_TOKEN}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
@@ -1,32 +1,156 @@
-from fastapi import APIRouter, Depends, Form, HTTPException
-from app.core.security import require_role
+from datetime import date, datetime, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, Form, HTTPException, Query, Request
+from app.api.v1.utils import fetch_counters
+from app.core.admission import admission_class, admission_stats
+from app.core.config import settings
+from app.core.hashing import password_hasher
+from app.core.revocation import revocations
+from app.core.security import auth_stats, principal_cache, require_role, revoke_tokens, token_cache
+from app.services import analytics, dispatch, geo
+from app.services.task_history import task_history
+from app.utils.pagination import parse_fields, stream_task_list
+from app.utils.response_cache import response_cache
 from app.database import execute_returning, fetch_one, fetch_all
 
 router = APIRouter(prefix="/dashboard", tags=["Admin_Dashboard"])
 
 @router.get("/admin/summary")
-async def admin_dashboard(current_user=Depends(require_role("ADMIN"))):
-    stats = {}
+@admission_class("admin_summary")
+async def admin_dashboard(request: Request, current_user=Depends(require_role("ADMIN"))):
+    async def build():
+        counters = await fetch_counters("users", "tasks")
+        users = counters["users"]
+        return {
+            "total_users": {"count": users.get("total", 0)},
+            "active_field_workers": {"count": users.get("active_field_workers", 0)},
+            "pending_approvals": {"count": users.get("pending_approvals", 0)},
+            "tasks_by_status": [
+                {"status": task_status, "count": count}
+                for task_status, count in counters["tasks"].items()
+            ],
+        }
+
+    # Same totals for every admin, so the entry is shared
+    return await response_cache.respond(request, "admin", ["users", "tasks"], build)
+
+def _analytics_range(start: Optional[date], end: Optional[date]):
+    end = end or datetime.utcnow().date() + timedelta(days=1)
+    start = start or end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if (end - start).days > settings.ANALYTICS_MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {settings.ANALYTICS_MAX_RANGE_DAYS} days")
+    return start, end
+
+@router.get("/analytics/tasks")
+async def admin_task_analytics(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    urgency: Optional[str] = None,
+    current_user=Depends(require_role("ADMIN"))
+):
+    """
+    Daily created/completed counts per urgency, average completion time and rating,
+    and completion-time percentiles for days [start, end) (default: last 30 days).
+    Read from the rollup tables, which trail live data by up to ANALYTICS_REFRESH_SECONDS.
+    """
+    start, end = _analytics_range(start, end)
+    return await analytics.task_analytics(start, end, urgency)
+
+@router.get("/analytics/workers")
+async def admin_worker_analytics(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    field_worker_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    current_user=Depends(require_role("ADMIN"))
+):
+    """
+    Per field worker: completions, average rating and completion-time percentiles
+    for days [start, end), busiest first.
+    """
+    start, end = _analytics_range(start, end)
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "workers": await analytics.worker_analytics(start, end, field_worker_id, limit),
+    }
+
+@router.get("/tasks")
+async def admin_list_tasks(
+    status: Optional[str] = None,
+    urgency: Optional[str] = None,
+    user_id: Optional[int] = None,
+    field_worker_id: Optional[int] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=settings.TASK_EXPORT_MAX_LIMIT),
+    include_archived: bool = False,
+    current_user=Depends(require_role("ADMIN"))
+):
+    """
+    List all service requests with optional filters, newest first.
+    The response is streamed, so large exports (high `limit`) keep memory flat.
+    Archived (old completed) tasks are included with `include_archived=true`.
+    """
+    filters = {"status": status, "urgency": urgency, "user_id": user_id, "field_worker_id": field_worker_id}
+    return stream_task_list(filters, parse_fields(fields), cursor, limit, include_archived)
+
+@router.get("/tasks/{task_id}/nearest-workers")
+async def nearest_workers_for_task(
+    task_id: int,
+    k: int = Query(10, ge=1, le=100),
+    max_km: float = Query(50.0, gt=0, le=500),
+    current_user=Depends(require_role("ADMIN"))
+):
+    """
+    The K closest approved, active field workers with spare capacity
+    (fewer than DISPATCH_MAX_OPEN_PER_WORKER open tasks), nearest first.
+    """
+    task = await fetch_one("SELECT id, latitude, longitude FROM service_requests WHERE id = $1", task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if task["latitude"] is None:
+        raise HTTPException(status_code=400, detail="Task has no coordinates")
 
-    stats["total_users"] = await fetch_one("SELECT COUNT(*) FROM users")
-    stats["active_field_workers"] = await fetch_one("SELECT COUNT(*) FROM users WHERE role = 'FIELD_WORKER' AND is_active = TRUE AND is_approved = TRUE")
-    stats["pending_approvals"] = await fetch_one("SELECT COUNT(*) FROM users WHERE role = 'FIELD_WORKER' AND is_approved = FALSE")
-    stats["tasks_by_status"] = await fetch_all("""
-        SELECT status, COUNT(*) FROM service_requests GROUP BY status
-    """)
+    workers = await geo.nearest_workers(
+        task["latitude"], task["longitude"], k, max_km, settings.DISPATCH_MAX_OPEN_PER_WORKER
+    )
+    return {"task_id": task_id, "workers": workers}
 
-    return stats
+@router.get("/admin/runtime-stats")
+async def admin_runtime_stats(current_user=Depends(require_role("ADMIN"))):
+    """
+    In-process counters for this app instance (cache hit/miss ratios etc.).
+    """
+    return {
+        "principal_cache": principal_cache.stats(),
+        "token_cache": token_cache.stats(),
+        "token_auth": {**auth_stats, **revocations.stats()},
+        "password_hashing": password_hasher.stats(),
+        "dispatch": dispatch.stats,
+        "geo": geo.stats,
+        "analytics": analytics.stats,
+        "response_cache": response_cache.stats(),
+        "admission": admission_stats(),
+        "task_history": task_history.stats(),
+    }
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from datetime import datetime
+from app.core.dependencies import db_transaction
 from app.core.security import require_role
-from app.database import fetch_one, execute_returning
+from app.database import fetch_one, fetch_all, execute_returning
+from app.schemas.task import TaskAssignmentBatch
+from app.services.broadcaster import publish_invalidation, publish_task_event, publish_task_events
 
 @router.put("/field-worker/{user_id}/approval")
 async def approve_or_reject_field_worker(
     user_id: int,
     approve: bool,
-    current_user=Depends(require_role("ADMIN"))
+    current_user=Depends(require_role("ADMIN")),
+    conn=Depends(db_transaction, scope="function")
 ):
     """
     Admin can approve or reject a field worker.
@@ -45,6 +169,8 @@ async def approve_or_reject_field_worker(
     )
     if not updated_user:
         raise HTTPException(status_code=500, detail="Failed to update approval status")
+    revoke_tokens(user_id)
+    await publish_invalidation("users")
 
 
     action = "approved" if approve else "rejected"
@@ -58,7 +184,8 @@ async def approve_or_reject_field_worker(
 async def assign_task_to_worker(
     task_id: int,
     field_worker_id: int,
-    current_user=Depends(require_role("ADMIN"))
+    current_user=Depends(require_role("ADMIN")),
+    conn=Depends(db_transaction, scope="function")
 ):
     # 1. Check if task exists
     task = await fetch_one("SELECT * FROM service_requests WHERE id = $1", task_id)
@@ -83,17 +210,95 @@ async def assign_task_to_worker(
 
     if not updated_task:
         raise HTTPException(status_code=500, detail="Failed to assign task")
+    await publish_task_event("assigned", updated_task, task["field_worker_id"])
+    await task_history.record_tasks(
+        "assigned", [updated_task], current_user["id"],
+        {task_id: task["status"]}, {task_id: task["field_worker_id"]},
+    )
 
     return {
         "message": f"Task {task_id} assigned to field worker {field_worker_id}",
         "task": dict(updated_task)
     }
 
+@router.put("/assign-tasks")
+async def assign_tasks_to_workers(
+    batch: TaskAssignmentBatch,
+    current_user=Depends(require_role("ADMIN"))
+):
+    """
+    Assign many tasks at once. Validation and the update are set-based, so the
+    query count stays at two no matter how many pairs are sent.
+    Returns one result per submitted pair.
+    """
+    task_ids = list({a.task_id for a in batch.assignments})
+    worker_ids = list({a.field_worker_id for a in batch.assignments})
+
+    # 1. Validate every task and worker in one round trip
+    found = await fetch_all(
+        """
+        SELECT 'task' AS kind, id, field_worker_id FROM service_requests WHERE id = ANY($1::int[])
+        UNION ALL
+        SELECT 'worker' AS kind, id, NULL FROM users
+        WHERE id = ANY($2::int[]) AND role='FIELD_WORKER' AND is_active=TRUE AND is_approved=TRUE
+        """,
+        task_ids, worker_ids
+    )
+    existing_tasks = {r["id"]: r["field_worker_id"] for r in found if r["kind"] == "task"}
+    valid_workers = {r["id"] for r in found if r["kind"] == "worker"}
+
+    results = []
+    pending = {}
+    for a in batch.assignments:
+        result = {"task_id": a.task_id, "field_worker_id": a.field_worker_id, "status": "error"}
+        if a.task_id not in existing_tasks:
+            result["detail"] = "Task not found"
+        elif a.field_worker_id not in valid_workers:
+            result["detail"] = "Field worker not found or not approved/active"
+        elif a.task_id in pending:
+            result["detail"] = "Task listed more than once"
+        else:
+            pending[a.task_id] = result
+        results.append(result)
+
+    # 2. Apply all valid assignments in one statement (and so one transaction);
+    #    the worker check is repeated so a concurrent deactivation is respected
+    if pending:
+        updated = await fetch_all(
+            """
+            UPDATE service_requests sr
+            SET field_worker_id = a.field_worker_id, status = 'ASSIGNED', updated_at = $3
+            FROM unnest($1::int[], $2::int[]) AS a(task_id, field_worker_id)
+            JOIN users u ON u.id = a.field_worker_id
+                AND u.role = 'FIELD_WORKER' AND u.is_active = TRUE AND u.is_approved = TRUE
+            WHERE sr.id = a.task_id
+            RETURNING sr.*
+            """,
+            list(pending), [r["field_worker_id"] for r in pending.values()], datetime.utcnow()
+        )
+        await publish_task_events("assigned", updated, existing_tasks)
+        await task_history.record_tasks("assigned", updated, current_user["id"], previous_field_worker_ids=existing_tasks)
+        updated_ids = {r["id"] for r in updated}
+        for task_id, result in pending.items():
+            if task_id in updated_ids:
+                result["status"] = "assigned"
+            else:
+                result["detail"] = "Task or field worker changed during assignment"
+
+    assigned = sum(1 for r in results if r["status"] == "assigned")
+    return {
+        "message": f"Assigned {assigned} of {len(results)} tasks",
+        "assigned": assigned,
+        "failed": len(results) - assigned,
+        "results": results
+    }
+
 @router.patch("/update-task-status/{task_id}")
 async def admin_update_task_status(
     task_id: int,
     status: str = Form(...),
-    current_user=Depends(require_role("ADMIN"))
+    current_user=Depends(require_role("ADMIN")),
+    conn=Depends(db_transaction, scope="function")
 ):
     """
     Admin can update any task status. Simple success-only response.
@@ -110,29 +315,30 @@ async def admin_update_task_status(
 
     # Update status
     completed_at = datetime.utcnow() if status == "COMPLETED" else None
-    await execute_returning(
+    updated_task = await execute_returning(
         """
         UPDATE service_requests
         SET status=$1, updated_at=$2, completed_at=$3
         WHERE id=$4
+        RETURNING *
         """,
         status, datetime.utcnow(), completed_at, task_id
     )
+    await publish_task_event("status_changed", updated_task)
+    await task_history.record_tasks("status_changed", [updated_task], current_user["id"], {task_id: task["status"]})
 
     return {"message": "Task status updated successfully"}
 
 import os
-from passlib.context import CryptContext
+from app.core.security import get_password_hash
 from app.database import execute
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 async def create_default_admin():
     admin_email = os.getenv("ADMIN_EMAIL", "admin@fieldops.com")
     admin_username = os.getenv("ADMIN_USERNAME", "admin")
     admin_password = os.getenv("ADMIN_PASSWORD", "admin123")
 
-    hashed_password = pwd_context.hash(admin_password)
+    hashed_password = await get_password_hash(admin_password)
 
     query = """
         INSERT INTO users (username, email, hashed_password, role, is_active, is_approved)
@@ -1,18 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from app.schemas.auth import Token
+from app.schemas.serializers import TrustedJSONResponse, user_encoder
 from app.schemas.user import UserCreate, UserOut
+from app.core.admission import admission_class
 from app.core.security import get_password_hash, create_access_token, verify_password
 from app.database import fetch_one, execute_returning
+from app.services.broadcaster import publish_invalidation
 from fastapi.security import OAuth2PasswordRequestForm  # 👈 ADD THIS LINE
 
 router = APIRouter()
+
+# read_at stamps the token: claims are as of this read, on the same clock as revocations
+LOGIN_SQL = "SELECT *, EXTRACT(EPOCH FROM clock_timestamp())::float8 AS read_at FROM users WHERE username = $1"
 from asyncpg.exceptions import UniqueViolationError
 from fastapi import HTTPException
 from asyncpg.exceptions import UniqueViolationError
 
 @router.post("/register", response_model=UserOut)
 async def register(user: UserCreate):
-    hashed_pw = get_password_hash(user.password)
+    hashed_pw = await get_password_hash(user.password)
     is_approved = False if user.role == "FIELD_WORKER" else True
     query = """
         INSERT INTO users (username, email, hashed_password, role, is_approved)
@@ -29,11 +35,10 @@ async def register(user: UserCreate):
         )
         if not db_user:
             raise HTTPException(status_code=400, detail="Registration failed")
+        await publish_invalidation("users")
 
-        # ✅ Convert Record -> dict
-        db_user = dict(db_user)
-
-        return db_user
+        # ✅ Encode the Record directly (only UserOut fields are emitted)
+        return TrustedJSONResponse(user_encoder.encode(db_user))
 
     except UniqueViolationError as e:
         if "users_username_key" in str(e):
@@ -44,8 +49,9 @@ async def register(user: UserCreate):
             detail = "Username or email already exists."
         raise HTTPException(status_code=409, detail=detail)
 @router.post("/login", response_model=Token)
+@admission_class("login")
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = await fetch_one("SELECT * FROM users WHERE username = $1", form_data.username)
+    user = await fetch_one(LOGIN_SQL, form_data.username)
 
     if not user:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
@@ -53,7 +59,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     # convert Record → dict
     user = dict(user)
 
-    if not verify_password(form_data.password, user["hashed_password"]):
+    if not await verify_password(form_data.password, user["hashed_password"]):
         raise HTTPException(status_code=400, detail="Incorrect username or password")
 
     if not user["is_active"]:
@@ -62,7 +68,11 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     if user["role"] == "FIELD_WORKER" and not user["is_approved"]:
         raise HTTPException(status_code=403, detail="Field worker not approved")
 
-    access_token = create_access_token(data={"sub": str(user["id"])})
+    access_token = create_access_token(data={
+        "sub": str(user["id"]),
+        "role": user["role"],
+        "approved": user["is_approved"],
+    }, issued_at=user["read_at"])
     return {"access_token": access_token, "token_type": "bearer"}
 
 
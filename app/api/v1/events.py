@@ -0,0 +1,64 @@
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.core.security import authenticate_token, get_current_user
+from app.services.broadcaster import broadcaster
+
+router = APIRouter(prefix="/events", tags=["Events"])
+
+@router.websocket("/ws")
+async def task_events_websocket(websocket: WebSocket, token: str = Query(...)):
+    """
+    Push task events over a WebSocket. Browsers can't set headers on WebSocket
+    requests, so the access token is passed as ?token=.
+    Users get their own tasks, field workers their assigned tasks, admins everything.
+    """
+    try:
+        user = await authenticate_token(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscriber = broadcaster.subscribe(user)
+    try:
+        while True:
+            event = await subscriber.get()
+            if event is None:
+                # Fell too far behind; the client should reconnect and resync
+                await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+                break
+            await websocket.send_text(event)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+@router.get("/stream")
+async def task_events_stream(current_user=Depends(get_current_user)):
+    """
+    Same events as /ws as Server-Sent Events, for clients that can't use WebSockets.
+    """
+    subscriber = broadcaster.subscribe(current_user)
+
+    async def generate():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.get(), settings.EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                if event is None:
+                    yield b"event: dropped\ndata: {}\n\n"
+                    break
+                yield f"event: task\ndata: {event}\n\n".encode()
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,9 +1,19 @@
-from fastapi import APIRouter, Depends, Form, HTTPException, status
-from app.api.v1.utils import save_task
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, UploadFile, status
+from app.api.v1.utils import fetch_counters, save_task
+from app.schemas.serializers import TrustedJSONResponse, service_request_encoder
 from app.schemas.task import ServiceRequestCreate, ServiceRequestOut
 from app.schemas.user import UserOut, UserCreate, UserUpdate, AdminUserUpdate
-from app.core.security import get_password_hash, require_role, get_current_user, require_any_role
+from app.core.security import get_password_hash, invalidate_principal, require_role, get_current_user, require_any_role
+from app.core.body_limit import body_limit
+from app.core.config import settings
+from app.core.dependencies import db_transaction
 from app.database import fetch_one, fetch_all, execute_returning
+from app.services.broadcaster import publish_invalidation, publish_task_event
+from app.utils.bulk_ingest import detect_format, ingest_service_requests
+from app.utils.pagination import parse_fields, stream_task_list
+from app.utils.response_cache import response_cache, task_tags
 
 # ✅ DEFINE THE ROUTER HERE
 router = APIRouter(prefix="/users", tags=["Users"])
@@ -19,7 +29,7 @@ async def update_field_worker_profile(
     user_id = current_user["id"]
 
     # Hash password if provided
-    hashed_password = get_password_hash(password) if password else None
+    hashed_password = await get_password_hash(password) if password else None
 
     query = """
         UPDATE users
@@ -33,6 +43,7 @@ async def update_field_worker_profile(
     updated_user = await execute_returning(query, username, email, hashed_password, user_id)
     if not updated_user:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_principal(user_id)
 
     return {"message": "Profile updated", "user": dict(updated_user)}
 @router.post("/", response_model=ServiceRequestOut, status_code=status.HTTP_201_CREATED)
@@ -42,34 +53,66 @@ async def create_task(task: ServiceRequestCreate, current_user=Depends(require_r
         title=task.title,
         description=task.description,
         location=task.location,
-        urgency=task.urgency
+        urgency=task.urgency,
+        latitude=task.latitude,
+        longitude=task.longitude
     )
     if not new_task:
         raise HTTPException(status_code=500, detail="Failed to create task")
-    return new_task
+    await publish_invalidation(*task_tags(current_user["id"]))
+    return TrustedJSONResponse(service_request_encoder.encode(new_task), status_code=status.HTTP_201_CREATED)
 
-@router.get("/summary")
-async def user_dashboard_summary(current_user=Depends(require_role("USER"))):
-    user_id = current_user["id"]
+@router.post("/bulk", status_code=status.HTTP_201_CREATED)
+@body_limit(settings.BULK_INGEST_MAX_BYTES)
+async def bulk_create_tasks(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    current_user=Depends(require_role("USER"))
+):
+    """
+    Create many service requests from an NDJSON or CSV file (columns/keys: title,
+    description, location, urgency). Rows are validated as they stream and loaded
+    with COPY in one transaction; invalid rows are skipped and reported by line.
+    """
+    fmt = detect_format(file, format)
+    result = await ingest_service_requests(file, current_user["id"], fmt)
+    if result["accepted"]:
+        await publish_invalidation(*task_tags(current_user["id"]))
+    return result
 
-    # Total tasks submitted by the user
-    total_tasks_record = await fetch_one("SELECT COUNT(*) AS count FROM service_requests WHERE user_id = $1", user_id)
-    total_tasks = total_tasks_record["count"] if total_tasks_record else 0
+@router.get("/tasks")
+async def list_my_tasks(
+    status: Optional[str] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=settings.TASK_LIST_MAX_LIMIT),
+    include_archived: bool = False,
+    current_user=Depends(require_role("USER"))
+):
+    """
+    List the user's own service requests, newest first.
+    Pass `next_cursor` back as `cursor` for the next page; `fields=id,title,status` trims columns.
+    Completed tasks older than the archive window are only listed with `include_archived=true`.
+    """
+    return stream_task_list(
+        {"user_id": current_user["id"], "status": status},
+        parse_fields(fields), cursor, limit, include_archived
+    )
 
-    # Tasks grouped by status
-    tasks_by_status_raw = await fetch_all("""
-        SELECT status, COUNT(*) AS count
-        FROM service_requests
-        WHERE user_id = $1
-        GROUP BY status
-    """, user_id)
+@router.get("/summary")
+async def user_dashboard_summary(request: Request, current_user=Depends(require_role("USER"))):
+    user_id = current_user["id"]
 
-    tasks_by_status = [{"status": r["status"], "count": r["count"]} for r in tasks_by_status_raw]
+    async def build():
+        # Per-status counters for this user, maintained by triggers on service_requests
+        counters = await fetch_counters("user_tasks", scope_id=user_id)
+        by_status = counters["user_tasks"]
+        return {
+            "total_tasks": sum(by_status.values()),
+            "tasks_by_status": [{"status": s, "count": c} for s, c in by_status.items()]
+        }
 
-    return {
-        "total_tasks": total_tasks,
-        "tasks_by_status": tasks_by_status
-    }
+    return await response_cache.respond(request, user_id, [f"tasks:user:{user_id}"], build)
     
     
     
@@ -77,7 +120,8 @@ async def user_dashboard_summary(current_user=Depends(require_role("USER"))):
 async def rate_completed_service(
     task_id: int,
     rating: int = Form(..., ge=1, le=5),
-    current_user=Depends(require_role("USER"))
+    current_user=Depends(require_role("USER")),
+    conn=Depends(db_transaction, scope="function")
 ):
     task = await fetch_one("SELECT * FROM service_requests WHERE id = $1 AND user_id = $2", task_id, current_user["id"])
     if not task:
@@ -86,7 +130,8 @@ async def rate_completed_service(
         raise HTTPException(status_code=400, detail="Cannot rate a task that is not completed")
 
     updated_task = await execute_returning(
-        "UPDATE service_requests SET rating = $1 WHERE id = $2 RETURNING *",
-        rating, task_id
+        "UPDATE service_requests SET rating = $1, updated_at = $2 WHERE id = $3 RETURNING *",
+        rating, datetime.utcnow(), task_id
     )
+    await publish_task_event("rated", updated_task)
     return {"message": "Rating updated", "task": dict(updated_task)}
\ No newline at end of file
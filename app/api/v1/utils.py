@@ -1,13 +1,31 @@
-from app.database import execute_returning, fetch_one
+from app.database import execute_returning, fetch_all, fetch_one
 
-async def save_task(user_id: int, title: str, description: str, location: str, urgency: str):
+async def save_task(user_id: int, title: str, description: str, location: str, urgency: str,
+                    latitude: float = None, longitude: float = None):
     """Create a new task for a user."""
     query = """
-        INSERT INTO service_requests (user_id, title, description, location, urgency)
-        VALUES ($1, $2, $3, $4, $5) RETURNING *
+        INSERT INTO service_requests (user_id, title, description, location, urgency, latitude, longitude)
+        VALUES ($1, $2, $3, $4, $5, $6, $7) RETURNING *
     """
-    task = await execute_returning(query, user_id, title, description, location, urgency)
-    if task:
-        return dict(task)
-    return None
+    return await execute_returning(query, user_id, title, description, location, urgency, latitude, longitude)
 
+# Global scopes are sharded over several slot rows (0013_sharded_counters.sql); sum them
+COUNTERS_SQL = """
+    SELECT scope, key, SUM(value)::bigint AS value
+    FROM stats_counters
+    WHERE scope = ANY($1::text[]) AND scope_id = $2
+    GROUP BY scope, key
+    HAVING SUM(value) > 0
+    ORDER BY scope, key
+"""
+
+async def fetch_counters(*scopes: str, scope_id: int = 0) -> dict:
+    """
+    Read materialized summary counters (see sql/migrations/0002_stats_counters.sql) in one round trip.
+    Returns {scope: {key: value}}; keys whose count dropped to zero are omitted.
+    """
+    rows = await fetch_all(COUNTERS_SQL, list(scopes), scope_id, use_replica=True)
+    counters = {scope: {} for scope in scopes}
+    for r in rows:
+        counters[r["scope"]][r["key"]] = r["value"]
+    return counters
@@ -1,17 +1,33 @@
 
 
+import json
+import os
 from datetime import datetime, timezone
 from asyncpg import UniqueViolationError
-from fastapi import APIRouter, Depends, File, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, Request, status
+from app import database
+from app.api.v1.utils import fetch_counters
+from app.core.admission import admission_class
+from app.core.body_limit import body_limit
 from app.schemas.task import ServiceRequestOut, ServiceRequestCreate, ServiceRequestStatusUpdate, TaskProofOut
-from app.core.security import get_password_hash, require_role
+from app.core.security import get_password_hash, require_role, revoke_tokens
 from app.database import execute_returning, fetch_all, fetch_one
-from app.schemas.user import UserCreate
+from app.schemas.serializers import TrustedJSONResponse, service_request_encoder
+from app.schemas.user import UserCreate, WorkerLocationUpdate
+from app.services.broadcaster import publish_invalidation, publish_task_event
+from app.services import proof_images
+from app.services.proof_images import VARIANTS
+from app.services.task_history import task_history
+from app.core.config import settings
+from app.utils.file_upload import discard_uploads, store_upload
+from app.utils.pagination import parse_fields, stream_task_list
+from app.utils.response_cache import response_cache
 
 router = APIRouter(prefix="/tasks", tags=["field_operations"])
 
 
-from fastapi import APIRouter, Depends, HTTPException, status, Form, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Form, UploadFile
+from fastapi.responses import FileResponse
 from typing import List, Optional
 from datetime import datetime
 from app.core.security import require_any_role
@@ -19,8 +35,26 @@ from app.database import fetch_one, fetch_all, execute_returning
 from app.schemas.task import ServiceRequestOut, ServiceRequestStatusUpdate, TaskProofOut
 
 
-@router.patch("/{task_id}/status", response_model=ServiceRequestOut)
+VALID_TRANSITIONS = {
+    "PENDING": ["ASSIGNED", "IN_PROGRESS"],
+    "ASSIGNED": ["IN_PROGRESS"],
+    "IN_PROGRESS": ["COMPLETED"],
+    "COMPLETED": []
+}
+
+
+def _check_transition(task, worker_id, allowed_from, new_status):
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if worker_id is not None and task["field_worker_id"] != worker_id:
+        raise HTTPException(status_code=403, detail="Task not assigned to you")
+    if task["status"] not in allowed_from:
+        raise HTTPException(status_code=400, detail=f"Invalid status transition from {task['status']} to {new_status}")
 
+
+@router.patch("/{task_id}/status", response_model=ServiceRequestOut)
+@admission_class("task_status")
+@body_limit(settings.MAX_PROOF_REQUEST_BYTES)
 async def update_task_status(
     task_id: int,
     status_update: ServiceRequestStatusUpdate = Depends(),
@@ -32,55 +66,153 @@ async def update_task_status(
     - Field Worker: Update status of assigned tasks and optionally upload proofs.
     - Admin: Update status of any task.
     """
-    # 1. Fetch task
-    task = await fetch_one("SELECT * FROM service_requests WHERE id = $1", task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    task = dict(task)
-
-    # 2. Permission check
-    if current_user["role"] == "FIELD_WORKER" and task["field_worker_id"] != current_user["id"]:
-        raise HTTPException(status_code=403, detail="Task not assigned to you")
-
-    # 3. Validate status transition
-    valid_transitions = {
-        "PENDING": ["ASSIGNED", "IN_PROGRESS"],
-        "ASSIGNED": ["IN_PROGRESS"],
-        "IN_PROGRESS": ["COMPLETED"],
-        "COMPLETED": []
-    }
-    if status_update.status not in valid_transitions.get(task["status"], []):
-        raise HTTPException(status_code=400, detail=f"Invalid status transition from {task['status']} to {status_update.status}")
-
-    # 4. Update task status
+    allowed_from = [s for s, targets in VALID_TRANSITIONS.items() if status_update.status in targets]
+    worker_id = current_user["id"] if current_user["role"] == "FIELD_WORKER" else None
     now = datetime.utcnow()
     completed_at = now if status_update.status == "COMPLETED" else None
-    updated_task = await execute_returning(
-        "UPDATE service_requests SET status=$1, updated_at=$2, completed_at=$3 WHERE id=$4 RETURNING *",
-        status_update.status, now, completed_at, task_id
-    )
-    updated_task = dict(updated_task)
 
-    # 5. Save proofs if provided
+    # 1. With uploads, reject up front what the UPDATE would reject, so nothing is
+    #    written to disk for a task the caller can't move
     if files:
-        for file in files:
-            file_location = f"uploads/{file.filename}"
-            with open(file_location, "wb") as f:
-                f.write(await file.read())
-            await execute_returning(
-                "INSERT INTO task_proofs (task_id, image_path, notes) VALUES ($1, $2, $3)",
-                task_id, file_location, notes
+        _check_transition(
+            await fetch_one("SELECT status, field_worker_id FROM service_requests WHERE id = $1", task_id),
+            worker_id, allowed_from, status_update.status,
+        )
+
+    # 2. Store proof files (streamed, content-addressed). Files this request created
+    #    are removed again if anything below rejects it.
+    created = []
+    try:
+        image_paths = [await store_upload(file, created=created) for file in files or []]
+
+        # 3. Transition, insert proofs and read them back in one statement. The status
+        #    and assignment checks live in the UPDATE's WHERE clause, so two concurrent
+        #    transitions can't both pass them. While the thumbnail pipeline is running,
+        #    each new proof also gets a proof_jobs row, in the same statement.
+        database.note_write()
+        async with database.connection():
+            updated_task = await fetch_one(
+                """
+                WITH previous AS (
+                    -- Locks the row, so the status read here is the one being replaced
+                    SELECT id, status FROM service_requests WHERE id = $1 FOR UPDATE
+                ),
+                updated AS (
+                    UPDATE service_requests sr
+                    SET status = $2, updated_at = $3, completed_at = $4
+                    FROM previous
+                    WHERE sr.id = previous.id
+                      AND sr.status = ANY($5::text[])
+                      AND ($6::int IS NULL OR sr.field_worker_id = $6)
+                    RETURNING sr.*, previous.status AS from_status
+                ),
+                inserted AS (
+                    INSERT INTO task_proofs (task_id, image_path, notes)
+                    SELECT u.id, p.image_path, $8
+                    FROM updated u, unnest($7::text[]) AS p(image_path)
+                    RETURNING *
+                ),
+                jobs AS (
+                    INSERT INTO proof_jobs (proof_id)
+                    SELECT id FROM inserted WHERE $9::bool
+                ),
+                proofs AS (
+                    SELECT * FROM task_proofs WHERE task_id = $1 AND EXISTS (SELECT 1 FROM updated)
+                    UNION ALL
+                    SELECT * FROM inserted
+                )
+                SELECT u.*, COALESCE((SELECT json_agg(p ORDER BY p.id) FROM proofs p), '[]') AS proofs
+                FROM updated u
+                """,
+                task_id, status_update.status, now, completed_at, allowed_from, worker_id, image_paths, notes,
+                proof_images.enabled()
             )
 
-    # 6. Fetch all proofs
-    proofs_raw = await fetch_all("SELECT * FROM task_proofs WHERE task_id = $1", task_id)
-    proofs = [TaskProofOut(**proof) for proof in proofs_raw]
+            # 4. Nothing updated: work out why (only on the failure path)
+            if updated_task is None:
+                _check_transition(
+                    await fetch_one("SELECT status, field_worker_id FROM service_requests WHERE id = $1", task_id),
+                    worker_id, allowed_from, status_update.status,
+                )
+                raise HTTPException(status_code=409, detail="Task was modified concurrently, please retry")
+
+            await publish_task_event("status_changed", updated_task)
+    except BaseException:
+        await discard_uploads(created)
+        raise
+
+    await task_history.record(
+        task_id, "status_changed", status_update.status, updated_task["from_status"],
+        field_worker_id=updated_task["field_worker_id"], actor_id=current_user["id"], occurred_at=now,
+        details={"proofs": len(image_paths)} if image_paths else None,
+    )
+    proofs = json.loads(updated_task["proofs"])
+    return TrustedJSONResponse(service_request_encoder.encode(updated_task, proofs=proofs))
+
+
+@router.get("/assigned")
+async def list_assigned_tasks(
+    status: Optional[str] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=settings.TASK_LIST_MAX_LIMIT),
+    include_archived: bool = False,
+    current_user=Depends(require_role("FIELD_WORKER"))
+):
+    """
+    List tasks assigned to the logged-in Field Worker, newest first (keyset paginated).
+    Archived (old completed) tasks are included with `include_archived=true`.
+    """
+    return stream_task_list(
+        {"field_worker_id": current_user["id"], "status": status},
+        parse_fields(fields), cursor, limit, include_archived
+    )
+
 
-    return {**updated_task, "proofs": proofs}
+@router.get("/proofs/{proof_id}/{variant}")
+async def get_proof_file(
+    proof_id: int,
+    variant: str,
+    current_user=Depends(require_any_role("USER", "FIELD_WORKER", "ADMIN"))
+):
+    """
+    Serve a proof image: `original`, or a generated variant (`thumb`, `preview`).
+    Files are content-addressed, so they are cacheable forever; Range requests are supported.
+    """
+    if variant != "original" and variant not in VARIANTS:
+        raise HTTPException(status_code=404, detail="Unknown variant")
+
+    proof = await fetch_one(
+        """
+        SELECT p.image_path, p.variants, t.user_id, t.field_worker_id
+        FROM task_proofs_all p JOIN service_requests_all t ON t.id = p.task_id
+        WHERE p.id = $1
+        """,
+        proof_id
+    )
+    if not proof:
+        raise HTTPException(status_code=404, detail="Proof not found")
+    role, user_id = current_user["role"], current_user["id"]
+    if (role == "USER" and proof["user_id"] != user_id) or (role == "FIELD_WORKER" and proof["field_worker_id"] != user_id):
+        raise HTTPException(status_code=403, detail="Not allowed to view this proof")
+
+    if variant == "original":
+        path, media_type = proof["image_path"], None
+    else:
+        info = json.loads(proof["variants"] or "{}").get(variant)
+        if not info:
+            raise HTTPException(status_code=404, detail="Variant not generated yet")
+        path, media_type = info["path"], info.get("content_type")
+
+    upload_root = os.path.realpath(settings.UPLOAD_DIR)
+    if not path or not os.path.realpath(path).startswith(upload_root + os.sep) or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    return FileResponse(path, media_type=media_type, headers={"Cache-Control": "private, max-age=31536000, immutable"})
 
 
 @router.get("/field-worker/summary")
-async def field_worker_summary(current_user=Depends(require_role("FIELD_WORKER"))):
+async def field_worker_summary(request: Request, current_user=Depends(require_role("FIELD_WORKER"))):
     """
     Fetch summary for the logged-in Field Worker:
     - Total assigned tasks
@@ -90,27 +222,37 @@ async def field_worker_summary(current_user=Depends(require_role("FIELD_WORKER")
     """
     worker_id = current_user["id"]
 
-    # Total assigned tasks
-    total_record = await fetch_one(
-        "SELECT COUNT(*) AS count FROM service_requests WHERE field_worker_id = $1", worker_id
-    )
-    total_tasks = total_record["count"] if total_record else 0
+    async def build():
+        # Per-status counters for this worker, maintained by triggers on service_requests
+        counters = await fetch_counters("worker_tasks", scope_id=worker_id)
+        tasks_by_status = counters["worker_tasks"]
+        return {
+            "total_tasks": sum(tasks_by_status.values()),
+            "tasks_by_status": tasks_by_status
+        }
+
+    return await response_cache.respond(request, worker_id, [f"tasks:worker:{worker_id}"], build)
 
-    # Tasks by status
-    tasks_status_raw = await fetch_all(
+@router.put("/location")
+async def update_field_worker_location(
+    location: WorkerLocationUpdate,
+    current_user=Depends(require_role("FIELD_WORKER"))
+):
+    """
+    Report the Field Worker's current position for nearest-worker dispatch.
+    Unlike update-profile this does not require re-approval.
     """
-    SELECT status, COUNT(*) AS count 
-    FROM service_requests 
-    WHERE field_worker_id = $1 
-    GROUP BY status
-    """,
-    worker_id
-)
-    tasks_by_status = {r["status"]: r["count"] for r in tasks_status_raw}
-    return {
-        "total_tasks": total_tasks,
-        "tasks_by_status": tasks_by_status
-    }                                                                                                                                       
+    updated = await execute_returning(
+        """
+        UPDATE users SET latitude = $1, longitude = $2, location_updated_at = $3
+        WHERE id = $4
+        RETURNING id, latitude, longitude, location_updated_at
+        """,
+        location.latitude, location.longitude, datetime.utcnow(), current_user["id"]
+    )
+    if not updated:
+        raise HTTPException(status_code=404, detail="User not found")
+    return dict(updated)
 
 @router.put("/update-profile")
 async def update_field_worker_profile(
@@ -123,7 +265,7 @@ async def update_field_worker_profile(
     Update profile of logged-in Field Worker.
     Any profile update requires admin re-approval (is_approved=False).
     """
-    hashed_pw = get_password_hash(password) if password else None
+    hashed_pw = await get_password_hash(password) if password else None
 
     query = """
         UPDATE users
@@ -136,5 +278,7 @@ async def update_field_worker_profile(
     updated_user = await execute_returning(query, username, email, hashed_pw, current_user["id"])
     if not updated_user:
         raise HTTPException(status_code=404, detail="User not found")
+    revoke_tokens(current_user["id"])
+    await publish_invalidation("users")
 
     return {"message": "Profile updated successfully. Await admin approval."}
\ No newline at end of file
@@ -0,0 +1,229 @@
+"""
+Admission control for expensive endpoints.
+
+Each route class (login, proof uploads, admin summary) gets:
+
+- a token bucket per principal (user id from the bearer token, or the client IP for
+  login), refilled at `rate` per second up to `burst`; an empty bucket answers 429
+  with Retry-After.
+- a cap on concurrent requests of that class, sized as a share of the DB pool, and a
+  check on the pool itself: once more than ADMISSION_MAX_POOL_WAITING requests
+  (by default DB_POOL_MAX_SIZE) are queueing for a connection, new expensive work
+  is refused with 503 rather than joining the queue.
+
+AdmissionMiddleware makes the decision from the method, path and headers alone,
+before FastAPI reads the body, so a refused multipart upload is never parsed or
+spooled, and no database or bcrypt work is done. Endpoints opt in with the
+@admission_class decorator. Behind a load balancer, set TRUSTED_PROXIES so the
+client IP comes from X-Forwarded-For instead of the proxy's address. Counters per
+class are exported through /internal/metrics and the admin runtime-stats endpoint.
+"""
+
+import ipaddress
+import math
+import time
+from collections import OrderedDict
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+from starlette.routing import Match
+
+from app import database
+from app.core.config import settings
+from app.core.metrics import register_collector
+from app.core.security import decode_token
+
+
+class RouteClass:
+    def __init__(self, name: str, by: str, rate: float, burst: int, max_concurrent: int, max_keys: int):
+        self.name = name
+        self.by = by  # "ip" or "user"
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.max_keys = max_keys
+        # key -> [tokens, last refill]; LRU-bounded so one-off IPs can't grow it forever
+        self._buckets = OrderedDict()
+        self.in_flight = 0
+        self.admitted = 0
+        self.rate_limited = 0
+        self.shed = 0
+    def take(self, key) -> float:
+        """Take a token for `key`; returns 0 when admitted, else seconds until one is available."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.burst), now]
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / self.rate
+
+    def overloaded(self) -> bool:
+        if self.in_flight >= self.max_concurrent:
+            return True
+        max_waiting = settings.ADMISSION_MAX_POOL_WAITING
+        if max_waiting is None:
+            max_waiting = settings.DB_POOL_MAX_SIZE
+        return max_waiting > 0 and database.pool_stats().get("waiting", 0) > max_waiting
+
+    def try_admit(self, key):
+        """None when admitted (call release() afterwards), else a ready-made rejection response."""
+        # Shedding doesn't spend the caller's tokens: the retry should get through
+        if self.overloaded():
+            self.shed += 1
+            return _reject(status.HTTP_503_SERVICE_UNAVAILABLE, "Server busy, please retry shortly", 1)
+        wait = self.take(key)
+        if wait:
+            self.rate_limited += 1
+            return _reject(status.HTTP_429_TOO_MANY_REQUESTS, "Too many requests", math.ceil(wait))
+        self.admitted += 1
+        self.in_flight += 1
+        return None
+
+    def release(self):
+        self.in_flight -= 1
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "admitted": self.admitted,
+            "rate_limited": self.rate_limited,
+            "shed": self.shed,
+            "tracked_keys": len(self._buckets),
+        }
+
+
+def _reject(status_code: int, detail: str, retry_after: int):
+    return JSONResponse({"detail": detail}, status_code=status_code, headers={"Retry-After": str(retry_after)})
+
+
+def _max_concurrent(share: float) -> int:
+    return max(1, int(settings.DB_POOL_MAX_SIZE * share))
+
+
+route_classes = {
+    "login": RouteClass(
+        "login", "ip", settings.ADMISSION_LOGIN_RATE, settings.ADMISSION_LOGIN_BURST,
+        _max_concurrent(settings.ADMISSION_LOGIN_POOL_SHARE), settings.ADMISSION_MAX_KEYS),
+    "task_status": RouteClass(
+        "task_status", "user", settings.ADMISSION_TASK_STATUS_RATE, settings.ADMISSION_TASK_STATUS_BURST,
+        _max_concurrent(settings.ADMISSION_TASK_STATUS_POOL_SHARE), settings.ADMISSION_MAX_KEYS),
+    "admin_summary": RouteClass(
+        "admin_summary", "user", settings.ADMISSION_ADMIN_SUMMARY_RATE, settings.ADMISSION_ADMIN_SUMMARY_BURST,
+        _max_concurrent(settings.ADMISSION_ADMIN_SUMMARY_POOL_SHARE), settings.ADMISSION_MAX_KEYS),
+}
+
+
+def admission_stats():
+    return {name: rc.stats() for name, rc in route_classes.items()}
+
+register_collector("admission", admission_stats)
+
+
+# endpoint function -> route class name, filled in by @admission_class
+_endpoint_classes = {}
+
+
+def admission_class(name: str):
+    """Put an endpoint behind the named route class. Goes below the @router decorator."""
+    if name not in route_classes:
+        raise ValueError(f"Unknown admission route class: {name}")
+
+    def mark(endpoint):
+        _endpoint_classes[endpoint] = name
+        return endpoint
+    return mark
+
+
+def _trusted_proxies():
+    return [ipaddress.ip_network(p.strip(), strict=False) for p in settings.TRUSTED_PROXIES.split(",") if p.strip()]
+
+
+_TRUSTED = _trusted_proxies()
+
+
+def _is_trusted(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in _TRUSTED)
+
+
+def client_ip(scope) -> str:
+    """
+    The peer address, or, when the peer is a trusted proxy, the nearest untrusted hop
+    in X-Forwarded-For (entries further left are client-supplied and can be forged).
+    """
+    host = scope["client"][0] if scope.get("client") else "unknown"
+    if not _TRUSTED or not _is_trusted(host):
+        return host
+    forwarded = [
+        value.decode("latin-1") for name, value in scope["headers"] if name == b"x-forwarded-for"
+    ]
+    hops = [h.strip() for h in ",".join(forwarded).split(",") if h.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted(hop):
+            return hop
+    return hops[0] if hops else host
+
+
+def _bearer_subject(scope):
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                payload = decode_token(token)
+                return payload["sub"] if payload else None
+    return None
+
+
+class AdmissionMiddleware:
+    """Applies the route classes before the request body is read."""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = None
+
+    def _route_class(self, scope):
+        if self._routes is None:
+            self._routes = [
+                (route, route_classes[_endpoint_classes[route.endpoint]])
+                for route in scope["app"].routes
+                if getattr(route, "endpoint", None) in _endpoint_classes
+            ]
+        for route, rc in self._routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return rc
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.ADMISSION_ENABLED:
+            return await self.app(scope, receive, send)
+        rc = self._route_class(scope)
+        if rc is None:
+            return await self.app(scope, receive, send)
+
+        key = None
+        if rc.by == "user":
+            # An invalid or missing token falls back to the IP; the route's auth rejects it anyway
+            subject = _bearer_subject(scope)
+            key = f"user:{subject}" if subject is not None else None
+        key = key or f"ip:{client_ip(scope)}"
+
+        rejection = rc.try_admit(key)
+        if rejection is not None:
+            return await rejection(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            rc.release()
@@ -0,0 +1,108 @@
+"""
+Request body size limits for upload endpoints.
+
+Starlette parses a multipart body completely, spooling every file part to a temp
+file, before the endpoint runs, so a size check in the handler comes after the
+whole upload has been received and written to disk. BodyLimitMiddleware enforces
+the limit on the way in instead: a Content-Length over the limit is refused with
+413 before anything is read, and a body sent without one (chunked) is counted as
+it streams and cut off with 413 as soon as it passes the limit.
+
+Endpoints opt in with the @body_limit decorator, below the router decorator.
+store_upload still checks each file against MAX_UPLOAD_BYTES.
+"""
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from starlette.routing import Match
+
+# endpoint function -> max body bytes, filled in by @body_limit
+_endpoint_limits = {}
+
+
+def body_limit(max_bytes: int):
+    """Refuse request bodies over `max_bytes` before they are parsed."""
+    def mark(endpoint):
+        _endpoint_limits[endpoint] = max_bytes
+        return endpoint
+    return mark
+
+
+class BodyTooLarge(HTTPException):
+    def __init__(self, max_bytes: int):
+        super().__init__(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Request body exceeds {max_bytes} bytes",
+        )
+
+
+def _content_length(scope):
+    for name, value in scope["headers"]:
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+class BodyLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self._routes = None
+
+    def _limit(self, scope):
+        if self._routes is None:
+            self._routes = [
+                (route, _endpoint_limits[route.endpoint])
+                for route in scope["app"].routes
+                if getattr(route, "endpoint", None) in _endpoint_limits
+            ]
+        for route, limit in self._routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return limit
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        limit = self._limit(scope)
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        length = _content_length(scope)
+        if length is not None and length > limit:
+            error = BodyTooLarge(limit)
+            # Connection: close, since the unread body is still on the wire
+            response = JSONResponse(
+                {"detail": error.detail}, status_code=error.status_code, headers={"Connection": "close"})
+            return await response(scope, receive, send)
+
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI re-raises HTTPExceptions from body parsing as they are
+                    raise BodyTooLarge(limit)
+            return message
+
+        async def tracking_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except BodyTooLarge as error:
+            if started:
+                raise
+            response = JSONResponse(
+                {"detail": error.detail}, status_code=error.status_code, headers={"Connection": "close"})
+            await response(scope, receive, send)
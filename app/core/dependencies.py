@@ -0,0 +1,40 @@
+from app.database import (
+    bind_connection, collect_after_commit, note_write, pool_connection, run_after_commit,
+    stop_collecting_after_commit, unbind_connection,
+)
+
+
+async def db_connection():
+    """
+    Request-scoped connection: every app.database helper called while handling the
+    request runs on this one connection instead of acquiring its own.
+    """
+    async with pool_connection() as conn:
+        bind_connection(conn)
+        try:
+            yield conn
+        finally:
+            unbind_connection()
+
+
+async def db_transaction():
+    """
+    Like db_connection, wrapped in a transaction that commits when the handler
+    returns and rolls back if it raises (including HTTPException). after_commit
+    callbacks registered by the handler run once it has committed.
+
+    Declare it as Depends(db_transaction, scope="function"): with the default scope
+    FastAPI exits it after the response is sent, so the client would get a success
+    for a COMMIT that can still fail.
+    """
+    note_write()
+    async with pool_connection() as conn:
+        bind_connection(conn)
+        callbacks = collect_after_commit()
+        try:
+            async with conn.transaction():
+                yield conn
+        finally:
+            stop_collecting_after_commit()
+            unbind_connection()
+        await run_after_commit(callbacks)
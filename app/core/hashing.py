@@ -0,0 +1,120 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.core.config import settings
+from app.core.metrics import register_collector
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+# Module-level so they can be pickled into a process pool
+def _hash(password):
+    return pwd_context.hash(password)
+
+def _verify(plain_password, hashed_password):
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a bounded thread/process pool so hashing never blocks the event loop.
+    Once every worker is busy and `queue_limit` calls are waiting, new calls fail with 503.
+    """
+
+    def __init__(self, executor: str = "thread", max_workers: int = 4, queue_limit: int = 64):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown password hash executor: {executor}")
+        self.executor_kind = executor
+        self.max_workers = max_workers
+        self.queue_limit = queue_limit
+        self._executor = None
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    def _observe(self, elapsed: float):
+        self.completed += 1
+        self.latency_sum += elapsed
+        self.latency_max = max(self.latency_max, elapsed)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                self.latency_buckets[i] += 1
+
+    async def _submit(self, fn, *args):
+        if self._pending >= self.max_workers + self.queue_limit:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        self._pending += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._pending -= 1
+            self._observe(time.perf_counter() - started)
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(_verify, plain_password, hashed_password)
+
+    async def warm(self):
+        """Start every worker and load the bcrypt backend so the first logins aren't slow."""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(*(
+            loop.run_in_executor(executor, _hash, "warmup") for _ in range(self.max_workers)
+        ))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self._pending - self.max_workers)
+
+    def stats(self):
+        return {
+            "executor": self.executor_kind,
+            "max_workers": self.max_workers,
+            "queue_limit": self.queue_limit,
+            "in_flight": self._pending,
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "latency_avg_seconds": round(self.latency_sum / self.completed, 4) if self.completed else 0.0,
+            "latency_max_seconds": round(self.latency_max, 4),
+            "latency_buckets": {f"le_{b}": n for b, n in zip(LATENCY_BUCKETS, self.latency_buckets)},
+        }
+
+
+password_hasher = PasswordHasher(
+    executor=settings.PASSWORD_HASH_EXECUTOR,
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    queue_limit=settings.PASSWORD_HASH_QUEUE_LIMIT,
+)
+register_collector("password_hashing", password_hasher.stats)
@@ -0,0 +1,129 @@
+"""
+Database and request instrumentation.
+
+Every query that goes through app.database records pool acquire wait, execution
+time and row count per normalized statement. DBInstrumentationMiddleware collects
+the query count and DB time of each request, adds them as X-DB-Queries /
+X-DB-Time-Ms response headers and records them per route, so N+1 patterns show
+up in /internal/metrics.
+"""
+
+import logging
+import re
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+
+from app.core.config import settings
+from app.core.metrics import Counter, Histogram
+
+logger = logging.getLogger("app.db")
+
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+db_pool_acquire_seconds = Histogram(
+    "fieldops_db_pool_acquire_seconds", "Time spent waiting for a pooled connection")
+db_query_seconds = Histogram(
+    "fieldops_db_query_seconds", "Query execution time", ["statement"])
+db_query_rows = Histogram(
+    "fieldops_db_query_rows", "Rows returned or affected per query", ["statement"], buckets=ROW_BUCKETS)
+db_query_errors = Counter(
+    "fieldops_db_query_errors_total", "Queries that raised", ["statement"])
+http_request_seconds = Histogram(
+    "fieldops_http_request_seconds", "Request latency", ["method", "route", "status"])
+http_request_db_queries = Histogram(
+    "fieldops_http_request_db_queries", "Database queries per request", ["method", "route"], buckets=COUNT_BUCKETS)
+http_request_db_seconds = Histogram(
+    "fieldops_http_request_db_seconds", "Database time per request", ["method", "route"])
+
+_request_stats = ContextVar("request_db_stats", default=None)
+
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL_RE = re.compile(r"(?<![\w$])\d+(?:\.\d+)?")
+
+
+class RequestDBStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+@lru_cache(maxsize=4096)
+def normalize_statement(query: str) -> str:
+    """Collapse whitespace and replace inline literals so one statement is one label."""
+    statement = " ".join(query.split())
+    statement = _STRING_LITERAL_RE.sub("?", statement)
+    statement = _NUMBER_LITERAL_RE.sub("?", statement)
+    return statement[:200]
+
+
+def row_count(result):
+    """Rows in a fetch result, or affected rows parsed from a status like 'UPDATE 3'."""
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, str):
+        last = result.rsplit(" ", 1)[-1]
+        return int(last) if last.isdigit() else None
+    return 1
+
+
+def record_query(query: str, acquire_seconds, exec_seconds: float, rows=None, error: bool = False):
+    statement = normalize_statement(query)
+    if acquire_seconds is not None:
+        db_pool_acquire_seconds.observe(acquire_seconds)
+    db_query_seconds.observe(exec_seconds, statement=statement)
+    if rows is not None:
+        db_query_rows.observe(rows, statement=statement)
+    if error:
+        db_query_errors.inc(statement=statement)
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += exec_seconds
+
+    if exec_seconds * 1000 >= settings.SLOW_QUERY_MS:
+        logger.warning("Slow query (%.1f ms, rows=%s): %s", exec_seconds * 1000, rows, statement)
+
+
+class DBInstrumentationMiddleware:
+    """Pure ASGI middleware so streamed response bodies are still attributed to the request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestDBStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_headers(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(stats.queries).encode()))
+                headers.append((b"x-db-time-ms", f"{stats.db_seconds * 1000:.2f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _request_stats.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            http_request_seconds.observe(time.perf_counter() - started, method=method, route=route_path, status=status_code)
+            http_request_db_queries.observe(stats.queries, method=method, route=route_path)
+            http_request_db_seconds.observe(stats.db_seconds, method=method, route=route_path)
@@ -0,0 +1,75 @@
+"""
+Read-your-writes across processes and instances.
+
+When a request writes (anything that calls app.database.note_write), its response
+carries the primary's WAL position at that point, as an `X-Write-LSN` header and a
+short-lived `fieldops_lsn` cookie (Max-Age READ_YOUR_WRITES_SECONDS). Browsers send
+the cookie back automatically; API clients can echo the value in `X-Min-LSN`. Replica
+reads for a request carrying a marker only go to replicas whose replay position (from
+the last health check) has reached it, so the next read sees the write on whichever
+worker or instance it lands on. Without replicas nothing is added.
+
+The position is read when the response starts, after the handler's transaction has
+committed, so it is at or past the commit.
+"""
+
+import logging
+import math
+
+from app import database
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+COOKIE_NAME = "fieldops_lsn"
+
+
+def _client_marker(scope):
+    """The newest LSN the client presented (header or cookie), or None."""
+    markers = []
+    for name, value in scope["headers"]:
+        if name == b"x-min-lsn":
+            markers.append(database.parse_lsn(value.decode("latin-1").strip()))
+        elif name == b"cookie":
+            for part in value.decode("latin-1").split(";"):
+                key, _, cookie = part.strip().partition("=")
+                if key == COOKIE_NAME:
+                    markers.append(database.parse_lsn(cookie))
+    markers = [m for m in markers if m is not None]
+    return max(markers) if markers else None
+
+
+class ReadYourWritesMiddleware:
+    """Routes replica reads by the client's write marker and hands out new markers."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = database.track_consistency(_client_marker(scope))
+
+        async def send_with_marker(message):
+            if (message["type"] == "http.response.start" and state.wrote and database.replicas
+                    and message["status"] < 400):
+                try:
+                    lsn = await database.current_wal_lsn()
+                except Exception:
+                    # A missing marker only costs consistency, never the response
+                    logger.exception("Could not read the primary's WAL position")
+                    lsn = None
+                if lsn:
+                    max_age = math.ceil(settings.READ_YOUR_WRITES_SECONDS)
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-write-lsn", lsn.encode()))
+                    headers.append((
+                        b"set-cookie",
+                        f"{COOKIE_NAME}={lsn}; Max-Age={max_age}; Path=/; HttpOnly; SameSite=Lax".encode(),
+                    ))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_marker)
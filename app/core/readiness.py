@@ -0,0 +1,47 @@
+"""
+Startup progress for the health endpoints.
+
+The lifespan handler in app/main.py runs named phases through `startup_state.timed()`;
+the instance only reports ready once every phase has finished, and stops reporting
+ready as soon as shutdown begins so load balancers drain it first.
+"""
+
+import time
+
+from app.core.metrics import register_collector
+
+
+class StartupState:
+    def __init__(self):
+        self.phase = "starting"
+        self.ready = False
+        self.timings = {}
+        self._started = time.perf_counter()
+        self.total_seconds = None
+
+    async def timed(self, name: str, awaitable):
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.timings[name] = round(time.perf_counter() - started, 4)
+
+    def mark_ready(self):
+        self.total_seconds = round(time.perf_counter() - self._started, 4)
+        self.phase = "ready"
+        self.ready = True
+
+    def mark_stopping(self):
+        self.phase = "stopping"
+        self.ready = False
+
+    def stats(self):
+        return {
+            "ready": int(self.ready),
+            "total_seconds": self.total_seconds,
+            "phase_seconds": dict(self.timings),
+        }
+
+
+startup_state = StartupState()
+register_collector("startup", startup_state.stats)
@@ -0,0 +1,116 @@
+"""
+In-memory view of token_revocations (sql/migrations/0007_token_revocations.sql).
+
+Keeps the latest revoked_at per user, so checking a token is a dict lookup. The set is
+refreshed incrementally by a background loop; handlers that change a user's claims
+also revoke locally so this process sees the change before the next refresh. Until the
+first refresh succeeds, or when refreshes stop succeeding, the set reports itself as
+not ready and authentication falls back to the database.
+
+Everything here is on the database clock: revoked_at is set by clock_timestamp() in
+the trigger, login stamps tokens with the database time its user row was read (iat),
+and local revocations use the app clock corrected by the offset measured at each
+refresh. Skew between app hosts and the database therefore can't let a token issued
+before a revocation look newer than it.
+"""
+
+import asyncio
+import logging
+import time
+
+from app import database
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Tokens live at most a day (create_access_token default), so older revocations are moot
+RETENTION_SECONDS = 24 * 3600
+# Re-read this much history on each refresh to pick up rows committed out of order
+REFRESH_OVERLAP_SECONDS = 30.0
+
+REFRESH_SQL = """
+    WITH clock AS (SELECT EXTRACT(EPOCH FROM clock_timestamp())::float8 AS now)
+    SELECT clock.now, r.user_id, r.revoked_at
+    FROM clock
+    LEFT JOIN LATERAL (
+        SELECT user_id, EXTRACT(EPOCH FROM max(revoked_at))::float8 AS revoked_at
+        FROM token_revocations
+        WHERE revoked_at > to_timestamp(COALESCE($1::float8, clock.now - $2))
+        GROUP BY user_id
+    ) r ON TRUE
+"""
+
+
+class RevocationSet:
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._revoked = {}
+        self._watermark = None
+        self._refreshed_at = None
+        self.clock_offset = 0.0  # database clock minus app clock, in seconds
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    @property
+    def ready(self) -> bool:
+        # Stale for more than a few intervals means revocations may be missing
+        return (
+            self._refreshed_at is not None
+            and time.monotonic() - self._refreshed_at < 3 * self.refresh_interval
+        )
+
+    def is_revoked(self, user_id: int, issued_at: float) -> bool:
+        revoked_at = self._revoked.get(user_id)
+        return revoked_at is not None and issued_at <= revoked_at
+
+    def now(self) -> float:
+        """The database clock (epoch seconds), estimated from the app clock."""
+        return time.time() + self.clock_offset
+
+    def revoke_local(self, user_id: int):
+        self._note(user_id, self.now())
+
+    def _note(self, user_id: int, revoked_at: float):
+        if revoked_at > self._revoked.get(user_id, 0.0):
+            self._revoked[user_id] = revoked_at
+
+    async def refresh(self):
+        since = None if self._watermark is None else self._watermark - REFRESH_OVERLAP_SECONDS
+        sent = time.time()
+        rows = await database.fetch_all(REFRESH_SQL, since, RETENTION_SECONDS)
+        received = time.time()
+        db_now = rows[0]["now"]
+        self.clock_offset = db_now - (sent + received) / 2
+        for row in rows:
+            if row["user_id"] is not None:
+                self._note(row["user_id"], row["revoked_at"])
+        self._watermark = db_now
+
+        horizon = db_now - RETENTION_SECONDS
+        for user_id in [u for u, ts in self._revoked.items() if ts < horizon]:
+            del self._revoked[user_id]
+        self._refreshed_at = time.monotonic()
+        self.refreshes += 1
+
+    async def refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.refresh_errors += 1
+                logger.exception("Token revocation refresh failed")
+            await asyncio.sleep(self.refresh_interval)
+
+    def stats(self):
+        return {
+            "ready": self.ready,
+            "revoked_users": len(self._revoked),
+            "clock_offset_seconds": round(self.clock_offset, 3),
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+        }
+
+
+revocations = RevocationSet(settings.TOKEN_REVOCATION_REFRESH_SECONDS)
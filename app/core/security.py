@@ -1,48 +1,110 @@
+import time
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.hashing import password_hasher
+from app.core.metrics import register_collector
+from app.core.revocation import revocations
 from app.database import fetch_one
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/login")
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+PRINCIPAL_SQL = "SELECT * FROM users WHERE id = $1 AND is_active = TRUE"
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+# Active users keyed by id, so authenticated requests skip the users lookup
+principal_cache = TTLCache(
+    max_size=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+register_collector("principal_cache", principal_cache.stats)
 
-def create_access_token(data: dict, expires_delta: timedelta = None):
+# Decoded claims keyed by the raw token, each kept until the token expires
+token_cache = TTLCache(max_size=settings.TOKEN_CACHE_MAX_SIZE)
+auth_stats = {"claims": 0, "database": 0}
+register_collector("token_cache", token_cache.stats)
+register_collector("token_auth", lambda: {**auth_stats, **revocations.stats()})
+
+async def verify_password(plain_password, hashed_password):
+    return await password_hasher.verify(plain_password, hashed_password)
+
+async def get_password_hash(password):
+    return await password_hasher.hash(password)
+
+def create_access_token(data: dict, expires_delta: timedelta = None, issued_at: float = None):
+    """`issued_at` is on the database clock (see app.core.revocation); defaults to its estimate."""
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=1440))
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": revocations.now() if issued_at is None else issued_at})
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+def decode_token(token: str):
+    """Verified, unexpired claims of a bearer token, or None. Cached per token until it expires."""
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except JWTError:
+            return None
+        if payload.get("sub") is None:
+            return None
+        token_cache.set(token, payload, ttl=payload["exp"] - time.time())
+    elif payload["exp"] <= time.time():
+        return None
+    return payload
+
+async def authenticate_token(token: str):
+    """Resolve a bearer token to an active user row; raises 401/403 like get_current_user."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
+    payload = decode_token(token)
+    if payload is None:
         raise credentials_exception
+    user_id = int(payload["sub"])
+
+    # Fast path: claims are authoritative unless the user was revoked after issue
+    revoked = "iat" in payload and revocations.is_revoked(user_id, payload["iat"])
+    if "role" in payload and revocations.ready and not revoked:
+        auth_stats["claims"] += 1
+        if payload["role"] == "FIELD_WORKER" and not payload["approved"]:
+            raise HTTPException(status_code=403, detail="Field worker not approved by admin")
+        return {"id": user_id, "role": payload["role"], "is_approved": payload["approved"]}
 
-    user = await fetch_one("SELECT * FROM users WHERE id = $1 AND is_active = TRUE", int(user_id))
+    # Tokens without claims, revoked tokens and a stale revocation set go to the database
+    auth_stats["database"] += 1
+    # A revoked token means the user just changed, and this process may still cache
+    # the row from before the change; go to the primary instead of either
+    user = None if revoked else principal_cache.get(user_id)
     if user is None:
-        raise credentials_exception
+        user = await fetch_one(PRINCIPAL_SQL, user_id, use_replica=not revoked)
+        if user is None:
+            raise credentials_exception
+        principal_cache.set(user["id"], user)
     if user["role"] == "FIELD_WORKER" and not user["is_approved"]:
         raise HTTPException(status_code=403, detail="Field worker not approved by admin")
     return user
 
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    return await authenticate_token(token)
+
+def invalidate_principal(user_id: int):
+    """Drop a cached user so the next request re-reads it from the database."""
+    principal_cache.invalidate(user_id)
+
+def revoke_tokens(user_id: int):
+    """
+    Stop trusting claims in the user's existing tokens. The users trigger records the
+    revocation for other processes; this makes it visible here immediately.
+    """
+    revocations.revoke_local(user_id)
+    principal_cache.invalidate(user_id)
+
 def require_role(required_role: str):
     async def role_checker(current_user=Depends(get_current_user)):
         if current_user["role"] != required_role:
@@ -1,28 +1,352 @@
+import asyncio
+import logging
 import os
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 import asyncpg
 from app.core.config import settings
+from app.core.instrumentation import db_pool_acquire_seconds, record_query, row_count
+from app.core.metrics import register_collector
+
+logger = logging.getLogger(__name__)
 
 pool = None
 
-async def connect_db():
+# Connection bound by connection()/transaction() or the request-scoped dependencies;
+# the query helpers below run on it instead of acquiring their own.
+_bound_connection = ContextVar("db_connection", default=None)
+# Callbacks to run once the outermost transaction()/db_transaction commits; None outside one
+_after_commit = ContextVar("db_after_commit", default=None)
+_waiting = 0
+
+# Read replicas (DATABASE_REPLICA_URLS). Reads opt in with use_replica=True. Read-your-writes
+# is carried by the client, so it holds across processes: a response to a request that
+# wrote carries the primary's WAL position (app.core.read_your_writes), and a request
+# that presents one only reads from replicas that have replayed at least that far.
+replicas = []
+_consistency = ContextVar("db_consistency", default=None)
+
+
+class ReadConsistency:
+    """Per-request replica routing state, set up by ReadYourWritesMiddleware."""
+    __slots__ = ("min_lsn", "wrote")
+
+    def __init__(self, min_lsn: int = None):
+        self.min_lsn = min_lsn
+        self.wrote = False
+
+
+def parse_lsn(text):
+    """'16/B374D848' -> int, or None when `text` isn't an LSN."""
+    high, sep, low = (text or "").partition("/")
+    try:
+        return (int(high, 16) << 32) + int(low, 16) if sep else None
+    except ValueError:
+        return None
+
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url
+        self.init = None
+        self.pool = None
+        self.healthy = False
+        self.lag_seconds = None
+        self.replay_lsn = None
+        self.reads = 0
+        self.failures = 0
+        self.ejections = 0
+
+    def eject(self, reason: str):
+        if self.healthy:
+            self.ejections += 1
+            logger.warning("Ejecting read replica %s: %s", self.name, reason)
+        self.healthy = False
+
+    def stats(self):
+        pool_size = self.pool.get_size() if self.pool is not None else 0
+        return {
+            "healthy": int(self.healthy),
+            "lag_seconds": self.lag_seconds,
+            "reads": self.reads,
+            "failures": self.failures,
+            "ejections": self.ejections,
+            "pool_size": pool_size,
+        }
+
+async def with_connect_retry(connect, timeout: float = None):
+    """
+    Await connect() until it succeeds, backing off between attempts. Gives up and
+    re-raises the last error after `timeout` seconds (DB_CONNECT_TIMEOUT_SECONDS).
+    """
+    deadline = time.monotonic() + (settings.DB_CONNECT_TIMEOUT_SECONDS if timeout is None else timeout)
+    delay = 0.5
+    while True:
+        try:
+            return await connect()
+        except (OSError, asyncpg.PostgresError, asyncio.TimeoutError) as e:
+            if time.monotonic() + delay > deadline:
+                raise
+            logger.warning("Database not reachable (%s); retrying in %.1fs", e, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 5.0)
+
+def _create_pool(url: str, init=None):
+    return asyncpg.create_pool(
+        url,
+        min_size=settings.DB_POOL_MIN_SIZE,
+        max_size=settings.DB_POOL_MAX_SIZE,
+        max_inactive_connection_lifetime=settings.DB_MAX_INACTIVE_CONNECTION_LIFETIME,
+        statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+        max_cached_statement_lifetime=settings.DB_MAX_CACHED_STATEMENT_LIFETIME,
+        command_timeout=settings.DB_COMMAND_TIMEOUT,
+        init=init,
+    )
+
+async def connect_db(init=None):
+    """Create the pool (min_size connections up front); `init` runs on every new connection."""
     global pool
-    pool = await asyncpg.create_pool(settings.DATABASE_URL, min_size=5, max_size=20)
+    pool = await with_connect_retry(lambda: _create_pool(settings.DATABASE_URL, init))
+
+async def connect_replicas(init=None):
+    """
+    Create one pool per replica URL. A replica that can't be reached stays ejected
+    (reads use the primary) and replica_health_loop keeps trying it.
+    """
+    replicas[:] = [
+        Replica(f"replica_{i}", url.strip())
+        for i, url in enumerate(settings.DATABASE_REPLICA_URLS.split(",")) if url.strip()
+    ]
+
+    async def connect(replica):
+        replica.init = init
+        await check_replica(replica)
+
+    await asyncio.gather(*(connect(r) for r in replicas))
 
 async def disconnect_db():
+    await asyncio.gather(*(r.pool.close() for r in replicas if r.pool is not None))
     await pool.close()
 
-async def fetch_one(query, *args):
-    async with pool.acquire() as conn:
-        return await conn.fetchrow(query, *args)
+async def check_replica(replica: Replica):
+    """Measure replication lag; eject the replica when it is unreachable or too far behind."""
+    try:
+        if replica.pool is None:
+            replica.pool = await _create_pool(replica.url, replica.init)
+        row = await replica.pool.fetchrow("""
+            SELECT CASE
+                WHEN NOT pg_is_in_recovery() THEN 0
+                WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+            END::float8 AS lag,
+            (CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn() ELSE pg_current_wal_lsn() END)::text
+                AS replay_lsn
+        """, timeout=settings.DB_REPLICA_CHECK_SECONDS)
+    except Exception as e:
+        replica.failures += 1
+        replica.lag_seconds = None
+        replica.replay_lsn = None
+        replica.eject(f"health check failed: {e}")
+        return
+    lag = row["lag"]
+    # Only ever behind the replica's real position, so routing on it is safe
+    replica.replay_lsn = parse_lsn(row["replay_lsn"])
+    replica.lag_seconds = round(lag, 3)
+    if lag > settings.DB_REPLICA_MAX_LAG_SECONDS:
+        replica.eject(f"lag {lag:.1f}s exceeds {settings.DB_REPLICA_MAX_LAG_SECONDS}s")
+    elif not replica.healthy:
+        logger.info("Read replica %s is healthy (lag %.2fs)", replica.name, lag)
+        replica.healthy = True
+
+async def replica_health_loop():
+    while True:
+        await asyncio.gather(*(check_replica(r) for r in replicas), return_exceptions=True)
+        await asyncio.sleep(settings.DB_REPLICA_CHECK_SECONDS)
 
-async def fetch_all(query, *args):
-    async with pool.acquire() as conn:
-        return await conn.fetch(query, *args)
+def track_consistency(min_lsn: int = None) -> ReadConsistency:
+    """Start read-your-writes tracking for the current request; `min_lsn` is the client's marker."""
+    state = ReadConsistency(min_lsn)
+    _consistency.set(state)
+    return state
+
+def note_write():
+    """Mark the current request as a writer: its reads stay on the primary and its response carries a marker."""
+    state = _consistency.get()
+    if state is not None:
+        state.wrote = True
+
+async def current_wal_lsn() -> str:
+    """The primary's current WAL position, as text ('16/B374D848')."""
+    return await _run("fetchval", "SELECT pg_current_wal_lsn()::text")
+
+def _choose_replica():
+    """A healthy replica for this read, or None to use the primary."""
+    if not replicas:
+        return None
+    healthy = [r for r in replicas if r.healthy]
+    state = _consistency.get()
+    if state is not None:
+        if state.wrote:
+            return None
+        if state.min_lsn is not None:
+            healthy = [r for r in healthy if r.replay_lsn is not None and r.replay_lsn >= state.min_lsn]
+    if not healthy:
+        return None
+    return max(healthy, key=lambda r: r.pool.get_idle_size())
+
+@asynccontextmanager
+async def pool_connection(use_replica: bool = False):
+    """
+    Acquire a fresh pooled connection (not bound), recording the wait. With use_replica,
+    the connection comes from a healthy read replica when one is eligible.
+    """
+    global _waiting
+    replica = _choose_replica() if use_replica else None
+    target = replica.pool if replica is not None else pool
+    _waiting += 1
+    started = time.perf_counter()
+    try:
+        conn = await target.acquire()
+    except (OSError, asyncpg.PostgresError, asyncio.TimeoutError) as e:
+        if replica is None:
+            raise
+        replica.failures += 1
+        replica.eject(f"acquire failed: {e}")
+        replica, target = None, pool
+        conn = await pool.acquire()
+    finally:
+        _waiting -= 1
+    db_pool_acquire_seconds.observe(time.perf_counter() - started)
+    if replica is not None:
+        replica.reads += 1
+    try:
+        yield conn
+    finally:
+        await target.release(conn)
+
+@asynccontextmanager
+async def connection():
+    """
+    Run a block of queries on one pooled connection. The query helpers called inside
+    the block reuse it; if a connection is already bound (e.g. by the request-scoped
+    dependency) that one is yielded instead of acquiring another.
+    """
+    conn = _bound_connection.get()
+    if conn is not None:
+        yield conn
+        return
+    async with pool_connection() as conn:
+        token = _bound_connection.set(conn)
+        try:
+            yield conn
+        finally:
+            _bound_connection.reset(token)
+
+@asynccontextmanager
+async def transaction():
+    """Like connection(), inside a transaction (a savepoint when one is already open)."""
+    note_write()
+    async with connection() as conn:
+        if _after_commit.get() is not None:
+            async with conn.transaction():
+                yield conn
+            return
+        callbacks = []
+        token = _after_commit.set(callbacks)
+        try:
+            async with conn.transaction():
+                yield conn
+        finally:
+            _after_commit.reset(token)
+        await run_after_commit(callbacks)
+
+async def after_commit(callback):
+    """
+    Await `callback()` once the current transaction commits (never, if it rolls back).
+    Outside transaction()/db_transaction the statements have already committed, so
+    it runs right away.
+    """
+    callbacks = _after_commit.get()
+    if callbacks is None:
+        await callback()
+    else:
+        callbacks.append(callback)
+
+def collect_after_commit() -> list:
+    """Collect after_commit callbacks for the current request (used by db_transaction)."""
+    callbacks = []
+    _after_commit.set(callbacks)
+    return callbacks
+
+def stop_collecting_after_commit():
+    _after_commit.set(None)
+
+async def run_after_commit(callbacks):
+    for callback in callbacks:
+        try:
+            await callback()
+        except Exception:
+            # The transaction is committed; a failed follow-up must not turn it into an error
+            logger.exception("after_commit callback failed")
+
+def bind_connection(conn):
+    """Bind `conn` for the current request; used by app.core.dependencies."""
+    _bound_connection.set(conn)
+
+def unbind_connection():
+    _bound_connection.set(None)
+
+async def _run(method: str, query, *args, use_replica: bool = False):
+    """
+    Run one statement, recording latency and rows; acquires a connection only if none
+    is bound. A bound connection always wins, so reads inside a transaction see its writes.
+    """
+    conn = _bound_connection.get()
+    if conn is None:
+        async with pool_connection(use_replica) as conn:
+            return await _execute(conn, method, query, *args)
+    return await _execute(conn, method, query, *args)
+
+async def _execute(conn, method: str, query, *args):
+    started = time.perf_counter()
+    try:
+        result = await getattr(conn, method)(query, *args)
+    except Exception:
+        record_query(query, None, time.perf_counter() - started, error=True)
+        raise
+    record_query(query, None, time.perf_counter() - started, row_count(result))
+    return result
+
+async def fetch_one(query, *args, use_replica: bool = False):
+    return await _run("fetchrow", query, *args, use_replica=use_replica)
+
+async def fetch_all(query, *args, use_replica: bool = False):
+    return await _run("fetch", query, *args, use_replica=use_replica)
 
 async def execute(query, *args):
-    async with pool.acquire() as conn:
-        return await conn.execute(query, *args)
+    note_write()
+    return await _run("execute", query, *args)
 
 async def execute_returning(query, *args):
-    async with pool.acquire() as conn:
-        return await conn.fetchrow(query, *args)
\ No newline at end of file
+    note_write()
+    return await _run("fetchrow", query, *args)
+
+def pool_stats():
+    if pool is None:
+        return {"connected": 0}
+    size, idle = pool.get_size(), pool.get_idle_size()
+    in_use = size - idle
+    return {
+        "connected": 1,
+        "size": size,
+        "idle": idle,
+        "in_use": in_use,
+        "max_size": pool.get_max_size(),
+        "waiting": _waiting,
+        "saturation": round(in_use / pool.get_max_size(), 4),
+    }
+
+register_collector("db_pool", pool_stats)
+register_collector("db_replicas", lambda: {r.name: r.stats() for r in replicas})
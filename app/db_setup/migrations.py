@@ -0,0 +1,185 @@
+"""
+Versioned schema migrations.
+
+Each file in sql/migrations named `NNNN_description.sql` is one version. Pending
+versions are applied in order, each inside its own transaction, and recorded in
+the `schema_migrations` table. A Postgres advisory lock keeps concurrent app
+instances from migrating at the same time.
+
+A file whose first line is `-- migrate:no-transaction` runs statement by statement
+outside a transaction instead, so it can use CREATE INDEX CONCURRENTLY on tables
+that are being written to. Its statements must be safe to re-run (IF NOT EXISTS,
+OR REPLACE), since a failure part-way leaves the earlier ones applied; an index
+left INVALID by a failed concurrent build is dropped before it is built again.
+
+Run manually with:  python -m app.db_setup.migrations [--target N]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import re
+
+import asyncpg
+
+from app.core.config import settings
+
+MIGRATIONS_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "../../sql/migrations"))
+MIGRATION_FILE_RE = re.compile(r"^(\d+)_(\w+)\.sql$")
+MIGRATION_LOCK_ID = 7_310_420_001
+NO_TRANSACTION_MARKER = "-- migrate:no-transaction"
+CONCURRENT_INDEX_RE = re.compile(
+    r"^\s*CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)",
+    re.IGNORECASE | re.MULTILINE)
+_DOLLAR_QUOTE_RE = re.compile(r"\$(?:[A-Za-z_]\w*)?\$")
+
+
+def load_migrations(directory: str = MIGRATIONS_DIR):
+    """Return [(version, name, sql, checksum)] sorted by version."""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE_RE.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename), "r", encoding="utf-8") as f:
+            sql = f.read()
+        checksum = hashlib.sha256(sql.encode("utf-8")).hexdigest()
+        migrations.append((int(match.group(1)), match.group(2), sql, checksum))
+    migrations.sort(key=lambda m: m[0])
+
+    versions = [m[0] for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def split_statements(sql: str):
+    """Split a script on top-level semicolons, skipping comments, quoted strings and $$ bodies."""
+    statements, start, i, n = [], 0, 0, len(sql)
+    while i < n:
+        if sql.startswith("--", i):
+            i = sql.find("\n", i)
+            i = n if i < 0 else i
+        elif sql.startswith("/*", i):
+            i = sql.find("*/", i + 2)
+            i = n if i < 0 else i + 2
+        elif sql[i] == "'":
+            i = sql.find("'", i + 1)
+            while i >= 0 and sql.startswith("''", i):
+                i = sql.find("'", i + 2)
+            i = n if i < 0 else i + 1
+        elif sql[i] == "$" and (match := _DOLLAR_QUOTE_RE.match(sql, i)):
+            end = sql.find(match.group(), match.end())
+            i = n if end < 0 else end + len(match.group())
+        elif sql[i] == ";":
+            statements.append(sql[start:i])
+            start = i = i + 1
+        else:
+            i += 1
+    statements.append(sql[start:])
+    # Drop the pieces that hold nothing but comments and whitespace
+    return [s.strip() for s in statements if _has_code(s)]
+
+
+def _has_code(statement: str) -> bool:
+    return any(line.strip() and not line.strip().startswith("--") for line in statement.splitlines())
+
+
+async def _drop_invalid_index(conn, name: str):
+    invalid = await conn.fetchval("""
+        SELECT NOT i.indisvalid
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = $1 AND pg_table_is_visible(c.oid)
+    """, name)
+    if invalid:
+        await conn.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+async def _apply_without_transaction(conn, sql: str):
+    for statement in split_statements(sql):
+        match = CONCURRENT_INDEX_RE.search(statement)
+        if match:
+            await _drop_invalid_index(conn, match.group(1))
+        await conn.execute(statement)
+
+
+async def _ensure_migrations_table(conn):
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            checksum TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+
+
+async def migration_status(conn):
+    """List every known migration with whether (and when) it has been applied."""
+    await _ensure_migrations_table(conn)
+    applied = {r["version"]: r for r in await conn.fetch("SELECT * FROM schema_migrations")}
+    status = []
+    for version, name, _, checksum in load_migrations():
+        row = applied.get(version)
+        status.append({
+            "version": version,
+            "name": name,
+            "applied": row is not None,
+            "applied_at": row["applied_at"] if row else None,
+            "checksum_mismatch": bool(row and row["checksum"] != checksum),
+        })
+    return status
+
+
+async def apply_migrations(conn, target: int = None):
+    """
+    Apply every pending migration up to `target` (all when None).
+    Returns the [(version, name)] that were applied by this call.
+    """
+    await _ensure_migrations_table(conn)
+    await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+    try:
+        applied_versions = {r["version"] for r in await conn.fetch("SELECT version FROM schema_migrations")}
+        applied_now = []
+        for version, name, sql, checksum in load_migrations():
+            if version in applied_versions or (target is not None and version > target):
+                continue
+            if sql.lstrip().startswith(NO_TRANSACTION_MARKER):
+                await _apply_without_transaction(conn, sql)
+                await conn.execute(
+                    "INSERT INTO schema_migrations (version, name, checksum) VALUES ($1, $2, $3)",
+                    version, name, checksum
+                )
+            else:
+                async with conn.transaction():
+                    await conn.execute(sql)
+                    await conn.execute(
+                        "INSERT INTO schema_migrations (version, name, checksum) VALUES ($1, $2, $3)",
+                        version, name, checksum
+                    )
+            applied_now.append((version, name))
+        return applied_now
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description="Apply pending FieldOps schema migrations")
+    parser.add_argument("--dsn", default=settings.DATABASE_URL)
+    parser.add_argument("--target", type=int, default=None, help="Stop after this version")
+    args = parser.parse_args()
+
+    conn = await asyncpg.connect(args.dsn)
+    try:
+        applied = await apply_migrations(conn, target=args.target)
+    finally:
+        await conn.close()
+    for version, name in applied:
+        print(f"Applied {version:04d}_{name}")
+    if not applied:
+        print("Database schema is up to date")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -1,40 +1,45 @@
 # app/api/v1/setup.py
 
-import os
-from fastapi import APIRouter, HTTPException, status
-from app.database import execute
+from fastapi import APIRouter, Depends, HTTPException, status
+from app import database
+from app.core.security import require_role
+from app.db_setup.migrations import apply_migrations, migration_status
 
-router = APIRouter(prefix="/setup", tags=["Setup"])
+# Migrations run at startup (RUN_MIGRATIONS_ON_STARTUP); these are admin-only tools now
+router = APIRouter(prefix="/setup", tags=["Setup"], dependencies=[Depends(require_role("ADMIN"))])
 
-@router.post("/tables", status_code=status.HTTP_201_CREATED)
-async def create_tables_from_file():
+@router.post("/migrations", status_code=status.HTTP_201_CREATED)
+async def run_migrations():
     """
-    Reads schema.sql and executes all SQL commands to create tables.
-    Accessible without authentication.
+    Applies pending migrations from sql/migrations and records them in schema_migrations.
+    Safe to call repeatedly; already-applied versions are skipped.
     """
-    sql_file_path = os.path.join(os.path.dirname(__file__), "../../../sql/schema.sql")
-
-    if not os.path.exists(sql_file_path):
-        raise HTTPException(
-            status_code=404,
-            detail=f"SQL file not found at: {sql_file_path}"
-        )
-
     try:
-        with open(sql_file_path, "r", encoding="utf-8") as f:
-            sql_commands = f.read()
-
-        # Execute the entire file content
-        await execute(sql_commands)
-
-        return {
-            "message": "Tables created successfully from schema.sql!",
-            "file": sql_file_path,
-            "status": "success"
-        }
-
+        async with database.pool_connection() as conn:
+            applied = await apply_migrations(conn)
     except Exception as e:
         raise HTTPException(
             status_code=500,
-            detail=f"Failed to execute SQL file: {str(e)}"
+            detail=f"Failed to apply migrations: {str(e)}"
         )
+
+    return {
+        "message": "Migrations applied" if applied else "Database schema is up to date",
+        "applied": [{"version": v, "name": n} for v, n in applied],
+        "status": "success"
+    }
+
+@router.get("/migrations")
+async def list_migrations():
+    """
+    Shows every known migration and whether it has been applied.
+    """
+    async with database.pool_connection() as conn:
+        return await migration_status(conn)
+
+@router.post("/tables", status_code=status.HTTP_201_CREATED, deprecated=True)
+async def create_tables_from_file():
+    """
+    Kept for existing deploy scripts; same as POST /setup/migrations.
+    """
+    return await run_migrations()
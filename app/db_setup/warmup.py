@@ -0,0 +1,50 @@
+"""
+Connection warm-up.
+
+asyncpg prepares a statement the first time a connection runs it and caches it per
+connection. Running the hot read-only statements on every pooled connection before the
+instance reports ready means the first real requests skip that round trip. The same
+routine is the pool's `init` hook, so connections opened later (growth past min_size,
+replacements after DB_MAX_INACTIVE_CONNECTION_LIFETIME) arrive warm as well.
+"""
+
+import asyncio
+
+from app import database
+from app.api.v1.auth import LOGIN_SQL
+from app.api.v1.utils import COUNTERS_SQL
+from app.core.security import PRINCIPAL_SQL
+from app.services.geo import NEAREST_WORKERS_SQL
+
+# (statement, harmless arguments); must stay read-only
+HOT_STATEMENTS = (
+    (PRINCIPAL_SQL, (0,)),
+    (LOGIN_SQL, ("",)),
+    (COUNTERS_SQL, ([], 0)),
+    ("SELECT * FROM service_requests WHERE id = $1", (0,)),
+    (NEAREST_WORKERS_SQL, ([], 0)),
+)
+
+# Off until migrations have run, so init never prepares against a stale schema
+_enabled = False
+
+
+async def warm_connection(conn):
+    if not _enabled:
+        return
+    for sql, args in HOT_STATEMENTS:
+        await conn.fetch(sql, *args)
+
+
+async def warm_pool():
+    """Hold min_size connections at once (so each is distinct) and warm every one."""
+    global _enabled
+    _enabled = True
+    pool = database.pool
+    conns = await asyncio.gather(*(pool.acquire() for _ in range(pool.get_min_size())))
+    try:
+        await asyncio.gather(*(warm_connection(conn) for conn in conns))
+    finally:
+        for conn in conns:
+            await pool.release(conn)
+    return len(conns)
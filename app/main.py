@@ -1,34 +1,118 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+import asyncpg
 from fastapi import FastAPI
-from app.database import connect_db, disconnect_db
-from app.api.v1 import admin_dashboard, auth, users, worker
+from app.core.config import settings
+from app.core.hashing import password_hasher
+from app.core.admission import AdmissionMiddleware
+from app.core.body_limit import BodyLimitMiddleware
+from app.core.instrumentation import DBInstrumentationMiddleware
+from app.core.read_your_writes import ReadYourWritesMiddleware
+from app.core.readiness import startup_state
+from app.core.revocation import revocations
+from app.database import connect_db, connect_replicas, disconnect_db, replica_health_loop, with_connect_retry
+from app.api import health, internal
+from app.api.v1 import admin_dashboard, auth, events, users, worker
 from app.db_setup import setup  # 👈 Add this import
+from app.db_setup.migrations import apply_migrations
+from app.db_setup.warmup import warm_connection, warm_pool
+from app.services import analytics, archival, dispatch, proof_images
+from app.services.broadcaster import broadcaster
+from app.services.task_history import task_history
+
+logger = logging.getLogger(__name__)
+
+
+async def run_migrations():
+    # Own connection, so this runs alongside pool creation instead of after it
+    conn = await with_connect_retry(lambda: asyncpg.connect(settings.DATABASE_URL))
+    try:
+        applied = await apply_migrations(conn)
+    finally:
+        await conn.close()
+    for version, name in applied:
+        logger.info("Applied migration %04d_%s", version, name)
+
+
+async def start_background_services(app: FastAPI):
+    app.state.revocation_task = asyncio.create_task(revocations.refresh_loop())
+    if settings.DATABASE_REPLICA_URLS:
+        app.state.replica_health_task = asyncio.create_task(replica_health_loop())
+    if settings.EVENTS_ENABLED:
+        await broadcaster.start()
+    if settings.TASK_HISTORY_ENABLED:
+        await task_history.start()
+    if settings.DISPATCH_ENABLED:
+        app.state.dispatch_task = asyncio.create_task(dispatch.dispatch_loop())
+    if proof_images.enabled():
+        app.state.proof_image_task = asyncio.create_task(proof_images.proof_image_loop())
+    if settings.ANALYTICS_ENABLED:
+        app.state.analytics_task = asyncio.create_task(analytics.analytics_loop())
+    if settings.ARCHIVE_ENABLED:
+        app.state.archive_task = asyncio.create_task(archival.archive_loop())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Any failure here aborts startup: better to crash-loop than serve with no pool
+    startup_state.phase = "connecting"
+    phases = [
+        startup_state.timed("connect_pool", connect_db(init=warm_connection)),
+        startup_state.timed("password_hasher", password_hasher.warm()),
+    ]
+    if settings.RUN_MIGRATIONS_ON_STARTUP:
+        phases.append(startup_state.timed("migrations", run_migrations()))
+    if settings.DATABASE_REPLICA_URLS:
+        phases.append(startup_state.timed("connect_replicas", connect_replicas(init=warm_connection)))
+    await asyncio.gather(*phases)
+    startup_state.phase = "warming"
+    await asyncio.gather(
+        startup_state.timed("warm_pool", warm_pool()),
+        # First revocation snapshot, so token claims are trusted from the first request
+        startup_state.timed("token_revocations", revocations.refresh()),
+    )
+    await startup_state.timed("background_services", start_background_services(app))
+    startup_state.mark_ready()
+    logger.info("Ready in %.2fs %s", startup_state.total_seconds, startup_state.timings)
+
+    yield
+
+    startup_state.mark_stopping()
+    for name in ("revocation_task", "replica_health_task", "dispatch_task", "proof_image_task", "analytics_task",
+                 "archive_task"):
+        background_task = getattr(app.state, name, None)
+        if background_task:
+            background_task.cancel()
+    await broadcaster.stop()
+    # Before the pool closes: buffered history is flushed (or spilled) on the way out
+    await task_history.stop()
+    try:
+        await disconnect_db()
+    except Exception:
+        logger.exception("Failed to close the database pool")
+    password_hasher.shutdown()
 
 
 app = FastAPI(
     title="FieldOps - Field Service Coordination Platform",
     description="Backend API for managing field workers, tasks, and service requests with JWT auth and role-based access.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# Admission runs inside instrumentation, so refused requests still show up in the route metrics
+app.add_middleware(BodyLimitMiddleware)
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(DBInstrumentationMiddleware)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["Auth"])
 app.include_router(users.router, prefix="/api/v1/user", tags=["Users"])
 app.include_router(worker.router, prefix="/api/v1/tasks", tags=["field_operations"])
 app.include_router(admin_dashboard.router, prefix="/api/v1/dashboard", tags=["Admin_Dashboard"])
 app.include_router(setup.router, prefix="/api/v1/setup")  # 👈 Add this line
-
-@app.on_event("startup")
-async def startup():
-    try:
-        await connect_db()
-        print("Database connected")
-    except Exception as e:
-        print("Failed to connect to DB:", e)
-
-@app.on_event("shutdown")
-async def shutdown():
-    try:
-        await disconnect_db()
-        print("Database disconnected")
-    except Exception as e:
-        print("Failed to disconnect DB:", e)
+app.include_router(events.router, prefix="/api/v1")
+app.include_router(internal.router)
+app.include_router(health.router)
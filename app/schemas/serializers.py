@@ -0,0 +1,106 @@
+"""
+Fast response serialization for trusted database rows.
+
+A RecordEncoder is built once per output schema. It reads the schema's fields up
+front and precomputes a converter per field, then turns asyncpg Records (or dicts)
+straight into JSON bytes. Rows from our own queries are already typed, so this
+skips the Record -> dict -> Pydantic model -> jsonable_encoder -> json chain.
+Only the fields declared on the schema are emitted (e.g. never hashed_password).
+"""
+
+import json
+import typing
+from datetime import date, datetime
+
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from app.schemas.task import ServiceRequestOut, TaskProofOut
+from app.schemas.user import UserOut
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+
+def dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def _unwrap_optional(annotation):
+    if typing.get_origin(annotation) is typing.Union:
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def _iso(value):
+    # Values decoded from json_agg() arrive as ISO strings already
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+
+class RecordEncoder:
+    def __init__(self, model: typing.Type[BaseModel], fields=None):
+        self.model = model
+        self.fields = tuple(fields or model.model_fields)
+        self._plan = tuple(self._compile(name) for name in self.fields)
+        self._subsets = {}
+
+    def _compile(self, name: str):
+        field = self.model.model_fields[name]
+        annotation = _unwrap_optional(field.annotation)
+        default = None if field.is_required() else field.get_default(call_default_factory=True)
+
+        converter = None
+        if annotation in (datetime, date):
+            # orjson serializes datetimes natively, in the same ISO format
+            converter = None if orjson is not None else _iso
+        elif typing.get_origin(annotation) in (list, typing.List):
+            (item,) = typing.get_args(annotation) or (None,)
+            if isinstance(item, type) and issubclass(item, BaseModel):
+                nested = RecordEncoder(item)
+                converter = lambda rows, nested=nested: [nested.to_dict(r) for r in rows or ()]
+        return name, default, converter
+
+    def project(self, fields) -> "RecordEncoder":
+        """Encoder for a subset of this schema's fields (cached)."""
+        key = tuple(fields)
+        if key == self.fields:
+            return self
+        if key not in self._subsets:
+            self._subsets[key] = RecordEncoder(self.model, key)
+        return self._subsets[key]
+
+    def to_dict(self, row, **overrides) -> dict:
+        out = {}
+        for name, default, converter in self._plan:
+            value = overrides[name] if name in overrides else row.get(name, default)
+            out[name] = converter(value) if converter is not None else value
+        return out
+
+    def encode(self, row, **overrides) -> bytes:
+        return dumps(self.to_dict(row, **overrides))
+
+    def encode_many(self, rows) -> bytes:
+        return dumps([self.to_dict(r) for r in rows])
+
+
+class TrustedJSONResponse(Response):
+    """
+    JSON response for content that is already encoded bytes.
+    Returning a Response from a handler makes FastAPI skip response_model
+    validation, so only use it with encoders built from that response_model.
+    """
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return content if isinstance(content, bytes) else dumps(content)
+
+
+service_request_encoder = RecordEncoder(ServiceRequestOut)
+task_proof_encoder = RecordEncoder(TaskProofOut)
+user_encoder = RecordEncoder(UserOut)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional, List
 from datetime import datetime
 
@@ -14,6 +14,7 @@ class TaskProofOut(BaseModel):
     image_path: Optional[str]
     notes: Optional[str]
     uploaded_at: datetime
+    variants: dict = {}  # generated thumbnails/previews, filled in asynchronously
 
 # -------------------------
 # Service Request Base Models
@@ -23,6 +24,14 @@ class ServiceRequestBase(BaseModel):
     description: Optional[str] = None
     location: str
     urgency: str = "MEDIUM"
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+
+    @model_validator(mode="after")
+    def coordinates_pair(self):
+        if (self.latitude is None) != (self.longitude is None):
+            raise ValueError("latitude and longitude must be given together")
+        return self
 
 class ServiceRequestCreate(ServiceRequestBase):
     proofs: Optional[List[TaskProofCreate]] = []  # Optional proofs when creating a task
@@ -30,6 +39,13 @@ class ServiceRequestCreate(ServiceRequestBase):
 class ServiceRequestAssign(BaseModel):
     field_worker_id: int
 
+class TaskAssignmentItem(BaseModel):
+    task_id: int
+    field_worker_id: int
+
+class TaskAssignmentBatch(BaseModel):
+    assignments: List[TaskAssignmentItem] = Field(..., min_length=1, max_length=1000)
+
 class ServiceRequestStatusUpdate(BaseModel):
     status: str
 
@@ -29,4 +29,8 @@ class UserOut(UserBase):
 
 class AdminUserUpdate(BaseModel):
     is_active: Optional[bool] = None
-    is_approved: Optional[bool] = None
\ No newline at end of file
+    is_approved: Optional[bool] = None
+
+class WorkerLocationUpdate(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
@@ -0,0 +1,290 @@
+"""
+Operational analytics over pre-aggregated rollups (sql/migrations/0009_analytics_rollups.sql).
+
+A background job finds service_requests rows whose updated_at is past the stored
+watermark, collects the hours (created_at and completed_at) and days (completed_at)
+they fall in, and recomputes exactly those buckets from the base table. Recomputing
+whole buckets keeps the job idempotent, so each pass re-reads a short overlap behind
+the watermark to catch transactions that committed out of order. Buckets a task has
+left (reopened, or deleted) are recorded by a trigger in analytics_stale_buckets
+(0012) and recomputed by the same pass.
+
+Completion-time percentiles come from log-bucket sketches stored per bucket; merging
+sketches is a sum of counts, so the dashboard endpoints answer any date range from
+the rollups alone.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from app import database
+from app.core.config import settings
+from app.core.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+SKETCH_GAMMA = 1.02 / 0.98  # must match analytics_sketch_index() in the migration
+ROLLUP_LOCK_ID = 7_310_420_002
+WATERMARK = "service_requests.updated_at"
+# Re-read this far behind the watermark: updated_at is set before commit
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+stats = {
+    "runs": 0,
+    "hours_recomputed": 0,
+    "days_recomputed": 0,
+    "last_run_seconds": 0.0,
+    "errors": 0,
+}
+register_collector("analytics", lambda: stats)
+
+RECOMPUTE_HOURS_SQL = """
+    WITH hours AS (
+        SELECT DISTINCT h FROM unnest($1::timestamp[]) AS h
+    ),
+    created AS (
+        SELECT h AS bucket, COALESCE(sr.urgency, 'UNKNOWN') AS urgency, COUNT(*) AS n
+        FROM hours
+        JOIN service_requests_all sr ON sr.created_at >= h AND sr.created_at < h + interval '1 hour'
+        GROUP BY 1, 2
+    ),
+    done AS (
+        SELECT h AS bucket, COALESCE(sr.urgency, 'UNKNOWN') AS urgency,
+               GREATEST(EXTRACT(EPOCH FROM sr.completed_at - sr.created_at), 0)::float8 AS seconds,
+               sr.rating
+        FROM hours
+        JOIN service_requests_all sr ON sr.completed_at >= h AND sr.completed_at < h + interval '1 hour'
+        WHERE sr.status = 'COMPLETED'
+    ),
+    done_agg AS (
+        SELECT bucket, urgency, COUNT(*) AS completed, SUM(seconds) AS seconds_sum,
+               COUNT(rating) AS rated, COALESCE(SUM(rating), 0) AS rating_sum
+        FROM done GROUP BY 1, 2
+    ),
+    sketches AS (
+        SELECT bucket, urgency, jsonb_object_agg(idx, n) AS sketch
+        FROM (
+            SELECT bucket, urgency, analytics_sketch_index(seconds) AS idx, COUNT(*) AS n
+            FROM done GROUP BY 1, 2, 3
+        ) s
+        GROUP BY 1, 2
+    )
+    INSERT INTO task_rollups_hourly
+        (bucket, urgency, created, completed, completion_seconds_sum, completion_sketch, rated, rating_sum)
+    SELECT COALESCE(c.bucket, d.bucket), COALESCE(c.urgency, d.urgency),
+           COALESCE(c.n, 0), COALESCE(d.completed, 0), COALESCE(d.seconds_sum, 0),
+           COALESCE(s.sketch, '{}'::jsonb), COALESCE(d.rated, 0), COALESCE(d.rating_sum, 0)
+    FROM created c
+    FULL JOIN done_agg d ON d.bucket = c.bucket AND d.urgency = c.urgency
+    LEFT JOIN sketches s ON s.bucket = COALESCE(c.bucket, d.bucket) AND s.urgency = COALESCE(c.urgency, d.urgency)
+"""
+
+RECOMPUTE_DAYS_SQL = """
+    WITH days AS (
+        SELECT DISTINCT d FROM unnest($1::date[]) AS d
+    ),
+    done AS (
+        SELECT d AS day, sr.field_worker_id,
+               GREATEST(EXTRACT(EPOCH FROM sr.completed_at - sr.created_at), 0)::float8 AS seconds,
+               sr.rating
+        FROM days
+        JOIN service_requests_all sr ON sr.completed_at >= d AND sr.completed_at < d + 1
+        WHERE sr.status = 'COMPLETED' AND sr.field_worker_id IS NOT NULL
+    ),
+    sketches AS (
+        SELECT day, field_worker_id, jsonb_object_agg(idx, n) AS sketch
+        FROM (
+            SELECT day, field_worker_id, analytics_sketch_index(seconds) AS idx, COUNT(*) AS n
+            FROM done GROUP BY 1, 2, 3
+        ) s
+        GROUP BY 1, 2
+    )
+    INSERT INTO worker_rollups_daily
+        (day, field_worker_id, completed, completion_seconds_sum, completion_sketch, rated, rating_sum)
+    SELECT d.day, d.field_worker_id, COUNT(*), SUM(d.seconds), s.sketch,
+           COUNT(d.rating), COALESCE(SUM(d.rating), 0)
+    FROM done d
+    JOIN sketches s ON s.day = d.day AND s.field_worker_id = d.field_worker_id
+    GROUP BY d.day, d.field_worker_id, s.sketch
+"""
+
+
+# ---- sketches ----
+
+def merge_sketches(sketches) -> dict:
+    merged = defaultdict(int)
+    for sketch in sketches:
+        for idx, count in (sketch or {}).items():
+            merged[int(idx)] += int(count)
+    return merged
+
+
+def sketch_quantiles(sketch: dict, quantiles=(0.5, 0.9, 0.95, 0.99)) -> dict:
+    """{"p50": seconds, ...} from a merged sketch; values are within 2% of the exact ones."""
+    total = sum(sketch.values())
+    if not total:
+        return {f"p{round(q * 100):g}": None for q in quantiles}
+    ordered = sorted(sketch.items())
+    out = {}
+    for q in quantiles:
+        rank, seen = q * (total - 1), 0
+        for idx, count in ordered:
+            seen += count
+            if seen > rank:
+                break
+        # Midpoint (in relative terms) of (gamma^(idx-1), gamma^idx]
+        value = 0.0 if idx == 0 else 2 * SKETCH_GAMMA ** idx / (SKETCH_GAMMA + 1)
+        out[f"p{round(q * 100):g}"] = round(value, 1)
+    return out
+
+
+# ---- refresh ----
+
+async def refresh_rollups(conn) -> dict:
+    """
+    Recompute the buckets touched since the watermark. Runs in one transaction; when
+    another instance holds the rollup lock this is a no-op.
+    """
+    async with conn.transaction():
+        if not await conn.fetchval("SELECT pg_try_advisory_xact_lock($1)", ROLLUP_LOCK_ID):
+            return {"skipped": True}
+
+        watermark = await conn.fetchval("SELECT value FROM analytics_watermarks WHERE name = $1", WATERMARK)
+        since = watermark - WATERMARK_OVERLAP if watermark else datetime.min
+        changed = await conn.fetchrow("""
+            WITH stale AS (
+                -- Rows committed after this snapshot stay for the next pass
+                DELETE FROM analytics_stale_buckets RETURNING created_at, completed_at
+            ),
+            changed AS (
+                SELECT created_at, completed_at, updated_at
+                FROM service_requests
+                WHERE updated_at > $1
+                UNION ALL
+                SELECT created_at, completed_at, NULL FROM stale
+            )
+            SELECT
+                (SELECT array_agg(DISTINCT h) FROM (
+                    SELECT date_trunc('hour', created_at) AS h FROM changed WHERE created_at IS NOT NULL
+                    UNION ALL
+                    SELECT date_trunc('hour', completed_at) FROM changed WHERE completed_at IS NOT NULL
+                ) hs) AS hours,
+                (SELECT array_agg(DISTINCT completed_at::date) FROM changed WHERE completed_at IS NOT NULL) AS days,
+                (SELECT max(updated_at) FROM changed) AS high_water
+        """, since)
+
+        hours, days = changed["hours"] or [], changed["days"] or []
+        # Whole buckets are rebuilt, so anything that left a bucket drops out of it too
+        if hours:
+            await conn.execute("DELETE FROM task_rollups_hourly WHERE bucket = ANY($1::timestamp[])", hours)
+            await conn.execute(RECOMPUTE_HOURS_SQL, hours)
+        if days:
+            await conn.execute("DELETE FROM worker_rollups_daily WHERE day = ANY($1::date[])", days)
+            await conn.execute(RECOMPUTE_DAYS_SQL, days)
+        if changed["high_water"] and (watermark is None or changed["high_water"] > watermark):
+            await conn.execute("""
+                INSERT INTO analytics_watermarks (name, value) VALUES ($1, $2)
+                ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value
+            """, WATERMARK, changed["high_water"])
+        return {"hours": len(hours), "days": len(days)}
+
+
+async def analytics_loop():
+    while True:
+        started = time.perf_counter()
+        try:
+            async with database.pool_connection() as conn:
+                result = await refresh_rollups(conn)
+            stats["runs"] += 1
+            stats["hours_recomputed"] += result.get("hours", 0)
+            stats["days_recomputed"] += result.get("days", 0)
+            stats["last_run_seconds"] = round(time.perf_counter() - started, 3)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            stats["errors"] += 1
+            logger.exception("Analytics rollup refresh failed")
+        await asyncio.sleep(settings.ANALYTICS_REFRESH_SECONDS)
+
+
+# ---- reads (rollups only) ----
+
+async def task_analytics(start: date, end: date, urgency: str = None) -> dict:
+    """Daily throughput per urgency and completion-time percentiles for days [start, end)."""
+    rows = await database.fetch_all("""
+        SELECT bucket::date AS day, urgency,
+               SUM(created) AS created, SUM(completed) AS completed,
+               SUM(completion_seconds_sum) AS completion_seconds_sum,
+               SUM(rated) AS rated, SUM(rating_sum) AS rating_sum,
+               jsonb_agg(completion_sketch) AS sketches
+        FROM task_rollups_hourly
+        WHERE bucket >= $1::date AND bucket < $2::date AND ($3::text IS NULL OR urgency = $3)
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+    """, start, end, urgency, use_replica=True)
+
+    days = []
+    all_sketches, totals = [], defaultdict(float)
+    for r in rows:
+        sketches = _json(r["sketches"])
+        all_sketches.extend(sketches)
+        for key in ("created", "completed", "completion_seconds_sum", "rated", "rating_sum"):
+            totals[key] += r[key]
+        days.append({
+            "day": r["day"].isoformat(),
+            "urgency": r["urgency"],
+            "created": r["created"],
+            "completed": r["completed"],
+        })
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "throughput": days,
+        "totals": {
+            "created": int(totals["created"]),
+            "completed": int(totals["completed"]),
+            "avg_completion_seconds": round(totals["completion_seconds_sum"] / totals["completed"], 1)
+            if totals["completed"] else None,
+            "avg_rating": round(totals["rating_sum"] / totals["rated"], 2) if totals["rated"] else None,
+        },
+        "completion_seconds": sketch_quantiles(merge_sketches(all_sketches)),
+    }
+
+
+async def worker_analytics(start: date, end: date, field_worker_id: int = None, limit: int = 100) -> list:
+    """Per-worker completions, average rating and completion-time percentiles for days [start, end)."""
+    rows = await database.fetch_all("""
+        SELECT r.field_worker_id, u.username,
+               SUM(r.completed) AS completed, SUM(r.completion_seconds_sum) AS completion_seconds_sum,
+               SUM(r.rated) AS rated, SUM(r.rating_sum) AS rating_sum,
+               jsonb_agg(r.completion_sketch) AS sketches
+        FROM worker_rollups_daily r
+        LEFT JOIN users u ON u.id = r.field_worker_id
+        WHERE r.day >= $1 AND r.day < $2 AND ($3::int IS NULL OR r.field_worker_id = $3)
+        GROUP BY r.field_worker_id, u.username
+        ORDER BY SUM(r.completed) DESC, r.field_worker_id
+        LIMIT $4
+    """, start, end, field_worker_id, limit, use_replica=True)
+
+    return [
+        {
+            "field_worker_id": r["field_worker_id"],
+            "username": r["username"],
+            "completed": r["completed"],
+            "rated": r["rated"],
+            "avg_rating": round(r["rating_sum"] / r["rated"], 2) if r["rated"] else None,
+            "avg_completion_seconds": round(r["completion_seconds_sum"] / r["completed"], 1) if r["completed"] else None,
+            "completion_seconds": sketch_quantiles(merge_sketches(_json(r["sketches"]))),
+        }
+        for r in rows
+    ]
+
+
+def _json(value):
+    # asyncpg returns json/jsonb as text unless a codec is registered
+    return json.loads(value) if isinstance(value, str) else value
@@ -0,0 +1,170 @@
+"""
+Moves old completed tasks out of service_requests (sql/migrations/0010_service_request_archive.sql).
+
+service_requests keeps open work and recently completed tasks, so its indexes and the
+pages the hot queries touch stay about the same size however much history builds up.
+COMPLETED tasks whose completed_at is older than ARCHIVE_AFTER_DAYS move, together
+with their proofs, into service_requests_archive and task_proofs_archive. Both are
+partitioned by the task's created_at month, and missing partitions are created on
+demand.
+
+Each batch is a single transaction: lock up to ARCHIVE_BATCH_SIZE rows (SKIP LOCKED,
+so a task being rated right now is left for the next pass), then copy and delete them.
+A crash leaves nothing half-moved. Counters are untouched because the move runs with
+fieldops.archiving set, which the stats trigger ignores.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+from app import database
+from app.core.config import settings
+from app.core.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_LOCK_ID = 7_310_420_003
+
+stats = {
+    "runs": 0,
+    "batches": 0,
+    "tasks_archived": 0,
+    "proofs_archived": 0,
+    "partitions_created": 0,
+    "last_run_seconds": 0.0,
+    "errors": 0,
+}
+register_collector("archival", lambda: stats)
+
+# Month starts with partitions known to exist, so most batches skip the DDL entirely
+_partitions = set()
+
+LOCK_BATCH_SQL = """
+    SELECT id, date_trunc('month', COALESCE(created_at, completed_at)) AS month
+    FROM service_requests
+    WHERE status = 'COMPLETED' AND completed_at < NOW() - make_interval(days => $1)
+    ORDER BY completed_at
+    LIMIT $2
+    FOR UPDATE SKIP LOCKED
+"""
+
+MOVE_BATCH_SQL = """
+    WITH proofs AS (
+        INSERT INTO task_proofs_archive (id, task_id, image_path, notes, uploaded_at, variants, task_created_at)
+        SELECT p.id, p.task_id, p.image_path, p.notes, p.uploaded_at, p.variants,
+               COALESCE(t.created_at, t.completed_at)
+        FROM task_proofs p
+        JOIN service_requests t ON t.id = p.task_id
+        WHERE p.task_id = ANY($1::int[])
+        RETURNING 1
+    ),
+    moved AS (
+        -- task_proofs rows go with it (ON DELETE CASCADE)
+        DELETE FROM service_requests
+        WHERE id = ANY($1::int[])
+        RETURNING *
+    ),
+    archived AS (
+        INSERT INTO service_requests_archive
+            (id, user_id, field_worker_id, title, description, location, urgency, status,
+             created_at, updated_at, completed_at, rating, latitude, longitude)
+        SELECT id, user_id, field_worker_id, title, description, location, urgency, status,
+               COALESCE(created_at, completed_at), updated_at, completed_at, rating, latitude, longitude
+        FROM moved
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM archived) AS tasks, (SELECT COUNT(*) FROM proofs) AS proofs
+"""
+
+
+def partition_suffix(month: datetime) -> str:
+    return f"y{month.year:04d}m{month.month:02d}"
+
+
+def next_month(month: datetime) -> datetime:
+    return month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+
+
+async def ensure_partitions(conn, months) -> int:
+    """Create the archive partitions for these month starts if they are missing."""
+    created = 0
+    for month in sorted(set(months) - _partitions):
+        start, end = month.date().isoformat(), next_month(month).date().isoformat()
+        suffix = partition_suffix(month)
+        for parent in ("service_requests_archive", "task_proofs_archive"):
+            exists = await conn.fetchval("SELECT to_regclass($1) IS NOT NULL", f"{parent}_{suffix}")
+            if not exists:
+                # Identifiers and bounds come from the datetime above, never from input
+                await conn.execute(
+                    f"CREATE TABLE {parent}_{suffix} PARTITION OF {parent} "
+                    f"FOR VALUES FROM ('{start}') TO ('{end}')"
+                )
+                created += 1
+        _partitions.add(month)
+    return created
+
+
+async def archive_batch(conn, after_days: int, batch_size: int) -> dict:
+    """
+    Archive one batch of tasks completed more than `after_days` ago. When another instance
+    holds the archive lock this is a no-op.
+    """
+    async with conn.transaction():
+        if not await conn.fetchval("SELECT pg_try_advisory_xact_lock($1)", ARCHIVE_LOCK_ID):
+            return {"skipped": True, "tasks": 0, "proofs": 0}
+        await conn.execute("SET LOCAL fieldops.archiving = 'on'")
+
+        batch = await conn.fetch(LOCK_BATCH_SQL, after_days, batch_size)
+        if not batch:
+            return {"tasks": 0, "proofs": 0}
+        partitions = await ensure_partitions(conn, [r["month"] for r in batch])
+        moved = await conn.fetchrow(MOVE_BATCH_SQL, [r["id"] for r in batch])
+        return {"tasks": moved["tasks"], "proofs": moved["proofs"], "partitions": partitions}
+
+
+async def archive_completed(conn, after_days: int = None, batch_size: int = None) -> dict:
+    """Archive in batches until no task completed more than `after_days` ago is left."""
+    after_days = settings.ARCHIVE_AFTER_DAYS if after_days is None else after_days
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    totals = {"tasks": 0, "proofs": 0, "partitions": 0, "batches": 0}
+    while True:
+        try:
+            result = await archive_batch(conn, after_days, batch_size)
+        except Exception:
+            # The transaction rolled back, so a partition cached above may not exist
+            _partitions.clear()
+            raise
+        if result.get("skipped"):
+            break
+        totals["batches"] += 1
+        for key in ("tasks", "proofs", "partitions"):
+            totals[key] += result.get(key, 0)
+        if result["tasks"] < batch_size:
+            break
+        # Let request traffic in between batches
+        await asyncio.sleep(0)
+    return totals
+
+
+async def archive_loop():
+    while True:
+        started = time.perf_counter()
+        try:
+            async with database.pool_connection() as conn:
+                result = await archive_completed(conn)
+            stats["runs"] += 1
+            stats["batches"] += result["batches"]
+            stats["tasks_archived"] += result["tasks"]
+            stats["proofs_archived"] += result["proofs"]
+            stats["partitions_created"] += result["partitions"]
+            stats["last_run_seconds"] = round(time.perf_counter() - started, 3)
+            if result["tasks"]:
+                logger.info("Archived %d completed tasks (%d proofs)", result["tasks"], result["proofs"])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            stats["errors"] += 1
+            logger.exception("Task archival failed")
+        await asyncio.sleep(settings.ARCHIVE_INTERVAL_SECONDS)
@@ -0,0 +1,194 @@
+"""
+Real-time task events.
+
+Handlers publish events with pg_notify on the `task_events` channel (inside their
+transaction, so nothing is sent for rolled-back work). Every app process keeps one
+dedicated LISTEN connection and fans events out in-process to its WebSocket/SSE
+subscribers. Each subscriber has a bounded queue; a client that falls behind is
+dropped rather than allowed to grow memory.
+
+The same connection listens on `cache_invalidations`, so every response cache
+invalidation (task events and publish_invalidation) reaches every process. The
+publishing process also invalidates locally once its transaction has committed,
+without waiting for the NOTIFY round trip; never before, or a concurrent read could
+cache the pre-commit state under the new tag version.
+"""
+
+import asyncio
+import json
+import logging
+
+import asyncpg
+
+from app import database
+from app.core.config import settings
+from app.core.metrics import register_collector
+from app.utils.response_cache import response_cache, task_tags
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "task_events"
+INVALIDATION_CHANNEL = "cache_invalidations"
+
+
+def task_event(event_type: str, task, previous_field_worker_id: int = None) -> dict:
+    """Compact event payload (NOTIFY payloads are limited to 8000 bytes)."""
+    updated_at = task.get("updated_at")
+    return {
+        "type": event_type,
+        "task_id": task["id"],
+        "user_id": task["user_id"],
+        "field_worker_id": task.get("field_worker_id"),
+        "previous_field_worker_id": previous_field_worker_id,
+        "status": task.get("status"),
+        "rating": task.get("rating"),
+        "updated_at": updated_at.isoformat() if updated_at else None,
+    }
+
+
+async def publish_task_events(event_type: str, tasks, previous_field_worker_ids=None):
+    """NOTIFY one event per task in a single statement; runs on the bound connection/transaction."""
+    previous = previous_field_worker_ids or {}
+    events = [task_event(event_type, t, previous.get(t["id"])) for t in tasks]
+    if events:
+        await database.execute(
+            "SELECT pg_notify($1, payload) FROM unnest($2::text[]) AS payload",
+            CHANNEL, [json.dumps(e) for e in events]
+        )
+        # Other processes invalidate when the NOTIFY arrives; this one can't wait for the round trip
+        tags = {
+            tag for e in events
+            for tag in task_tags(e["user_id"], e["field_worker_id"], e["previous_field_worker_id"])
+        }
+        await database.after_commit(lambda: response_cache.invalidate(*tags))
+
+
+async def publish_task_event(event_type: str, task, previous_field_worker_id: int = None):
+    await publish_task_events(event_type, [task], {task["id"]: previous_field_worker_id})
+
+
+async def publish_invalidation(*tags):
+    """Invalidate response cache tags in every process, once the current transaction commits."""
+    await database.execute("SELECT pg_notify($1, $2)", INVALIDATION_CHANNEL, json.dumps(sorted(set(tags))))
+    await database.after_commit(lambda: response_cache.invalidate(*tags))
+
+
+class Subscriber:
+    def __init__(self, user_id: int, role: str, queue_size: int):
+        self.user_id = user_id
+        self.role = role
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    def wants(self, event: dict) -> bool:
+        if self.role == "ADMIN":
+            return True
+        if self.role == "FIELD_WORKER":
+            return self.user_id in (event.get("field_worker_id"), event.get("previous_field_worker_id"))
+        return event.get("user_id") == self.user_id
+
+    async def get(self):
+        """Next raw JSON event, or None once this subscriber has been dropped."""
+        if self.dropped:
+            return None
+        return await self.queue.get()
+
+
+class Broadcaster:
+    def __init__(self):
+        self._subscribers = set()
+        self._conn = None
+        self._runner = None
+        self.received = 0
+        self.invalidations_received = 0
+        self.delivered = 0
+        self.dropped_subscribers = 0
+        self.reconnects = 0
+
+    def subscribe(self, user) -> Subscriber:
+        subscriber = Subscriber(user["id"], user["role"], settings.EVENTS_QUEUE_SIZE)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def dispatch(self, payload: str):
+        self.received += 1
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed task event: %r", payload[:200])
+            return
+        response_cache.invalidate_soon(
+            *task_tags(event.get("user_id"), event.get("field_worker_id"), event.get("previous_field_worker_id"))
+        )
+        for subscriber in list(self._subscribers):
+            if not subscriber.wants(event):
+                continue
+            try:
+                subscriber.queue.put_nowait(payload)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                subscriber.dropped = True
+                self._subscribers.discard(subscriber)
+                self.dropped_subscribers += 1
+
+    def _on_notify(self, conn, pid, channel, payload):
+        self.dispatch(payload)
+
+    def _on_invalidation(self, conn, pid, channel, payload):
+        self.invalidations_received += 1
+        try:
+            tags = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed cache invalidation: %r", payload[:200])
+            return
+        response_cache.invalidate_soon(*tags)
+
+    async def _listen_forever(self):
+        delay = 1.0
+        while True:
+            closed = asyncio.Event()
+            try:
+                self._conn = await asyncpg.connect(settings.DATABASE_URL)
+                self._conn.add_termination_listener(lambda conn: closed.set())
+                await self._conn.add_listener(CHANNEL, self._on_notify)
+                await self._conn.add_listener(INVALIDATION_CHANNEL, self._on_invalidation)
+                delay = 1.0
+                await closed.wait()
+                logger.warning("Task event listener connection closed; reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Task event listener failed; retrying in %.0fs", delay)
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    async def start(self):
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._listen_forever())
+
+    async def stop(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            self._runner = None
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+        self._conn = None
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "listening": int(self._conn is not None and not self._conn.is_closed()),
+            "received": self.received,
+            "invalidations_received": self.invalidations_received,
+            "delivered": self.delivered,
+            "dropped_subscribers": self.dropped_subscribers,
+            "reconnects": self.reconnects,
+        }
+
+
+broadcaster = Broadcaster()
+register_collector("task_events", broadcaster.stats)
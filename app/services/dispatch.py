@@ -0,0 +1,195 @@
+"""
+Automatic dispatch of PENDING service requests to field workers.
+
+Each cycle locks a batch of the most urgent/oldest unassigned tasks with
+FOR UPDATE SKIP LOCKED (so tasks an admin is assigning right now are left alone),
+plans assignments in memory with heaps keyed by each worker's open-task count,
+and commits the whole plan in one UPDATE.
+
+Cycles are serialized across instances by a transaction-level advisory lock: the
+plan is based on worker loads read from stats_counters, and two cycles planning
+from the same loads would both fill a worker's spare capacity. An instance that
+finds the lock taken skips its cycle.
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime
+
+from app import database
+from app.core.config import settings
+from app.core.metrics import register_collector
+from app.services.broadcaster import publish_task_events
+from app.services.task_history import task_history
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_LOCK_ID = 7_310_420_004
+URGENCY_RANK = {"HIGH": 0, "MEDIUM": 1, "LOW": 2}
+URGENCY_ORDER_SQL = "(CASE urgency WHEN 'HIGH' THEN 0 WHEN 'MEDIUM' THEN 1 ELSE 2 END)"
+
+stats = {
+    "cycles": 0,
+    "assigned_total": 0,
+    "last_cycle_assigned": 0,
+    "last_cycle_seconds": 0.0,
+    "errors": 0,
+}
+register_collector("dispatch", lambda: stats)
+
+
+def normalize_location(value):
+    """Case/whitespace-insensitive key used to match task locations to worker addresses."""
+    if not value:
+        return None
+    return " ".join(value.lower().split())
+
+
+def plan_assignments(tasks, workers, max_open_per_worker: int, match_location: bool = False):
+    """
+    Assign tasks to the least-loaded worker with spare capacity.
+
+    tasks:   iterable of (task_id, urgency, created_at, location)
+    workers: iterable of (worker_id, open_tasks, location)
+    Returns [(task_id, worker_id)] in priority order.
+
+    With match_location, a worker whose location matches the task's is preferred
+    over the globally least-loaded one. Heaps use lazy deletion: an entry is stale
+    when its load no longer equals the worker's current load.
+    """
+    load = {}
+    worker_location = {}
+    overall = []
+    by_location = {}
+    for worker_id, open_tasks, location in workers:
+        if open_tasks >= max_open_per_worker:
+            continue
+        load[worker_id] = open_tasks
+        overall.append((open_tasks, worker_id))
+        key = normalize_location(location) if match_location else None
+        worker_location[worker_id] = key
+        if key is not None:
+            by_location.setdefault(key, []).append((open_tasks, worker_id))
+    heapq.heapify(overall)
+    for heap in by_location.values():
+        heapq.heapify(heap)
+
+    def pop_least_loaded(heap):
+        while heap:
+            entry_load, worker_id = heap[0]
+            if load.get(worker_id) == entry_load:
+                return worker_id
+            heapq.heappop(heap)
+        return None
+
+    ordered = sorted(tasks, key=lambda t: (URGENCY_RANK.get(t[1], len(URGENCY_RANK)), t[2], t[0]))
+    plan = []
+    for task_id, _, _, location in ordered:
+        worker_id = None
+        if match_location:
+            heap = by_location.get(normalize_location(location))
+            if heap:
+                worker_id = pop_least_loaded(heap)
+        if worker_id is None:
+            worker_id = pop_least_loaded(overall)
+        if worker_id is None:
+            break  # every worker is at capacity
+
+        plan.append((task_id, worker_id))
+        new_load = load[worker_id] + 1
+        if new_load >= max_open_per_worker:
+            del load[worker_id]
+            continue
+        load[worker_id] = new_load
+        heapq.heappush(overall, (new_load, worker_id))
+        key = worker_location.get(worker_id)
+        if key is not None:
+            heapq.heappush(by_location[key], (new_load, worker_id))
+    return plan
+
+
+async def run_dispatch_cycle(batch_size: int = None, max_open_per_worker: int = None, match_location: bool = None) -> int:
+    """Lock, plan and commit one batch of assignments. Returns the number of tasks assigned."""
+    batch_size = batch_size or settings.DISPATCH_BATCH_SIZE
+    max_open_per_worker = max_open_per_worker or settings.DISPATCH_MAX_OPEN_PER_WORKER
+    match_location = settings.DISPATCH_MATCH_LOCATION if match_location is None else match_location
+
+    async with database.transaction():
+        # Taken before the loads are read, so they include the previous cycle's commit
+        locked = await database.fetch_one("SELECT pg_try_advisory_xact_lock($1) AS locked", DISPATCH_LOCK_ID)
+        if not locked["locked"]:
+            return 0
+
+        tasks = await database.fetch_all(
+            f"""
+            SELECT id, urgency, created_at, location
+            FROM service_requests
+            WHERE status = 'PENDING' AND field_worker_id IS NULL
+            ORDER BY {URGENCY_ORDER_SQL}, created_at, id
+            LIMIT $1
+            FOR UPDATE SKIP LOCKED
+            """,
+            batch_size
+        )
+        if not tasks:
+            return 0
+
+        # Open load comes from the materialized counters, not a scan of service_requests
+        workers = await database.fetch_all("""
+            SELECT u.id, u.address, COALESCE(SUM(c.value), 0) AS open_tasks
+            FROM users u
+            LEFT JOIN stats_counters c
+                ON c.scope = 'worker_tasks' AND c.scope_id = u.id
+                AND c.key IN ('ASSIGNED', 'IN_PROGRESS')
+            WHERE u.role = 'FIELD_WORKER' AND u.is_active = TRUE AND u.is_approved = TRUE
+            GROUP BY u.id
+        """)
+
+        plan = plan_assignments(
+            [(t["id"], t["urgency"], t["created_at"], t["location"]) for t in tasks],
+            [(w["id"], w["open_tasks"], w["address"]) for w in workers],
+            max_open_per_worker,
+            match_location,
+        )
+        if not plan:
+            return 0
+
+        assigned = await database.fetch_all(
+            """
+            UPDATE service_requests sr
+            SET field_worker_id = a.field_worker_id, status = 'ASSIGNED', updated_at = $3
+            FROM unnest($1::int[], $2::int[]) AS a(task_id, field_worker_id)
+            -- A worker deactivated or unapproved since the plan was made is skipped
+            JOIN users u ON u.id = a.field_worker_id
+                AND u.role = 'FIELD_WORKER' AND u.is_active = TRUE AND u.is_approved = TRUE
+            WHERE sr.id = a.task_id
+            RETURNING sr.*
+            """,
+            [task_id for task_id, _ in plan], [worker_id for _, worker_id in plan], datetime.utcnow()
+        )
+        await publish_task_events("assigned", assigned)
+        # Only PENDING tasks are dispatched; no actor, the dispatcher did it
+        await task_history.record_tasks("assigned", assigned, from_statuses={t["id"]: "PENDING" for t in assigned})
+        return len(assigned)
+
+
+async def dispatch_loop():
+    """Run dispatch cycles forever; a full batch is followed immediately by the next one."""
+    while True:
+        started = time.perf_counter()
+        assigned = 0
+        try:
+            assigned = await run_dispatch_cycle()
+            stats["cycles"] += 1
+            stats["assigned_total"] += assigned
+            stats["last_cycle_assigned"] = assigned
+            stats["last_cycle_seconds"] = round(time.perf_counter() - started, 4)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            stats["errors"] += 1
+            logger.exception("Dispatch cycle failed")
+        if assigned < settings.DISPATCH_BATCH_SIZE:
+            await asyncio.sleep(settings.DISPATCH_INTERVAL_SECONDS)
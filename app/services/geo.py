@@ -0,0 +1,139 @@
+"""
+Nearest-worker lookups over the grid index from sql/migrations/0008_geo_coordinates.sql.
+
+Workers carry geo_cell = row * GRID_COLUMNS + column for GEO_CELL_DEGREES cells. A query
+reads boxes of cells around the task for a search radius that doubles each round,
+clamped to max_km, and ranks the candidates by great-circle distance. Each box is the
+bounding box of the spherical cap of that radius, so it widens in longitude towards
+the poles and takes whole rows once the cap reaches over a pole. The search stops as
+soon as the K-th candidate is within the radius, so nothing outside can beat it, once
+the radius reaches max_km, or before a box would pass MAX_CELLS_PER_QUERY cells.
+"""
+
+import math
+import time
+
+from app import database
+from app.core.metrics import register_collector
+
+GEO_CELL_DEGREES = 0.1  # must match geo_cell() in the migration
+GRID_ROWS = 1800
+GRID_COLUMNS = 3600
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+MAX_CELLS_PER_QUERY = 20_000  # bounds the cell array sent to the database for one lookup
+
+stats = {"queries": 0, "cells_scanned": 0, "candidates_scanned": 0, "truncated": 0, "last_query_ms": 0.0}
+register_collector("geo", lambda: stats)
+
+NEAREST_WORKERS_SQL = """
+    SELECT u.id, u.username, u.latitude, u.longitude, u.location_updated_at,
+           COALESCE(SUM(c.value), 0) AS open_tasks
+    FROM users u
+    LEFT JOIN stats_counters c
+        ON c.scope = 'worker_tasks' AND c.scope_id = u.id
+        AND c.key IN ('ASSIGNED', 'IN_PROGRESS')
+    WHERE u.geo_cell = ANY($1::bigint[])
+      AND u.role = 'FIELD_WORKER' AND u.is_active = TRUE AND u.is_approved = TRUE
+      AND u.geo_cell IS NOT NULL
+    GROUP BY u.id
+    HAVING COALESCE(SUM(c.value), 0) < $2
+"""
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def grid_position(lat: float, lon: float):
+    row = min(int(math.floor((lat + 90) / GEO_CELL_DEGREES)), GRID_ROWS - 1)
+    column = min(int(math.floor((lon + 180) / GEO_CELL_DEGREES)), GRID_COLUMNS - 1)
+    return row, column
+
+
+def cap_box(lat: float, radius_km: float):
+    """
+    Half-widths (rows, columns) in cells of the box around (lat, *) that holds every
+    point within radius_km; columns is None when the cap reaches a pole (all longitudes).
+    """
+    delta = radius_km / KM_PER_DEGREE
+    # The query sits anywhere in its cell, so round up to whole cells
+    rows = math.ceil(delta / GEO_CELL_DEGREES)
+    if abs(lat) + delta >= 90:
+        return rows, None
+    spread = math.degrees(math.asin(min(1.0, math.sin(math.radians(delta)) / math.cos(math.radians(lat)))))
+    columns = math.ceil(spread / GEO_CELL_DEGREES)
+    return rows, (None if 2 * columns + 1 >= GRID_COLUMNS else columns)
+
+
+def box_cells(row: int, column: int, rows: int, columns, inside=None):
+    """
+    Cell ids within `rows` rows and `columns` columns (None: all) of (row, column),
+    skipping the box `inside` (an earlier (rows, columns)); longitude wraps and rows
+    are clamped to the grid.
+    """
+    def offsets(half):
+        if half is None:
+            return range(-(GRID_COLUMNS // 2), GRID_COLUMNS - GRID_COLUMNS // 2)
+        return range(-half, half + 1)
+
+    inner_rows, inner_columns = inside if inside else (-1, -1)
+    cells = []
+    for r in range(max(row - rows, 0), min(row + rows, GRID_ROWS - 1) + 1):
+        row_inside = abs(r - row) <= inner_rows
+        for dc in offsets(columns):
+            if row_inside and (inner_columns is None or abs(dc) <= inner_columns):
+                continue
+            cells.append(r * GRID_COLUMNS + (column + dc) % GRID_COLUMNS)
+    return cells
+
+
+def box_size(row: int, rows: int, columns) -> int:
+    height = min(row + rows, GRID_ROWS - 1) - max(row - rows, 0) + 1
+    return height * (GRID_COLUMNS if columns is None else 2 * columns + 1)
+
+
+async def nearest_workers(lat: float, lon: float, k: int, max_km: float, max_open: int):
+    """
+    The k closest dispatchable field workers with fewer than max_open open tasks,
+    nearest first, as dicts with distance_km. Fewer than k when the area is sparse.
+    """
+    started = time.perf_counter()
+    row, column = grid_position(lat, lon)
+    candidates, seen = [], set()
+    radius = min(GEO_CELL_DEGREES * KM_PER_DEGREE, max_km)
+    scanned_box = None
+    cells_scanned = 0
+    while True:
+        box = cap_box(lat, radius)
+        if box_size(row, *box) > MAX_CELLS_PER_QUERY and scanned_box is not None:
+            # High latitudes with a large max_km; return what the smaller boxes found
+            stats["truncated"] += 1
+            break
+        cells = box_cells(row, column, *box, inside=scanned_box)
+        scanned_box = box
+        cells_scanned += len(cells)
+        for w in await database.fetch_all(NEAREST_WORKERS_SQL, cells, max_open, use_replica=True):
+            if w["id"] in seen:
+                continue
+            seen.add(w["id"])
+            distance = haversine_km(lat, lon, w["latitude"], w["longitude"])
+            if distance <= max_km:
+                candidates.append({**dict(w), "distance_km": round(distance, 3)})
+        candidates.sort(key=lambda c: c["distance_km"])
+
+        if len(candidates) >= k and candidates[k - 1]["distance_km"] <= radius:
+            break
+        if radius >= max_km:
+            break
+        radius = min(radius * 2, max_km)
+
+    stats["queries"] += 1
+    stats["cells_scanned"] += cells_scanned
+    stats["candidates_scanned"] += len(candidates)
+    stats["last_query_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return candidates[:k]
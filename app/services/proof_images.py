@@ -0,0 +1,204 @@
+"""
+Post-upload image pipeline for task proofs.
+
+update_task_status enqueues a proof_jobs row for every proof in the same statement
+that inserts the proof. This worker claims jobs with FOR UPDATE SKIP LOCKED and a
+lease, renders size-bounded WebP variants in a process pool (off the event loop and
+off the request path), and records them in task_proofs.variants. Failures are retried
+with exponential backoff up to PROOF_JOB_MAX_ATTEMPTS; jobs whose worker died are
+reclaimed once their lease expires. If a render process dies (e.g. OOM-killed), the
+pool is rebuilt and the jobs it took down are retried like any other failure, so an
+image that keeps crashing the renderer ends up FAILED instead of looping.
+
+Pillow is optional: without it the pipeline stays off and originals are served as-is.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app import database
+from app.core.config import settings
+from app.core.metrics import register_collector
+
+try:
+    from PIL import Image, ImageOps, UnidentifiedImageError
+except ImportError:  # optional dependency
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# name -> (max edge in px, WebP quality)
+VARIANTS = {
+    "thumb": (320, 70),
+    "preview": (1280, 80),
+}
+
+stats = {
+    "processed": 0,
+    "retried": 0,
+    "failed": 0,
+    "skipped": 0,
+    "pool_restarts": 0,
+}
+register_collector("proof_images", lambda: stats)
+
+_executor = None
+
+
+def variant_path(source_path: str, name: str) -> str:
+    """uploads/ab/cd/<sha256>.jpg -> uploads/ab/cd/<sha256>.thumb.webp (deterministic, so retries overwrite)."""
+    return f"{os.path.splitext(source_path)[0]}.{name}.webp"
+
+
+def render_variants(source_path: str) -> dict:
+    """Runs in a worker process. Returns {variant: {path, width, height, bytes}} or {} for non-images."""
+    try:
+        with Image.open(source_path) as original:
+            image = ImageOps.exif_transpose(original)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+            variants = {}
+            for name, (max_edge, quality) in VARIANTS.items():
+                copy = image.copy()
+                copy.thumbnail((max_edge, max_edge))
+                path = variant_path(source_path, name)
+                # Unique per render: a reclaimed job can overlap the one whose lease expired
+                tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+                try:
+                    copy.save(tmp_path, "WEBP", quality=quality, method=4)
+                    os.replace(tmp_path, path)
+                except BaseException:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+                variants[name] = {
+                    "path": path,
+                    "width": copy.width,
+                    "height": copy.height,
+                    "bytes": os.path.getsize(path),
+                    "content_type": "image/webp",
+                }
+            return variants
+    except UnidentifiedImageError:
+        return {}
+
+
+async def claim_jobs(limit: int):
+    return await database.fetch_all(
+        """
+        UPDATE proof_jobs j
+        SET status = 'RUNNING', attempts = j.attempts + 1,
+            locked_until = NOW() + make_interval(secs => $2), updated_at = NOW()
+        FROM task_proofs p
+        WHERE p.id = j.proof_id
+          AND j.id IN (
+            SELECT id FROM proof_jobs
+            WHERE (status = 'PENDING' AND run_after <= NOW())
+               OR (status = 'RUNNING' AND locked_until < NOW())
+            ORDER BY run_after
+            LIMIT $1
+            FOR UPDATE SKIP LOCKED
+          )
+        RETURNING j.id, j.proof_id, j.attempts, p.image_path
+        """,
+        limit, settings.PROOF_JOB_LEASE_SECONDS
+    )
+
+
+async def _complete(job, variants: dict):
+    await database.execute(
+        """
+        WITH proof AS (
+            UPDATE task_proofs SET variants = $2::jsonb WHERE id = $1
+        )
+        UPDATE proof_jobs SET status = 'DONE', locked_until = NULL, last_error = NULL, updated_at = NOW()
+        WHERE id = $3
+        """,
+        job["proof_id"], json.dumps(variants), job["id"]
+    )
+
+
+async def _fail(job, error: str):
+    final = job["attempts"] >= settings.PROOF_JOB_MAX_ATTEMPTS
+    stats["failed" if final else "retried"] += 1
+    await database.execute(
+        """
+        UPDATE proof_jobs
+        SET status = $2, last_error = $3, locked_until = NULL, updated_at = NOW(),
+            run_after = NOW() + make_interval(secs => $4)
+        WHERE id = $1
+        """,
+        job["id"], "FAILED" if final else "PENDING", error[:2000],
+        settings.PROOF_JOB_RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1)
+    )
+
+
+def _new_executor():
+    return ProcessPoolExecutor(max_workers=settings.PROOF_IMAGE_WORKERS)
+
+
+def _restart_executor(broken):
+    """Replace the pool once, however many in-flight jobs saw it break."""
+    global _executor
+    if _executor is broken:
+        broken.shutdown(wait=False, cancel_futures=True)
+        _executor = _new_executor()
+        stats["pool_restarts"] += 1
+        logger.warning("Proof image process pool broke; restarted it")
+
+
+async def _process(job):
+    source = job["image_path"]
+    if not source or not os.path.exists(source):
+        stats["skipped"] += 1
+        await _complete(job, {})
+        return
+    executor = _executor
+    try:
+        loop = asyncio.get_running_loop()
+        variants = await loop.run_in_executor(executor, render_variants, source)
+    except BrokenProcessPool:
+        # Which job killed the process is unknown, so every job it took down uses the attempt
+        _restart_executor(executor)
+        await _fail(job, "BrokenProcessPool: a render process died")
+        return
+    except Exception as e:
+        logger.warning("Proof image job %s failed: %s", job["id"], e)
+        await _fail(job, f"{type(e).__name__}: {e}")
+        return
+    stats["processed" if variants else "skipped"] += 1
+    await _complete(job, variants)
+
+
+async def proof_image_loop():
+    global _executor
+    _executor = _new_executor()
+    try:
+        while True:
+            try:
+                jobs = await claim_jobs(settings.PROOF_IMAGE_WORKERS * 2)
+                if jobs:
+                    await asyncio.gather(*(_process(job) for job in jobs))
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Proof image worker cycle failed")
+            await asyncio.sleep(settings.PROOF_IMAGE_POLL_SECONDS)
+    finally:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def pipeline_available() -> bool:
+    return Image is not None
+
+
+def enabled() -> bool:
+    """Whether jobs get processed here; otherwise enqueuing them would only pile them up."""
+    return settings.PROOF_IMAGES_ENABLED and pipeline_available()
@@ -0,0 +1,311 @@
+"""
+Write-behind task history (sql/migrations/0011_task_events.sql).
+
+Handlers call `await task_history.record(...)` after their UPDATE succeeds. Once the
+surrounding transaction commits (app.database.after_commit) that only appends a
+tuple to an in-process buffer, so the hot write paths gain no extra round
+trip. A background flusher COPYs the buffer into task_events once it reaches
+TASK_HISTORY_BATCH_SIZE events or TASK_HISTORY_FLUSH_MS after the first one.
+
+The buffer is bounded (TASK_HISTORY_QUEUE_LIMIT). When a flush fails, for example
+because the database is down, the batch is appended to TASK_HISTORY_SPILL_PATH as
+JSON lines, and the spill file is replayed after the next successful flush and at
+startup. Without a spill path, events that don't fit are dropped and counted.
+Shutdown flushes whatever is still buffered.
+
+Processes may share one spill path: appends and replays hold an flock on
+<spill>.lock, so only one process replays a file and appends never land in a file
+being replayed. Lines that don't parse (e.g. torn by a crash mid-write) are moved
+to <spill>.rejected instead of blocking the rest. A failed replay is logged and
+retried later; it never stops startup.
+
+History is best-effort: a crash loses whatever was still buffered.
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+from app import database
+from app.core.config import settings
+from app.core.instrumentation import record_query
+from app.core.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ["task_id", "event_type", "from_status", "to_status", "field_worker_id", "actor_id", "occurred_at", "details"]
+
+
+def _to_json(record) -> str:
+    row = dict(zip(COLUMNS, record))
+    row["occurred_at"] = row["occurred_at"].isoformat()
+    return json.dumps(row)
+
+
+def _from_json(line: str) -> tuple:
+    row = json.loads(line)
+    row["occurred_at"] = datetime.fromisoformat(row["occurred_at"])
+    return tuple(row[c] for c in COLUMNS)
+
+
+def _lock(path: str, blocking: bool = True):
+    """Exclusive flock on <path>.lock; returns the open file, or None if busy and not blocking."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    f = open(path + ".lock", "a")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        return None
+    return f
+
+
+def _append_lines(path: str, records):
+    lock = _lock(path)
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.writelines(_to_json(r) + "\n" for r in records)
+            f.flush()
+            os.fsync(f.fileno())
+    finally:
+        lock.close()
+
+
+def _read_lines(path: str, rejected_path: str):
+    """Parse a spill file line by line; bad lines go to `rejected_path`. Returns (records, rejected)."""
+    records, rejected = [], []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                records.append(_from_json(line))
+            except (ValueError, KeyError, TypeError):
+                rejected.append(line if line.endswith("\n") else line + "\n")
+    if rejected:
+        with open(rejected_path, "a", encoding="utf-8") as f:
+            f.writelines(rejected)
+        # Keep only the good lines, so a retried replay doesn't reject them again
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.writelines(_to_json(r) + "\n" for r in records)
+        os.replace(path + ".tmp", path)
+    return records, len(rejected)
+
+
+def _claim_spill(path: str):
+    """
+    Take the spill lock without waiting and make sure <path>.replaying holds the
+    events to load. Returns the lock (to hold until the replay is done), or None.
+    """
+    lock = _lock(path, blocking=False)
+    if lock is None:
+        return None  # another process is replaying
+    replaying = path + ".replaying"
+    # A .replaying file is one whose replay didn't finish; it goes first
+    if not os.path.exists(replaying):
+        if not os.path.exists(path):
+            lock.close()
+            return None
+        os.replace(path, replaying)
+    return lock
+
+
+class TaskHistoryBuffer:
+    def __init__(self, batch_size: int, flush_ms: float, queue_limit: int, spill_path: str = ""):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_ms / 1000
+        self.queue_limit = queue_limit
+        self.spill_path = spill_path
+        self._buffer = []
+        self._full = None
+        self._runner = None
+        self._flush_lock = None
+        self._stopping = False
+        self.recorded = 0
+        self.flushed = 0
+        self.batches = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.rejected = 0
+        self.flush_errors = 0
+        self.last_flush_seconds = 0.0
+
+    async def record(self, task_id: int, event_type: str, to_status: str = None, from_status: str = None,
+                     field_worker_id: int = None, actor_id: int = None, occurred_at: datetime = None,
+                     details: dict = None):
+        """Queue one event once the surrounding transaction commits; never touches the database."""
+        await self._record_after_commit([(
+            task_id, event_type, from_status, to_status, field_worker_id, actor_id,
+            occurred_at or datetime.utcnow(), json.dumps(details or {}),
+        )])
+
+    async def record_tasks(self, event_type: str, tasks, actor_id: int = None, from_statuses=None,
+                           previous_field_worker_ids=None):
+        """One event per updated service_requests row (e.g. a batch assignment)."""
+        from_statuses = from_statuses or {}
+        previous = previous_field_worker_ids or {}
+        events = []
+        for t in tasks:
+            details = {}
+            if previous.get(t["id"]) is not None:
+                details["previous_field_worker_id"] = previous[t["id"]]
+            events.append((
+                t["id"], event_type, from_statuses.get(t["id"]), t["status"], t["field_worker_id"],
+                actor_id, t["updated_at"], json.dumps(details),
+            ))
+        await self._record_after_commit(events)
+
+    async def _record_after_commit(self, events):
+        if self._full is None or not events:
+            return  # not started (TASK_HISTORY_ENABLED is off)
+        # A rolled-back transaction must not leave its events behind
+        await database.after_commit(lambda: self._queue(events))
+
+    async def _queue(self, events):
+        for event in events:
+            if len(self._buffer) >= self.queue_limit:
+                # Past the limit the flusher is not keeping up; shed the newest rather than grow
+                self.dropped += 1
+                continue
+            self._buffer.append(event)
+            self.recorded += 1
+        if len(self._buffer) >= self.batch_size:
+            self._full.set()
+
+    async def start(self):
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        await self.replay_spill()
+        self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Ask the flusher to finish rather than cancel it, so a COPY in flight completes
+        if self._runner:
+            self._stopping = True
+            self._full.set()
+            await self._runner
+            self._runner = None
+        if self._flush_lock is not None:
+            await self.flush()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Task history flush failed")
+
+    async def flush(self) -> int:
+        """COPY everything buffered so far; on failure, spill it (or put it back)."""
+        async with self._flush_lock:
+            flushed = 0
+            while self._buffer:
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:len(batch)]
+                if not await self._copy(batch):
+                    await self._fail(batch)
+                    return flushed
+                flushed += len(batch)
+            if flushed and self.spill_path:
+                await self.replay_spill()
+            return flushed
+
+    async def _copy(self, records) -> bool:
+        started = time.perf_counter()
+        try:
+            async with database.pool_connection() as conn:
+                await conn.copy_records_to_table("task_events", records=records, columns=COLUMNS)
+        except Exception:
+            self.flush_errors += 1
+            logger.exception("Task history flush of %d events failed", len(records))
+            return False
+        elapsed = time.perf_counter() - started
+        record_query("COPY task_events", None, elapsed, len(records))
+        self.flushed += len(records)
+        self.batches += 1
+        self.last_flush_seconds = round(elapsed, 4)
+        return True
+
+    async def _fail(self, batch):
+        if self.spill_path:
+            # Spill the rest of the buffer too: the database is unlikely to be back by the next record()
+            records, self._buffer = batch + self._buffer, []
+            try:
+                await asyncio.to_thread(_append_lines, self.spill_path, records)
+                self.spilled += len(records)
+                return
+            except OSError:
+                logger.exception("Could not spill %d task history events to %s", len(records), self.spill_path)
+                batch = records
+        # Keep the events for the next attempt, within the queue limit
+        self._buffer[:0] = batch
+        overflow = len(self._buffer) - self.queue_limit
+        if overflow > 0:
+            del self._buffer[self.queue_limit:]
+            self.dropped += overflow
+
+    async def replay_spill(self):
+        """Load a spill file left by earlier failed flushes, then remove it. Never raises."""
+        if not self.spill_path:
+            return
+        replaying = self.spill_path + ".replaying"
+        try:
+            lock = await asyncio.to_thread(_claim_spill, self.spill_path)
+        except OSError:
+            logger.exception("Could not open the task history spill file %s", self.spill_path)
+            return
+        if lock is None:
+            return
+        try:
+            records, rejected = await asyncio.to_thread(_read_lines, replaying, self.spill_path + ".rejected")
+            if rejected:
+                self.rejected += rejected
+                logger.warning("Moved %d unreadable task history lines to %s.rejected", rejected, self.spill_path)
+            async with database.transaction() as conn:
+                for i in range(0, len(records), self.batch_size):
+                    await conn.copy_records_to_table(
+                        "task_events", records=records[i:i + self.batch_size], columns=COLUMNS)
+            os.remove(replaying)
+        except Exception:
+            self.flush_errors += 1
+            logger.exception("Replaying spilled task history events failed")
+            return
+        finally:
+            lock.close()
+        self.replayed += len(records)
+        logger.info("Replayed %d spilled task history events", len(records))
+
+    def stats(self):
+        return {
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "rejected": self.rejected,
+            "flush_errors": self.flush_errors,
+            "last_flush_seconds": self.last_flush_seconds,
+        }
+
+
+task_history = TaskHistoryBuffer(
+    settings.TASK_HISTORY_BATCH_SIZE,
+    settings.TASK_HISTORY_FLUSH_MS,
+    settings.TASK_HISTORY_QUEUE_LIMIT,
+    settings.TASK_HISTORY_SPILL_PATH,
+)
+register_collector("task_history", task_history.stats)
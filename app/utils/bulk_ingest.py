@@ -0,0 +1,162 @@
+"""
+Bulk service-request ingestion from NDJSON or CSV uploads.
+
+The upload is read line by line from Starlette's spooled temp file and parsed and
+validated in batches in a worker thread, so neither the file nor the full row set
+is ever held in memory. Valid rows from each batch are loaded with COPY, all inside
+one transaction. Invalid rows are reported by line number and skipped; they never
+abort the load.
+"""
+
+import asyncio
+import csv
+import json
+import time
+from itertools import islice
+
+from fastapi import HTTPException, UploadFile
+from pydantic import ValidationError
+
+from app import database
+from app.core.config import settings
+from app.core.instrumentation import record_query
+from app.schemas.task import ServiceRequestCreate
+
+INGEST_COLUMNS = ("user_id", "title", "description", "location", "urgency", "latitude", "longitude")
+URGENCIES = ("LOW", "MEDIUM", "HIGH")
+MAX_TEXT_LENGTH = 255  # VARCHAR(255) columns in service_requests
+
+
+def detect_format(file: UploadFile, explicit: str = None) -> str:
+    fmt = (explicit or "").lower()
+    if not fmt:
+        name = (file.filename or "").lower()
+        content_type = (file.content_type or "").lower()
+        if name.endswith(".csv") or "csv" in content_type:
+            fmt = "csv"
+        elif name.endswith((".ndjson", ".jsonl")) or "ndjson" in content_type or "jsonl" in content_type:
+            fmt = "ndjson"
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Specify format=csv or format=ndjson")
+    return fmt
+
+
+def _text_lines(fileobj, decode_errors: list):
+    """
+    Decode line by line. A line that isn't valid UTF-8 is recorded in `decode_errors`
+    as (line_number, message) and replaced by an empty line, which both parsers skip.
+    """
+    for line_number, raw in enumerate(fileobj, 1):
+        try:
+            line = raw.decode("utf-8")
+        except UnicodeDecodeError as e:
+            decode_errors.append((line_number, f"Invalid UTF-8: {e.reason} at byte {e.start}"))
+            line = "\n"
+        if line_number == 1:
+            line = line.lstrip("\ufeff")
+        yield line
+
+
+def iter_rows(fileobj, fmt: str):
+    """Yield (line_number, dict | error message) for each data row."""
+    decode_errors = []
+    lines = _text_lines(fileobj, decode_errors)
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                break
+            except csv.Error as e:
+                # The reader resumes at the next line, so one bad row doesn't end the file
+                row = f"Malformed CSV: {e}"
+            yield from _drain(decode_errors)
+            if isinstance(row, str):
+                yield reader.line_num, row
+            else:
+                yield reader.line_num, {k: (v if v != "" else None) for k, v in row.items() if k}
+        yield from _drain(decode_errors)
+        return
+
+    for line_number, line in enumerate(lines, 1):
+        yield from _drain(decode_errors)
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            yield line_number, f"Invalid JSON: {e}"
+            continue
+        yield line_number, item if isinstance(item, dict) else "Each line must be a JSON object"
+    yield from _drain(decode_errors)
+
+
+def _drain(errors: list):
+    while errors:
+        yield errors.pop(0)
+
+
+def _validate(item: dict):
+    task = ServiceRequestCreate.model_validate(item)
+    # Mirror the table's constraints so COPY never fails part-way through
+    if task.urgency not in URGENCIES:
+        raise ValueError(f"urgency must be one of {', '.join(URGENCIES)}")
+    if len(task.title) > MAX_TEXT_LENGTH or len(task.location) > MAX_TEXT_LENGTH:
+        raise ValueError(f"title and location must be at most {MAX_TEXT_LENGTH} characters")
+    # Postgres text can't hold NUL; COPY would fail and roll back the whole load
+    if any("\x00" in (value or "") for value in (task.title, task.description, task.location)):
+        raise ValueError("text fields must not contain NUL characters")
+    return task
+
+
+def next_batch(rows, user_id: int, size: int):
+    """Parse and validate up to `size` rows. Returns (records, errors, rows_read)."""
+    records, errors, read = [], [], 0
+    for line_number, item in islice(rows, size):
+        read += 1
+        if isinstance(item, str):
+            errors.append({"line": line_number, "error": item})
+            continue
+        try:
+            task = _validate(item)
+        except ValidationError as e:
+            errors.append({"line": line_number, "error": "; ".join(
+                f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())})
+            continue
+        except ValueError as e:
+            errors.append({"line": line_number, "error": str(e)})
+            continue
+        records.append((user_id, task.title, task.description, task.location, task.urgency,
+                        task.latitude, task.longitude))
+    return records, errors, read
+
+
+async def ingest_service_requests(file: UploadFile, user_id: int, fmt: str) -> dict:
+    rows = iter_rows(file.file, fmt)
+    accepted, rejected, errors = 0, 0, []
+    started = time.perf_counter()
+
+    async with database.transaction() as conn:
+        while True:
+            records, batch_errors, read = await asyncio.to_thread(
+                next_batch, rows, user_id, settings.BULK_INGEST_BATCH_SIZE)
+            if not read:
+                break
+            rejected += len(batch_errors)
+            errors.extend(batch_errors[:max(0, settings.BULK_INGEST_MAX_REPORTED_ERRORS - len(errors))])
+            if records:
+                copy_started = time.perf_counter()
+                await conn.copy_records_to_table("service_requests", records=records, columns=INGEST_COLUMNS)
+                record_query("COPY service_requests", None, time.perf_counter() - copy_started, len(records))
+                accepted += len(records)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "accepted": accepted,
+        "rejected": rejected,
+        "errors": errors,
+        "errors_truncated": rejected > len(errors),
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round((accepted + rejected) / elapsed) if elapsed else None,
+    }
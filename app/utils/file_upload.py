@@ -0,0 +1,89 @@
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+
+from fastapi import HTTPException, UploadFile, status
+
+from app.core.config import settings
+
+SAFE_EXTENSION_RE = re.compile(r"^\.[a-z0-9]{1,10}$")
+
+
+def _extension(filename: str) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if SAFE_EXTENSION_RE.match(ext) else ""
+
+
+def content_path(digest: str, ext: str = "") -> str:
+    """uploads/ab/cd/abcd...<ext> - two fan-out levels keep directories small."""
+    return os.path.join(settings.UPLOAD_DIR, digest[:2], digest[2:4], digest + ext)
+
+
+def _write_chunk(f, digest, chunk: bytes):
+    # hashlib releases the GIL for large buffers, so hashing runs alongside the write
+    digest.update(chunk)
+    f.write(chunk)
+
+
+def _commit(tmp_path: str, final_path: str) -> bool:
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    if os.path.exists(final_path):
+        # Same content already stored: deduplicate
+        os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, final_path)
+    return True
+
+
+def _discard(tmp_path: str):
+    try:
+        os.remove(tmp_path)
+    except FileNotFoundError:
+        pass
+
+
+async def store_upload(file: UploadFile, max_bytes: int = None, created: list = None) -> str:
+    """
+    Stream an upload to content-addressed storage and return its path.
+    The file is read in UPLOAD_CHUNK_SIZE pieces, hashed while it streams and written
+    off the event loop; files over `max_bytes` are rejected with 413 mid-stream. The
+    whole request body is capped earlier, before Starlette spools it (app.core.body_limit).
+    Paths this call created (rather than deduplicated against) are appended to
+    `created`, so a caller whose write is rejected can remove exactly those.
+    """
+    max_bytes = settings.MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    tmp_dir = os.path.join(settings.UPLOAD_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"File {file.filename} exceeds {max_bytes} bytes"
+                    )
+                await asyncio.to_thread(_write_chunk, f, digest, chunk)
+
+        final_path = content_path(digest.hexdigest(), _extension(file.filename))
+        if await asyncio.to_thread(_commit, tmp_path, final_path) and created is not None:
+            created.append(final_path)
+        return final_path
+    except BaseException:
+        await asyncio.to_thread(_discard, tmp_path)
+        raise
+
+
+async def discard_uploads(paths):
+    """Remove files stored for a request that was then rejected."""
+    for path in paths:
+        await asyncio.to_thread(_discard, path)
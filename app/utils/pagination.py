@@ -0,0 +1,95 @@
+import base64
+import json
+import time
+from datetime import datetime
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from app import database
+from app.core.instrumentation import record_query
+from app.schemas.serializers import service_request_encoder
+
+TASK_LIST_FIELDS = (
+    "id", "user_id", "field_worker_id", "title", "description", "location", "urgency",
+    "status", "created_at", "updated_at", "completed_at", "rating", "latitude", "longitude",
+)
+STREAM_PREFETCH = 500
+
+
+def parse_fields(fields: str = None, allowed=TASK_LIST_FIELDS) -> list:
+    """`fields=id,title,status` -> ["id", "title", "status"]; all allowed fields when omitted."""
+    if not fields:
+        return list(allowed)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(requested))
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def stream_task_list(
+    filters: dict, fields: list, cursor: str = None, limit: int = 50, include_archived: bool = False
+) -> StreamingResponse:
+    """
+    Stream one page of service_requests, newest first, as
+    {"items": [...], "next_cursor": "..."}.
+
+    Pages are keyed on (created_at, id) rather than OFFSET, so every page is an index
+    range scan. Rows are pulled through a server-side cursor and written out as they
+    arrive, so memory stays flat however large `limit` is. With `include_archived`
+    the page also covers service_requests_archive, whose month partitions newer than
+    the cursor are pruned.
+    """
+    args = []
+    conditions = ["created_at IS NOT NULL"]
+    for column, value in filters.items():
+        if value is not None:
+            args.append(value)
+            conditions.append(f"{column} = ${len(args)}")
+    if cursor:
+        args.extend(decode_cursor(cursor))
+        # The plain created_at bound is implied, but unlike the row comparison it prunes partitions
+        conditions.append(f"created_at <= ${len(args) - 1} AND (created_at, id) < (${len(args) - 1}, ${len(args)})")
+    args.append(limit)
+
+    columns = list(dict.fromkeys(fields + ["created_at", "id"]))
+    query = f"""
+        SELECT {", ".join(columns)}
+        FROM {"service_requests_all" if include_archived else "service_requests"}
+        WHERE {" AND ".join(conditions)}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ${len(args)}
+    """
+
+    encoder = service_request_encoder.project(fields)
+
+    async def generate():
+        # A dedicated connection: the cursor lives as long as the response body
+        async with database.pool_connection(use_replica=True) as conn:
+            async with conn.transaction():
+                yield b'{"items":['
+                count, last = 0, None
+                started = time.perf_counter()
+                async for row in conn.cursor(query, *args, prefetch=STREAM_PREFETCH):
+                    yield (b"," if count else b"") + encoder.encode(row)
+                    count, last = count + 1, row
+                record_query(query, None, time.perf_counter() - started, count)
+                next_cursor = encode_cursor(last["created_at"], last["id"]) if last and count == limit else None
+                yield b'],"next_cursor":' + json.dumps(next_cursor).encode() + b"}"
+
+    return StreamingResponse(generate(), media_type="application/json")
@@ -0,0 +1,210 @@
+"""
+Response cache for hot read endpoints (the dashboard summaries).
+
+Entries are keyed by route + principal + the current versions of the entry's tags
+("tasks", "tasks:user:42", "users", ...). Writers bump tag versions rather than
+deleting keys, so invalidation costs one increment per tag and superseded entries
+age out of the LRU. Every body carries a strong ETag; a request whose If-None-Match
+matches a cached entry gets a 304 without running the handler or serializing.
+
+The default backend is in-process. RESPONSE_CACHE_BACKEND=redis (needs the redis
+package) shares entries and tag versions between processes. Either way, writers
+invalidate through app/services/broadcaster.py (publish_task_events,
+publish_invalidation), which NOTIFYs every process and invalidates after commit.
+"""
+
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+
+from fastapi import Request, Response
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.metrics import register_collector
+from app.schemas.serializers import TrustedJSONResponse, dumps
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # optional shared backend
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    def __init__(self, max_size: int, ttl: float):
+        self.entries = TTLCache(max_size=max_size, ttl=ttl)
+        # Tag -> version, LRU-bounded like the entries. Versions come from one counter
+        # that only grows, and an evicted tag reads as the newest version ever evicted,
+        # which is never below its own last one, so an entry stored before a bump
+        # can't match again
+        self.max_tags = max_size
+        self._versions = OrderedDict()
+        self._clock = 0
+        self._evicted = 0
+
+    async def get(self, key):
+        return self.entries.get(key)
+
+    async def set(self, key, entry, ttl: float):
+        self.entries.set(key, entry, ttl)
+
+    async def versions(self, tags):
+        result = []
+        for tag in tags:
+            version = self._versions.get(tag)
+            if version is None:
+                version = self._evicted
+            else:
+                self._versions.move_to_end(tag)
+            result.append(version)
+        return result
+
+    async def bump(self, tags):
+        for tag in tags:
+            self._clock += 1
+            self._versions[tag] = self._clock
+            self._versions.move_to_end(tag)
+        while len(self._versions) > self.max_tags:
+            _, version = self._versions.popitem(last=False)
+            self._evicted = max(self._evicted, version)
+
+    def stats(self):
+        return {**self.entries.stats(), "tags": len(self._versions)}
+
+
+class RedisBackend:
+    PREFIX = "fieldops:response:"
+
+    def __init__(self, url: str):
+        if aioredis is None:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis requires the redis package")
+        self.client = aioredis.from_url(url)
+
+    async def get(self, key):
+        raw = await self.client.get(self.PREFIX + key)
+        if raw is None:
+            return None
+        etag, _, body = raw.partition(b"\n")
+        return etag.decode(), body
+
+    async def set(self, key, entry, ttl: float):
+        etag, body = entry
+        await self.client.set(self.PREFIX + key, etag.encode() + b"\n" + body, px=int(ttl * 1000))
+
+    async def versions(self, tags):
+        values = await self.client.mget([self.PREFIX + "v:" + tag for tag in tags])
+        return [int(v) if v is not None else 0 for v in values]
+
+    async def bump(self, tags):
+        async with self.client.pipeline(transaction=False) as pipe:
+            for tag in tags:
+                pipe.incr(self.PREFIX + "v:" + tag)
+            await pipe.execute()
+
+    def stats(self):
+        return {}
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [c.strip() for c in header.split(",")]
+    return "*" in candidates or any(c.removeprefix("W/") == etag for c in candidates)
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl: float, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self._pending = set()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    async def respond(self, request: Request, principal_id, tags, build) -> Response:
+        """
+        Serve build()'s JSON-able result for this route and principal, from cache when
+        none of `tags` changed since it was stored. Honours If-None-Match.
+        """
+        entry, key = None, None
+        if self.enabled:
+            try:
+                versions = await self.backend.versions(tags)
+                key = f"{request.url.path}?{request.url.query}|{principal_id}|{','.join(map(str, versions))}"
+                entry = await self.backend.get(key)
+            except Exception:
+                # A broken shared backend must not take the endpoint down with it
+                self.errors += 1
+                logger.exception("Response cache lookup failed")
+                key = None
+
+        if entry is None:
+            self.misses += 1
+            body = dumps(await build())
+            entry = ('"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"', body)
+            if key is not None:
+                try:
+                    await self.backend.set(key, entry, self.ttl)
+                except Exception:
+                    self.errors += 1
+                    logger.exception("Response cache store failed")
+        else:
+            self.hits += 1
+
+        etag, body = entry
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return TrustedJSONResponse(body, headers=headers)
+
+    async def invalidate(self, *tags):
+        self.invalidations += 1
+        try:
+            await self.backend.bump(tags)
+        except Exception:
+            self.errors += 1
+            logger.exception("Response cache invalidation failed")
+
+    def invalidate_soon(self, *tags):
+        """invalidate() from synchronous code (e.g. a LISTEN callback)."""
+        task = asyncio.get_running_loop().create_task(self.invalidate(*tags))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+            "backend": self.backend.stats(),
+        }
+
+
+def task_tags(user_id, *field_worker_ids) -> list:
+    """Tags touched by a change to one task: the admin totals, its owner and its workers."""
+    tags = ["tasks", f"tasks:user:{user_id}"]
+    tags.extend(f"tasks:worker:{w}" for w in field_worker_ids if w is not None)
+    return tags
+
+
+def _make_backend():
+    if settings.RESPONSE_CACHE_BACKEND == "redis":
+        return RedisBackend(settings.RESPONSE_CACHE_URL)
+    return MemoryBackend(settings.RESPONSE_CACHE_MAX_SIZE, settings.RESPONSE_CACHE_TTL_SECONDS)
+
+
+response_cache = ResponseCache(
+    _make_backend(), settings.RESPONSE_CACHE_TTL_SECONDS, enabled=settings.RESPONSE_CACHE_ENABLED
+)
+register_collector("response_cache", response_cache.stats)
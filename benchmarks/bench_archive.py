@@ -0,0 +1,178 @@
+"""
+Hot-query latency as task history grows, with and without archival (0010_service_request_archive).
+
+Seeds a scratch schema with users, workers and a fixed set of open tasks, then ages it
+in rounds. Each round adds a batch of completed history (older than ARCHIVE_AFTER_DAYS,
+half with proofs) and times the hot queries twice: once with that round's history
+still in service_requests, and once after archival.archive_completed has moved it
+out. The second column should stay flat round after round while the archive grows;
+service_requests stops growing too, since vacuum hands the freed pages to the next round.
+
+    python -m benchmarks.bench_archive --rounds 5 --history 500000 --open 20000
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import asyncpg
+
+from app.core.config import settings
+from app.db_setup.migrations import apply_migrations
+from app.services import archival
+
+HOT_QUERIES = {
+    "pending queue": ("""
+        SELECT id, title, urgency, created_at FROM service_requests
+        WHERE status = 'PENDING'
+        ORDER BY created_at, id
+        LIMIT 50
+    """, lambda rng, a: ()),
+    "user tasks": ("""
+        SELECT id, title, status, created_at FROM service_requests
+        WHERE user_id = $1
+        ORDER BY created_at DESC, id DESC
+        LIMIT 50
+    """, lambda rng, a: (rng.choice(a.user_ids),)),
+    "worker open": ("""
+        SELECT id, title, status, created_at FROM service_requests
+        WHERE field_worker_id = $1 AND status IN ('ASSIGNED', 'IN_PROGRESS')
+        ORDER BY created_at DESC, id DESC
+        LIMIT 50
+    """, lambda rng, a: (rng.choice(a.worker_ids),)),
+    "recent done": ("""
+        SELECT id, title, completed_at FROM service_requests
+        WHERE status = 'COMPLETED'
+        ORDER BY created_at DESC, id DESC
+        LIMIT 50
+    """, lambda rng, a: ()),
+}
+
+SIZES_SQL = """
+    SELECT pg_total_relation_size('service_requests') AS hot,
+           COALESCE((SELECT SUM(pg_total_relation_size(relid))
+                     FROM pg_partition_tree('service_requests_archive')), 0) AS archive
+"""
+
+
+async def seed(conn, users: int, workers: int, open_tasks: int):
+    await conn.execute("""
+        INSERT INTO users (username, email, hashed_password, role, is_active, is_approved)
+        SELECT 'arch_user_' || g, 'arch_user_' || g || '@example.com', 'x', 'USER', TRUE, TRUE
+        FROM generate_series(1, $1) g
+    """, users)
+    await conn.execute("""
+        INSERT INTO users (username, email, hashed_password, role, is_active, is_approved)
+        SELECT 'arch_worker_' || g, 'arch_worker_' || g || '@example.com', 'x', 'FIELD_WORKER', TRUE, TRUE
+        FROM generate_series(1, $1) g
+    """, workers)
+    await conn.execute("""
+        WITH u AS (SELECT array_agg(id) AS ids FROM users WHERE role = 'USER'),
+             w AS (SELECT array_agg(id) AS ids FROM users WHERE role = 'FIELD_WORKER')
+        INSERT INTO service_requests (user_id, field_worker_id, title, urgency, status, created_at, updated_at)
+        SELECT u.ids[1 + g % array_length(u.ids, 1)],
+               CASE WHEN g % 3 = 0 THEN NULL ELSE w.ids[1 + g % array_length(w.ids, 1)] END,
+               'Open task ' || g, (ARRAY['LOW', 'MEDIUM', 'HIGH'])[1 + g % 3],
+               (ARRAY['PENDING', 'ASSIGNED', 'IN_PROGRESS'])[1 + g % 3],
+               NOW() - make_interval(mins => g % 20000), NOW()
+        FROM generate_series(1, $1) g, u, w
+    """, open_tasks)
+
+
+async def add_history(conn, rows: int, round_no: int):
+    """Completed tasks from the round_no-th year back, all past the archive window."""
+    await conn.execute("""
+        WITH u AS (SELECT array_agg(id) AS ids FROM users WHERE role = 'USER'),
+             w AS (SELECT array_agg(id) AS ids FROM users WHERE role = 'FIELD_WORKER'),
+             t AS (
+                SELECT g, NOW() - make_interval(days => $3 + 365 * ($2 - 1)) - random() * interval '365 days' AS created
+                FROM generate_series(1, $1) g
+             )
+        INSERT INTO service_requests
+            (user_id, field_worker_id, title, urgency, status, created_at, updated_at, completed_at, rating)
+        SELECT u.ids[1 + g % array_length(u.ids, 1)], w.ids[1 + g % array_length(w.ids, 1)],
+               'Done task ' || g, (ARRAY['LOW', 'MEDIUM', 'HIGH'])[1 + g % 3], 'COMPLETED',
+               created, created + interval '2 days', created + interval '2 days',
+               CASE WHEN g % 4 = 0 THEN NULL ELSE 1 + g % 5 END
+        FROM t, u, w
+    """, rows, round_no, settings.ARCHIVE_AFTER_DAYS + 1)
+    await conn.execute("""
+        INSERT INTO task_proofs (task_id, image_path, notes)
+        SELECT id, 'proofs/' || id || '.jpg', 'done'
+        FROM service_requests
+        WHERE status = 'COMPLETED' AND id % 2 = 0
+          AND NOT EXISTS (SELECT 1 FROM task_proofs p WHERE p.task_id = service_requests.id)
+    """)
+    await conn.execute("ANALYZE")
+
+
+async def time_hot_queries(conn, args, rng) -> dict:
+    results = {}
+    for name, (query, params) in HOT_QUERIES.items():
+        timings = []
+        for _ in range(args.queries):
+            started = time.perf_counter()
+            await conn.fetch(query, *params(rng, args))
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        results[name] = (statistics.median(timings), timings[min(len(timings) - 1, int(0.95 * len(timings)))])
+    return results
+
+
+def mb(size) -> str:
+    return f"{size / 1024 / 1024:8.1f} MB"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=settings.DATABASE_URL)
+    parser.add_argument("--schema", default="fieldops_bench")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--history", type=int, default=500000, help="Completed tasks added per round")
+    parser.add_argument("--open", type=int, default=20000, help="Open tasks, constant across rounds")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200, help="Timed runs per hot query and phase")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch schema")
+    args = parser.parse_args()
+
+    conn = await asyncpg.connect(args.dsn)
+    try:
+        await conn.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+        await conn.execute(f'CREATE SCHEMA "{args.schema}"')
+        await conn.execute(f'SET search_path TO "{args.schema}"')
+        await apply_migrations(conn)
+        await seed(conn, args.users, args.workers, args.open)
+        args.user_ids = [r["id"] for r in await conn.fetch("SELECT id FROM users WHERE role = 'USER'")]
+        args.worker_ids = [r["id"] for r in await conn.fetch("SELECT id FROM users WHERE role = 'FIELD_WORKER'")]
+        rng = random.Random(23)
+
+        print(f"{'round':>5} {'query':<14} {'in table p50/p95 ms':>22} {'archived p50/p95 ms':>22}")
+        for round_no in range(1, args.rounds + 1):
+            await add_history(conn, args.history, round_no)
+            before = await time_hot_queries(conn, args, rng)
+            grown = await conn.fetchrow(SIZES_SQL)
+
+            started = time.perf_counter()
+            moved = await archival.archive_completed(conn)
+            archive_seconds = time.perf_counter() - started
+            await conn.execute("VACUUM ANALYZE service_requests")
+            await conn.execute("VACUUM ANALYZE task_proofs")
+            after = await time_hot_queries(conn, args, rng)
+            sizes = await conn.fetchrow(SIZES_SQL)
+
+            for name in HOT_QUERIES:
+                print(f"{round_no:>5} {name:<14} {before[name][0]:10.2f} /{before[name][1]:8.2f}"
+                      f"   {after[name][0]:10.2f} /{after[name][1]:8.2f}")
+            print(f"{'':>5} archived {moved['tasks']} tasks / {moved['proofs']} proofs in {archive_seconds:.1f}s; "
+                  f"service_requests {mb(grown['hot'])} -> {mb(sizes['hot'])}, archive {mb(sizes['archive'])}")
+    finally:
+        if not args.keep:
+            await conn.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+"""
+Dispatch throughput benchmark.
+
+In-memory (default): times plan_assignments over synthetic pending tasks and workers.
+
+    python -m benchmarks.bench_dispatch --tasks 100000 --workers 5000
+
+With --db: seeds a scratch schema and times full run_dispatch_cycle calls
+(lock batch, load worker counters, plan, batched UPDATE) until the queue drains.
+
+    python -m benchmarks.bench_dispatch --db --tasks 100000 --workers 5000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+
+import asyncpg
+
+from app import database
+from app.core.config import settings
+from app.db_setup.migrations import apply_migrations
+from app.services.dispatch import plan_assignments, run_dispatch_cycle
+
+URGENCIES = ("LOW", "MEDIUM", "HIGH")
+
+
+def synthetic(tasks: int, workers: int, locations: int, seed: int = 7):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    task_rows = [
+        (i, rng.choice(URGENCIES), now - timedelta(seconds=rng.randint(0, 86400 * 7)), f"Zone {rng.randrange(locations)}")
+        for i in range(1, tasks + 1)
+    ]
+    worker_rows = [
+        (100000000 + i, rng.randint(0, 3), f"zone {rng.randrange(locations)}")
+        for i in range(workers)
+    ]
+    return task_rows, worker_rows
+
+
+def bench_planner(args):
+    task_rows, worker_rows = synthetic(args.tasks, args.workers, args.locations)
+    capacity = -(-args.tasks // args.workers) + 3
+    for match_location in (False, True):
+        started = time.perf_counter()
+        plan = plan_assignments(task_rows, worker_rows, capacity, match_location)
+        elapsed = time.perf_counter() - started
+        print(
+            f"match_location={match_location!s:<5} assigned={len(plan):>7} "
+            f"time={elapsed * 1000:8.1f} ms  rate={len(plan) / elapsed:,.0f} assignments/s"
+        )
+
+
+async def bench_database(args):
+    conn = await asyncpg.connect(args.dsn)
+    try:
+        await conn.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+        await conn.execute(f'CREATE SCHEMA "{args.schema}"')
+        await conn.execute(f'SET search_path TO "{args.schema}"')
+        await apply_migrations(conn)
+        await conn.execute("""
+            INSERT INTO users (username, email, hashed_password, role, is_active, is_approved, address)
+            SELECT 'bench_worker_' || g, 'bench_worker_' || g || '@example.com', 'x',
+                   'FIELD_WORKER', TRUE, TRUE, 'zone ' || (g % $2)
+            FROM generate_series(1, $1) g
+        """, args.workers, args.locations)
+        await conn.execute("""
+            INSERT INTO service_requests (user_id, title, location, urgency, created_at)
+            SELECT 1, 'Task ' || g, 'Zone ' || (g % $2),
+                   (ARRAY['LOW', 'MEDIUM', 'HIGH'])[1 + g % 3],
+                   NOW() - make_interval(secs => g)
+            FROM generate_series(1, $1) g
+        """, args.tasks, args.locations)
+        await conn.execute("ANALYZE")
+    except BaseException:
+        await conn.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+        await conn.close()
+        raise
+
+    database.pool = await asyncpg.create_pool(args.dsn, server_settings={"search_path": args.schema})
+    try:
+        capacity = -(-args.tasks // args.workers) + 3
+        total, started = 0, time.perf_counter()
+        while True:
+            assigned = await run_dispatch_cycle(args.batch_size, capacity, match_location=True)
+            total += assigned
+            if assigned == 0:
+                break
+        elapsed = time.perf_counter() - started
+        print(f"db: assigned={total} time={elapsed:.2f}s rate={total / elapsed:,.0f} assignments/s (batch {args.batch_size})")
+    finally:
+        await database.pool.close()
+        if not args.keep:
+            await conn.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=5000)
+    parser.add_argument("--locations", type=int, default=200)
+    parser.add_argument("--db", action="store_true", help="Benchmark full cycles against Postgres")
+    parser.add_argument("--dsn", default=settings.DATABASE_URL)
+    parser.add_argument("--schema", default="fieldops_bench")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch schema")
+    args = parser.parse_args()
+
+    if args.db:
+        asyncio.run(bench_database(args))
+    else:
+        bench_planner(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Nearest-worker benchmark for the grid index (0008_geo_coordinates).
+
+Seeds a scratch schema with field workers and tasks scattered around a handful of
+metro areas, then times geo.nearest_workers for random tasks against a brute-force
+ORDER BY distance over every dispatchable worker, and checks both return the same set.
+
+    python -m benchmarks.bench_geo --workers 50000 --tasks 1000000 --queries 500
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import asyncpg
+
+from app import database
+from app.core.config import settings
+from app.db_setup.migrations import apply_migrations
+from app.services import geo
+
+# (lat, lon, spread in degrees)
+METROS = [
+    (40.71, -74.01, 0.6), (34.05, -118.24, 0.8), (51.51, -0.13, 0.5), (48.86, 2.35, 0.4),
+    (35.68, 139.69, 0.7), (19.08, 72.88, 0.5), (-23.55, -46.63, 0.6), (-33.87, 151.21, 0.5),
+]
+
+BRUTE_FORCE_SQL = """
+    SELECT u.id
+    FROM users u
+    LEFT JOIN stats_counters c
+        ON c.scope = 'worker_tasks' AND c.scope_id = u.id
+        AND c.key IN ('ASSIGNED', 'IN_PROGRESS')
+    WHERE u.role = 'FIELD_WORKER' AND u.is_active = TRUE AND u.is_approved = TRUE
+      AND u.latitude IS NOT NULL
+    GROUP BY u.id
+    HAVING COALESCE(SUM(c.value), 0) < $3
+    ORDER BY 2 * 6371.0088 * asin(least(1, sqrt(
+        sin(radians(u.latitude - $1) / 2) ^ 2
+        + cos(radians($1)) * cos(radians(u.latitude)) * sin(radians(u.longitude - $2) / 2) ^ 2)))
+    LIMIT $4
+"""
+
+
+async def seed(conn, workers: int, tasks: int):
+    metros = [list(m) for m in zip(*METROS)]
+    await conn.execute("""
+        INSERT INTO users (username, email, hashed_password, role, is_active, is_approved, latitude, longitude)
+        SELECT 'geo_worker_' || g, 'geo_worker_' || g || '@example.com', 'x', 'FIELD_WORKER', TRUE, TRUE,
+               ($2::float8[])[1 + g % $5] + (($4::float8[])[1 + g % $5]) * (random() * 2 - 1),
+               ($3::float8[])[1 + g % $5] + (($4::float8[])[1 + g % $5]) * (random() * 2 - 1)
+        FROM generate_series(1, $1) g
+    """, workers, metros[0], metros[1], metros[2], len(METROS))
+    await conn.execute("""
+        INSERT INTO service_requests (user_id, title, location, urgency, latitude, longitude, created_at)
+        SELECT 1, 'Task ' || g, 'Zone ' || (g % 500), (ARRAY['LOW', 'MEDIUM', 'HIGH'])[1 + g % 3],
+               ($2::float8[])[1 + g % $5] + (($4::float8[])[1 + g % $5]) * (random() * 2 - 1),
+               ($3::float8[])[1 + g % $5] + (($4::float8[])[1 + g % $5]) * (random() * 2 - 1),
+               NOW() - make_interval(secs => g)
+        FROM generate_series(1, $1) g
+    """, tasks, metros[0], metros[1], metros[2], len(METROS))
+    await conn.execute("ANALYZE")
+
+
+def summary(label, timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(0.95 * len(timings)))]
+    print(f"{label:<12} p50={statistics.median(timings):8.2f} ms  p95={p95:8.2f} ms  max={timings[-1]:8.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=settings.DATABASE_URL)
+    parser.add_argument("--schema", default="fieldops_bench")
+    parser.add_argument("--workers", type=int, default=50000)
+    parser.add_argument("--tasks", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--max-km", type=float, default=50.0)
+    parser.add_argument("--brute-force", type=int, default=50, help="Queries to also run without the index")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch schema")
+    args = parser.parse_args()
+
+    conn = await asyncpg.connect(args.dsn)
+    try:
+        await conn.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+        await conn.execute(f'CREATE SCHEMA "{args.schema}"')
+        await conn.execute(f'SET search_path TO "{args.schema}"')
+        await apply_migrations(conn)
+        started = time.perf_counter()
+        await seed(conn, args.workers, args.tasks)
+        print(f"Seeded {args.workers} workers / {args.tasks} tasks in {time.perf_counter() - started:.1f}s")
+
+        task_ids = random.Random(3).sample(range(1, args.tasks + 1), args.queries)
+        tasks = await conn.fetch(
+            "SELECT id, latitude, longitude FROM service_requests WHERE id = ANY($1::int[])", task_ids
+        )
+        database.pool = await asyncpg.create_pool(args.dsn, server_settings={"search_path": args.schema})
+
+        grid, results = [], {}
+        for t in tasks:
+            started = time.perf_counter()
+            found = await geo.nearest_workers(
+                t["latitude"], t["longitude"], args.k, args.max_km, settings.DISPATCH_MAX_OPEN_PER_WORKER
+            )
+            grid.append((time.perf_counter() - started) * 1000)
+            results[t["id"]] = found
+        summary("grid", grid)
+        print(f"{'':<12} cells/query={geo.stats['cells_scanned'] / len(tasks):.1f}  "
+              f"candidates/query={geo.stats['candidates_scanned'] / len(tasks):.1f}")
+
+        brute, mismatches = [], 0
+        for t in tasks[:args.brute_force]:
+            started = time.perf_counter()
+            rows = await conn.fetch(
+                BRUTE_FORCE_SQL, t["latitude"], t["longitude"], settings.DISPATCH_MAX_OPEN_PER_WORKER, args.k
+            )
+            brute.append((time.perf_counter() - started) * 1000)
+            expected = {r["id"] for r in rows}
+            found = {w["id"] for w in results[t["id"]]}
+            # Brute force has no radius cap, so only compare when the grid found a full K
+            if len(found) == args.k and found != expected:
+                mismatches += 1
+        if brute:
+            summary("brute force", brute)
+            print(f"{'':<12} mismatches={mismatches}/{len(brute)}")
+    finally:
+        if database.pool is not None:
+            await database.pool.close()
+        if not args.keep:
+            await conn.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
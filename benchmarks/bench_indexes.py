@@ -0,0 +1,158 @@
+"""
+Seeds synthetic users/service_requests/task_proofs into a scratch schema and reports
+query plans and latencies for the hot access patterns before and after the index
+migration (0003_service_request_indexes).
+
+    python -m benchmarks.bench_indexes --users 50000 --tasks 2000000
+
+The scratch schema is dropped afterwards unless --keep is given; nothing outside it
+is touched.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import asyncpg
+
+from app.core.config import settings
+from app.db_setup.migrations import apply_migrations
+
+INDEX_MIGRATION = 3
+
+QUERIES = {
+    "user_summary": (
+        "SELECT status, COUNT(*) FROM service_requests WHERE user_id = $1 GROUP BY status",
+        lambda a: (a.sample_user,),
+    ),
+    "worker_summary": (
+        "SELECT status, COUNT(*) FROM service_requests WHERE field_worker_id = $1 GROUP BY status",
+        lambda a: (a.sample_worker,),
+    ),
+    "pending_queue": (
+        "SELECT id FROM service_requests WHERE status = 'PENDING' ORDER BY created_at LIMIT 50",
+        lambda a: (),
+    ),
+    "task_proofs": (
+        "SELECT * FROM task_proofs WHERE task_id = $1",
+        lambda a: (a.sample_task,),
+    ),
+}
+
+
+async def seed(conn, users: int, tasks: int, proofs_per_task: float):
+    # Admin from 0001 has id 1; every 10th synthetic user is an approved field worker.
+    await conn.execute("""
+        INSERT INTO users (username, email, hashed_password, role, is_active, is_approved)
+        SELECT 'bench_' || g, 'bench_' || g || '@example.com', 'x',
+               CASE WHEN g % 10 = 0 THEN 'FIELD_WORKER' ELSE 'USER' END, TRUE, TRUE
+        FROM generate_series(1, $1) g
+    """, users)
+    await conn.execute("""
+        INSERT INTO service_requests (user_id, field_worker_id, title, location, urgency, status, created_at)
+        SELECT 2 + (g * 7919) % $2,
+               CASE WHEN s.status = 'PENDING' THEN NULL ELSE 11 + 10 * (g % ($2 / 10)) END,
+               'Task ' || g, 'Zone ' || (g % 500),
+               (ARRAY['LOW', 'MEDIUM', 'HIGH'])[1 + g % 3],
+               s.status,
+               NOW() - make_interval(secs => ($1 - g) * 30)
+        FROM generate_series(1, $1) g
+        CROSS JOIN LATERAL (
+            SELECT CASE
+                WHEN g % 100 < 5 THEN 'PENDING'
+                WHEN g % 100 < 9 THEN 'ASSIGNED'
+                WHEN g % 100 < 15 THEN 'IN_PROGRESS'
+                ELSE 'COMPLETED'
+            END AS status
+        ) s
+    """, tasks, users)
+    await conn.execute("""
+        INSERT INTO task_proofs (task_id, image_path, notes)
+        SELECT 1 + (g * 104729) % $1, 'uploads/bench/' || g || '.jpg', NULL
+        FROM generate_series(1, ($1 * $2::float8)::int) g
+    """, tasks, proofs_per_task)
+    await conn.execute("ANALYZE")
+
+
+async def measure(conn, args):
+    results = {}
+    for name, (sql, params) in QUERIES.items():
+        values = params(args)
+        plan = await conn.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", *values)
+        plan = json.loads(plan)[0] if isinstance(plan, str) else plan[0]
+
+        stmt = await conn.prepare(sql)
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            await stmt.fetch(*values)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        results[name] = {
+            "plan": _plan_summary(plan["Plan"]),
+            "execution_ms": round(plan["Execution Time"], 3),
+            "p50_ms": round(statistics.median(timings), 3),
+            "max_ms": round(max(timings), 3),
+        }
+    return results
+
+
+def _plan_summary(node) -> str:
+    label = node["Node Type"]
+    if "Index Name" in node:
+        label += f" using {node['Index Name']}"
+    elif "Relation Name" in node:
+        label += f" on {node['Relation Name']}"
+    children = [_plan_summary(child) for child in node.get("Plans", [])]
+    return f"{label} <- [{', '.join(children)}]" if children else label
+
+
+def report(before, after):
+    print(f"{'query':<16} {'before p50 ms':>14} {'after p50 ms':>13}  plan after")
+    for name in QUERIES:
+        print(f"{name:<16} {before[name]['p50_ms']:>14} {after[name]['p50_ms']:>13}  {after[name]['plan']}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=settings.DATABASE_URL)
+    parser.add_argument("--schema", default="fieldops_bench")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--tasks", type=int, default=1000000)
+    parser.add_argument("--proofs-per-task", type=float, default=0.5)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--json", help="Write full results (including plans) to this file")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch schema")
+    args = parser.parse_args()
+    args.sample_user, args.sample_worker, args.sample_task = 2 + args.users // 3, 11, args.tasks // 2
+
+    conn = await asyncpg.connect(args.dsn)
+    try:
+        await conn.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+        await conn.execute(f'CREATE SCHEMA "{args.schema}"')
+        await conn.execute(f'SET search_path TO "{args.schema}"')
+
+        await apply_migrations(conn, target=INDEX_MIGRATION - 1)
+        started = time.perf_counter()
+        await seed(conn, args.users, args.tasks, args.proofs_per_task)
+        print(f"Seeded {args.users} users / {args.tasks} tasks in {time.perf_counter() - started:.1f}s")
+
+        before = await measure(conn, args)
+        await apply_migrations(conn, target=INDEX_MIGRATION)
+        await conn.execute("ANALYZE")
+        after = await measure(conn, args)
+
+        report(before, after)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"before": before, "after": after}, f, indent=2)
+    finally:
+        if not args.keep:
+            await conn.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
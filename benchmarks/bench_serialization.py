@@ -0,0 +1,87 @@
+"""
+Serialization microbenchmark: current response path vs. precompiled RecordEncoders.
+
+"pydantic" emulates what update_task_status did before: dict(row), TaskProofOut(**proof)
+per proof, then FastAPI's response_model validation, jsonable_encoder and JSONResponse.
+"encoder" is service_request_encoder.encode(row, proofs=...) as used now.
+
+    python -m benchmarks.bench_serialization --proofs 5 --iterations 20000
+
+Rows are dicts standing in for asyncpg Records (both are read through the mapping API).
+"""
+
+import argparse
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.schemas.serializers import service_request_encoder
+from app.schemas.task import ServiceRequestOut, TaskProofOut
+
+
+def make_rows(proof_count: int):
+    now = datetime.utcnow()
+    task = {
+        "id": 42, "user_id": 7, "field_worker_id": 11, "title": "Replace water heater",
+        "description": "Unit in basement is leaking; customer home after 5pm. " * 4,
+        "location": "12 Harbour Road", "urgency": "HIGH", "status": "COMPLETED",
+        "created_at": now - timedelta(days=2), "updated_at": now, "completed_at": now, "rating": None,
+    }
+    proofs = [
+        {"id": 100 + i, "task_id": 42, "image_path": f"uploads/ab/cd/{i:064x}.jpg", "notes": "done", "uploaded_at": now}
+        for i in range(proof_count)
+    ]
+    return task, proofs
+
+
+def pydantic_path(task, proofs) -> bytes:
+    updated_task = dict(task)
+    proof_models = [TaskProofOut(**proof) for proof in proofs]
+    content = {**updated_task, "proofs": proof_models}
+    validated = ServiceRequestOut.model_validate(content)
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def encoder_path(task, proofs) -> bytes:
+    return service_request_encoder.encode(task, proofs=proofs)
+
+
+def run(fn, task, proofs, iterations: int):
+    fn(task, proofs)  # warm up
+
+    # Transient memory: peak traced bytes above the baseline while building one response
+    tracemalloc.start()
+    peaks = []
+    for _ in range(100):
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn(task, proofs)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+    peak_bytes = sum(peaks) / len(peaks)
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn(task, proofs)
+    per_call_us = (time.perf_counter() - started) / iterations * 1e6
+    return per_call_us, peak_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--proofs", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    task, proofs = make_rows(args.proofs)
+    print(f"{'path':<10} {'us/response':>12} {'peak bytes/response':>20}")
+    for name, fn in (("pydantic", pydantic_path), ("encoder", encoder_path)):
+        per_call_us, peak_bytes = run(fn, task, proofs, args.iterations)
+        print(f"{name:<10} {per_call_us:>12.1f} {peak_bytes:>20.0f}")
+
+
+if __name__ == "__main__":
+    main()
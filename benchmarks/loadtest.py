@@ -0,0 +1,341 @@
+"""
+Load-test harness for the FastAPI endpoints.
+
+Seeds a scratch schema with users, field workers, service_requests and task_proofs,
+then drives a weighted mix of realistic calls (login, create task, status transitions
+with proof uploads, summaries, listings, admin dashboard) at a fixed concurrency.
+Reports p50/p95/p99 latency, RPS and DB queries per request (from the X-DB-Queries
+header added by the instrumentation middleware) per endpoint, and writes JSON that
+a later run can be gated against.
+
+In-process (runs app.main:app's lifespan, so the pool, revocation set and background
+services start as in production, with every connection pointed at the scratch schema):
+
+    python -m benchmarks.loadtest --users 2000 --tasks 200000 --concurrency 50 --duration 60 --out run.json
+
+Against a running server (start it with search_path set to --schema, e.g.
+DATABASE_URL=postgresql://...?options=-csearch_path%3Dfieldops_loadtest):
+
+    python -m benchmarks.loadtest --base-url http://localhost:8000 --out run.json
+
+Admission control (app/core/admission.py) would otherwise answer most of this
+traffic with 429: every simulated account logs in from the same IP. In-process runs
+switch it off; start a target server with ADMISSION_ENABLED=false (or limits raised
+well above the configured concurrency) to measure the endpoints themselves.
+
+Regression gate (exit code 1 when p95 or RPS regress by more than the threshold):
+
+    python -m benchmarks.loadtest ... --compare baseline.json --max-regression 0.15
+
+Requires httpx.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+import asyncpg
+import httpx
+
+from app.core.config import settings
+from app.core.hashing import pwd_context
+from app.db_setup.migrations import apply_migrations
+
+PASSWORD = "loadtest-password"
+API = "/api/v1"
+
+# name -> weight
+WORKLOAD = {
+    "login": 5,
+    "create_task": 15,
+    "user_summary": 15,
+    "user_list_tasks": 15,
+    "worker_summary": 10,
+    "worker_status_upload": 10,
+    "worker_list_tasks": 10,
+    "admin_summary": 10,
+    "admin_list_tasks": 10,
+}
+
+
+async def seed(conn, args):
+    hashed = pwd_context.hash(PASSWORD)
+    await conn.execute("""
+        INSERT INTO users (username, email, hashed_password, role, is_active, is_approved)
+        SELECT 'lt_user_' || g, 'lt_user_' || g || '@example.com', $2, 'USER', TRUE, TRUE
+        FROM generate_series(1, $1) g
+    """, args.users, hashed)
+    await conn.execute("""
+        INSERT INTO users (username, email, hashed_password, role, is_active, is_approved)
+        SELECT 'lt_worker_' || g, 'lt_worker_' || g || '@example.com', $2, 'FIELD_WORKER', TRUE, TRUE
+        FROM generate_series(1, $1) g
+    """, args.workers, hashed)
+    await conn.execute("""
+        INSERT INTO users (username, email, hashed_password, role, is_active, is_approved)
+        VALUES ('lt_admin', 'lt_admin@example.com', $1, 'ADMIN', TRUE, TRUE)
+    """, hashed)
+
+    user_ids = [r["id"] for r in await conn.fetch("SELECT id FROM users WHERE username LIKE 'lt_user_%' ORDER BY id")]
+    worker_ids = [r["id"] for r in await conn.fetch("SELECT id FROM users WHERE username LIKE 'lt_worker_%' ORDER BY id")]
+    await conn.execute("""
+        INSERT INTO service_requests (user_id, field_worker_id, title, description, location, urgency, status, created_at, completed_at)
+        SELECT u.ids[1 + g % array_length(u.ids, 1)],
+               CASE WHEN s.status = 'PENDING' THEN NULL ELSE w.ids[1 + g % array_length(w.ids, 1)] END,
+               'Load task ' || g, repeat('details ', 20), 'Zone ' || (g % 100),
+               (ARRAY['LOW', 'MEDIUM', 'HIGH'])[1 + g % 3], s.status,
+               NOW() - make_interval(secs => g),
+               CASE WHEN s.status = 'COMPLETED' THEN NOW() - make_interval(secs => g / 2) END
+        FROM generate_series(1, $1) g,
+             (SELECT $2::int[] AS ids) u,
+             (SELECT $3::int[] AS ids) w,
+             LATERAL (SELECT CASE WHEN g % 10 < 2 THEN 'PENDING' WHEN g % 10 < 5 THEN 'ASSIGNED'
+                                  WHEN g % 10 < 6 THEN 'IN_PROGRESS' ELSE 'COMPLETED' END AS status) s
+    """, args.tasks, user_ids, worker_ids)
+    await conn.execute("""
+        INSERT INTO task_proofs (task_id, image_path, notes)
+        SELECT id, 'uploads/loadtest/' || id || '.jpg', 'seeded'
+        FROM service_requests WHERE status = 'COMPLETED' AND random() < $1
+    """, args.proof_ratio)
+    await conn.execute("ANALYZE")
+
+    assigned = defaultdict(list)
+    for r in await conn.fetch("SELECT id, field_worker_id FROM service_requests WHERE status = 'ASSIGNED'"):
+        assigned[r["field_worker_id"]].append(r["id"])
+    return assigned
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.db_ms = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, name, elapsed, response):
+        self.samples[name].append(elapsed)
+        if response is None or response.status_code >= 400:
+            self.errors[name] += 1
+        if response is not None and "x-db-queries" in response.headers:
+            self.queries[name].append(int(response.headers["x-db-queries"]))
+            self.db_ms[name].append(float(response.headers["x-db-time-ms"]))
+
+    def report(self, duration):
+        def pct(values, q):
+            ordered = sorted(values)
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+        endpoints = {}
+        for name, values in sorted(self.samples.items()):
+            ms = [v * 1000 for v in values]
+            endpoints[name] = {
+                "requests": len(values),
+                "errors": self.errors[name],
+                "rps": round(len(values) / duration, 2),
+                "p50_ms": round(pct(ms, 0.50), 2),
+                "p95_ms": round(pct(ms, 0.95), 2),
+                "p99_ms": round(pct(ms, 0.99), 2),
+                "mean_ms": round(statistics.fmean(ms), 2),
+                "queries_per_request": round(statistics.fmean(self.queries[name]), 2) if self.queries[name] else None,
+                "db_ms_per_request": round(statistics.fmean(self.db_ms[name]), 2) if self.db_ms[name] else None,
+            }
+        total = sum(len(v) for v in self.samples.values())
+        return {
+            "endpoints": endpoints,
+            "totals": {
+                "requests": total,
+                "errors": sum(self.errors.values()),
+                "rps": round(total / duration, 2),
+            },
+        }
+
+
+class Workload:
+    def __init__(self, client, assigned, args):
+        self.client = client
+        self.assigned = assigned
+        self.args = args
+        self.tokens = {}
+        self.rng = random.Random(args.seed)
+
+    async def login(self, username):
+        while True:
+            response = await self.client.post(f"{API}/auth/login", data={"username": username, "password": PASSWORD})
+            if response.status_code not in (429, 503):
+                break
+            # A target still running admission control: wait as told rather than fail the setup
+            await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+        response.raise_for_status()
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def prepare(self):
+        sample_users = [f"lt_user_{i}" for i in self.rng.sample(range(1, self.args.users + 1), min(50, self.args.users))]
+        sample_workers = [f"lt_worker_{i}" for i in self.rng.sample(range(1, self.args.workers + 1), min(50, self.args.workers))]
+        for name in sample_users + sample_workers + ["lt_admin"]:
+            self.tokens[name] = await self.login(name)
+        self.worker_ids = {
+            r["id"]: r["username"]
+            for r in await self.args.conn.fetch("SELECT id, username FROM users WHERE username = ANY($1::text[])", sample_workers)
+        }
+        self.user_names, self.worker_names = sample_users, sample_workers
+
+    def call(self, name):
+        rng = self.rng
+        if name == "login":
+            return self.client.post(f"{API}/auth/login", data={"username": rng.choice(self.user_names), "password": PASSWORD})
+        if name == "create_task":
+            body = {"title": "Leaking tap", "description": "Kitchen sink", "location": f"Zone {rng.randrange(100)}",
+                    "urgency": rng.choice(["LOW", "MEDIUM", "HIGH"])}
+            return self.client.post(f"{API}/user/users/", json=body, headers=self.tokens[rng.choice(self.user_names)])
+        if name == "user_summary":
+            return self.client.get(f"{API}/user/users/summary", headers=self.tokens[rng.choice(self.user_names)])
+        if name == "user_list_tasks":
+            return self.client.get(f"{API}/user/users/tasks", params={"limit": 20, "fields": "id,title,status,created_at"},
+                                   headers=self.tokens[rng.choice(self.user_names)])
+        if name == "worker_summary":
+            return self.client.get(f"{API}/tasks/tasks/field-worker/summary", headers=self.tokens[rng.choice(self.worker_names)])
+        if name == "worker_list_tasks":
+            return self.client.get(f"{API}/tasks/tasks/assigned", params={"limit": 20},
+                                   headers=self.tokens[rng.choice(self.worker_names)])
+        if name == "worker_status_upload":
+            worker_id = rng.choice(list(self.worker_ids))
+            queue = self.assigned.get(worker_id)
+            if not queue:
+                return None
+            task_id = queue.pop()
+            files = [("files", (f"proof_{task_id}.jpg", rng.randbytes(self.args.upload_bytes), "image/jpeg"))]
+            return self.client.patch(f"{API}/tasks/tasks/{task_id}/status", params={"status": "IN_PROGRESS"},
+                                     data={"notes": "on site"}, files=files, headers=self.tokens[self.worker_ids[worker_id]])
+        if name == "admin_summary":
+            return self.client.get(f"{API}/dashboard/dashboard/admin/summary", headers=self.tokens["lt_admin"])
+        if name == "admin_list_tasks":
+            return self.client.get(f"{API}/dashboard/dashboard/tasks", params={"status": "PENDING", "limit": 50},
+                                   headers=self.tokens["lt_admin"])
+        raise ValueError(name)
+
+
+async def drive(workload, recorder, args):
+    names, weights = zip(*WORKLOAD.items())
+    deadline = time.perf_counter() + args.duration
+
+    async def user_loop():
+        while time.perf_counter() < deadline:
+            name = workload.rng.choices(names, weights)[0]
+            request = workload.call(name)
+            if request is None:
+                continue
+            started = time.perf_counter()
+            try:
+                response = await request
+            except httpx.HTTPError:
+                response = None
+            recorder.record(name, time.perf_counter() - started, response)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user_loop() for _ in range(args.concurrency)))
+    return time.perf_counter() - started
+
+
+def compare(current, baseline, max_regression):
+    failures = []
+    for name, now in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before:
+            continue
+        if before["p95_ms"] and now["p95_ms"] > before["p95_ms"] * (1 + max_regression):
+            failures.append(f"{name}: p95 {before['p95_ms']} -> {now['p95_ms']} ms")
+        if before["rps"] and now["rps"] < before["rps"] * (1 - max_regression):
+            failures.append(f"{name}: rps {before['rps']} -> {now['rps']}")
+    return failures
+
+
+def print_report(result):
+    print(f"{'endpoint':<22} {'req':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'q/req':>6}")
+    for name, e in result["endpoints"].items():
+        print(f"{name:<22} {e['requests']:>7} {e['errors']:>5} {e['rps']:>8} {e['p50_ms']:>8} "
+              f"{e['p95_ms']:>8} {e['p99_ms']:>8} {e['queries_per_request'] or '-':>6}")
+    t = result["totals"]
+    print(f"{'total':<22} {t['requests']:>7} {t['errors']:>5} {t['rps']:>8}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=settings.DATABASE_URL)
+    parser.add_argument("--schema", default="fieldops_loadtest")
+    parser.add_argument("--base-url", help="Target a running server instead of booting the app in-process")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=100)
+    parser.add_argument("--tasks", type=int, default=100000)
+    parser.add_argument("--proof-ratio", type=float, default=0.3)
+    parser.add_argument("--upload-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="Write results JSON here")
+    parser.add_argument("--compare", help="Baseline results JSON to gate against")
+    parser.add_argument("--max-regression", type=float, default=0.10)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch schema")
+    args = parser.parse_args()
+
+    conn = args.conn = await asyncpg.connect(args.dsn)
+    await conn.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+    await conn.execute(f'CREATE SCHEMA "{args.schema}"')
+    await conn.execute(f'SET search_path TO "{args.schema}"')
+    try:
+        await apply_migrations(conn)
+        started = time.perf_counter()
+        assigned = await seed(conn, args)
+        print(f"Seeded {args.users} users, {args.workers} workers, {args.tasks} tasks in {time.perf_counter() - started:.1f}s")
+
+        async with contextlib.AsyncExitStack() as stack:
+            if args.base_url:
+                client = httpx.AsyncClient(base_url=args.base_url, timeout=30.0)
+            else:
+                # asyncpg passes unknown DSN parameters on as server settings
+                separator = "&" if "?" in args.dsn else "?"
+                settings.DATABASE_URL = f"{args.dsn}{separator}search_path={args.schema}"
+                settings.RUN_MIGRATIONS_ON_STARTUP = False
+                settings.ADMISSION_ENABLED = False
+                from app.main import app
+                # ASGITransport sends no lifespan events; without startup, revocations
+                # never become ready and every request falls back to the database
+                await stack.enter_async_context(app.router.lifespan_context(app))
+                client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=30.0)
+            client = await stack.enter_async_context(client)
+            workload = Workload(client, assigned, args)
+            await workload.prepare()
+            recorder = Recorder()
+            duration = await drive(workload, recorder, args)
+
+        result = recorder.report(duration)
+        result["meta"] = {
+            "target": args.base_url or "in-process",
+            "users": args.users, "workers": args.workers, "tasks": args.tasks,
+            "concurrency": args.concurrency, "duration_s": round(duration, 2),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+        print_report(result)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2)
+
+        if args.compare:
+            with open(args.compare, encoding="utf-8") as f:
+                failures = compare(result, json.load(f), args.max_regression)
+            for failure in failures:
+                print(f"REGRESSION {failure}")
+            if failures:
+                sys.exit(1)
+    finally:
+        if not args.keep:
+            await conn.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,152 @@
+-- Summary Counters
+-- Maintained by statement-level triggers so dashboard reads never scan the base tables.
+--   scope 'users'        scope_id 0           keys: total, active_field_workers, pending_approvals
+--   scope 'tasks'        scope_id 0           keys: task status
+--   scope 'user_tasks'   scope_id user_id     keys: task status
+--   scope 'worker_tasks' scope_id worker_id   keys: task status
+CREATE TABLE IF NOT EXISTS stats_counters (
+    scope VARCHAR(20) NOT NULL,
+    scope_id INTEGER NOT NULL DEFAULT 0,
+    key VARCHAR(30) NOT NULL,
+    value BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, scope_id, key)
+);
+
+CREATE OR REPLACE FUNCTION stats_user_keys(p_role TEXT, p_is_active BOOLEAN, p_is_approved BOOLEAN)
+RETURNS TABLE (scope TEXT, scope_id INTEGER, key TEXT) AS $$
+    SELECT 'users', 0, 'total'
+    UNION ALL
+    SELECT 'users', 0, 'active_field_workers'
+    WHERE p_role = 'FIELD_WORKER' AND p_is_active AND p_is_approved
+    UNION ALL
+    SELECT 'users', 0, 'pending_approvals'
+    WHERE p_role = 'FIELD_WORKER' AND p_is_approved = FALSE
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION stats_task_keys(p_user_id INTEGER, p_field_worker_id INTEGER, p_status TEXT)
+RETURNS TABLE (scope TEXT, scope_id INTEGER, key TEXT) AS $$
+    SELECT 'tasks', 0, p_status
+    WHERE p_status IS NOT NULL
+    UNION ALL
+    SELECT 'user_tasks', p_user_id, p_status
+    WHERE p_status IS NOT NULL
+    UNION ALL
+    SELECT 'worker_tasks', p_field_worker_id, p_status
+    WHERE p_status IS NOT NULL AND p_field_worker_id IS NOT NULL
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION stats_users_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO stats_counters (scope, scope_id, key, value)
+        SELECT k.scope, k.scope_id, k.key, SUM(d.delta)
+        FROM (SELECT role, is_active, is_approved, 1 AS delta FROM new_rows) d
+        CROSS JOIN LATERAL stats_user_keys(d.role, d.is_active, d.is_approved) k
+        GROUP BY k.scope, k.scope_id, k.key
+        HAVING SUM(d.delta) <> 0
+        ORDER BY k.scope, k.scope_id, k.key
+        ON CONFLICT (scope, scope_id, key) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO stats_counters (scope, scope_id, key, value)
+        SELECT k.scope, k.scope_id, k.key, SUM(d.delta)
+        FROM (
+            SELECT role, is_active, is_approved, 1 AS delta FROM new_rows
+            UNION ALL
+            SELECT role, is_active, is_approved, -1 AS delta FROM old_rows
+        ) d
+        CROSS JOIN LATERAL stats_user_keys(d.role, d.is_active, d.is_approved) k
+        GROUP BY k.scope, k.scope_id, k.key
+        HAVING SUM(d.delta) <> 0
+        ORDER BY k.scope, k.scope_id, k.key
+        ON CONFLICT (scope, scope_id, key) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    ELSE
+        INSERT INTO stats_counters (scope, scope_id, key, value)
+        SELECT k.scope, k.scope_id, k.key, SUM(d.delta)
+        FROM (SELECT role, is_active, is_approved, -1 AS delta FROM old_rows) d
+        CROSS JOIN LATERAL stats_user_keys(d.role, d.is_active, d.is_approved) k
+        GROUP BY k.scope, k.scope_id, k.key
+        HAVING SUM(d.delta) <> 0
+        ORDER BY k.scope, k.scope_id, k.key
+        ON CONFLICT (scope, scope_id, key) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION stats_service_requests_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO stats_counters (scope, scope_id, key, value)
+        SELECT k.scope, k.scope_id, k.key, SUM(d.delta)
+        FROM (SELECT user_id, field_worker_id, status, 1 AS delta FROM new_rows) d
+        CROSS JOIN LATERAL stats_task_keys(d.user_id, d.field_worker_id, d.status) k
+        GROUP BY k.scope, k.scope_id, k.key
+        HAVING SUM(d.delta) <> 0
+        ORDER BY k.scope, k.scope_id, k.key
+        ON CONFLICT (scope, scope_id, key) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO stats_counters (scope, scope_id, key, value)
+        SELECT k.scope, k.scope_id, k.key, SUM(d.delta)
+        FROM (
+            SELECT user_id, field_worker_id, status, 1 AS delta FROM new_rows
+            UNION ALL
+            SELECT user_id, field_worker_id, status, -1 AS delta FROM old_rows
+        ) d
+        CROSS JOIN LATERAL stats_task_keys(d.user_id, d.field_worker_id, d.status) k
+        GROUP BY k.scope, k.scope_id, k.key
+        HAVING SUM(d.delta) <> 0
+        ORDER BY k.scope, k.scope_id, k.key
+        ON CONFLICT (scope, scope_id, key) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    ELSE
+        INSERT INTO stats_counters (scope, scope_id, key, value)
+        SELECT k.scope, k.scope_id, k.key, SUM(d.delta)
+        FROM (SELECT user_id, field_worker_id, status, -1 AS delta FROM old_rows) d
+        CROSS JOIN LATERAL stats_task_keys(d.user_id, d.field_worker_id, d.status) k
+        GROUP BY k.scope, k.scope_id, k.key
+        HAVING SUM(d.delta) <> 0
+        ORDER BY k.scope, k.scope_id, k.key
+        ON CONFLICT (scope, scope_id, key) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backfill once, before the triggers exist, for databases that already hold data
+INSERT INTO stats_counters (scope, scope_id, key, value)
+SELECT k.scope, k.scope_id, k.key, COUNT(*)
+FROM users u
+CROSS JOIN LATERAL stats_user_keys(u.role, u.is_active, u.is_approved) k
+WHERE NOT EXISTS (SELECT 1 FROM stats_counters)
+GROUP BY k.scope, k.scope_id, k.key
+UNION ALL
+SELECT k.scope, k.scope_id, k.key, COUNT(*)
+FROM service_requests sr
+CROSS JOIN LATERAL stats_task_keys(sr.user_id, sr.field_worker_id, sr.status) k
+WHERE NOT EXISTS (SELECT 1 FROM stats_counters)
+GROUP BY k.scope, k.scope_id, k.key;
+
+DROP TRIGGER IF EXISTS users_stats_insert ON users;
+CREATE TRIGGER users_stats_insert AFTER INSERT ON users
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION stats_users_changed();
+DROP TRIGGER IF EXISTS users_stats_update ON users;
+CREATE TRIGGER users_stats_update AFTER UPDATE ON users
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION stats_users_changed();
+DROP TRIGGER IF EXISTS users_stats_delete ON users;
+CREATE TRIGGER users_stats_delete AFTER DELETE ON users
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION stats_users_changed();
+
+DROP TRIGGER IF EXISTS service_requests_stats_insert ON service_requests;
+CREATE TRIGGER service_requests_stats_insert AFTER INSERT ON service_requests
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION stats_service_requests_changed();
+DROP TRIGGER IF EXISTS service_requests_stats_update ON service_requests;
+CREATE TRIGGER service_requests_stats_update AFTER UPDATE ON service_requests
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION stats_service_requests_changed();
+DROP TRIGGER IF EXISTS service_requests_stats_delete ON service_requests;
+CREATE TRIGGER service_requests_stats_delete AFTER DELETE ON service_requests
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION stats_service_requests_changed();
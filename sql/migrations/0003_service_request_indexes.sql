@@ -0,0 +1,27 @@
+-- migrate:no-transaction
+-- Owner summaries and listings: WHERE user_id = $1 [AND status = ...]
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_service_requests_user_status
+    ON service_requests (user_id, status);
+
+-- Assigned-worker summaries and listings; unassigned tasks are not indexed
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_service_requests_worker_status
+    ON service_requests (field_worker_id, status)
+    WHERE field_worker_id IS NOT NULL;
+
+-- Admin filters by status, oldest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_service_requests_status_created
+    ON service_requests (status, created_at);
+
+-- Open work only (small relative to history): pending/assigned/in-progress queues
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_service_requests_open
+    ON service_requests (urgency, created_at)
+    WHERE status IN ('PENDING', 'ASSIGNED', 'IN_PROGRESS');
+
+-- Proof lookups in update_task_status
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_task_proofs_task_id
+    ON task_proofs (task_id);
+
+-- Assignable workers (assign-task validation)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_active_field_workers
+    ON users (id)
+    WHERE role = 'FIELD_WORKER' AND is_active = TRUE AND is_approved = TRUE;
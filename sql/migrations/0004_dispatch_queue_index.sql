@@ -0,0 +1,6 @@
+-- migrate:no-transaction
+-- Dispatch queue: unassigned PENDING tasks by urgency, then age.
+-- The expression must match URGENCY_ORDER_SQL in app/services/dispatch.py.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_service_requests_dispatch_queue
+    ON service_requests ((CASE urgency WHEN 'HIGH' THEN 0 WHEN 'MEDIUM' THEN 1 ELSE 2 END), created_at, id)
+    WHERE status = 'PENDING' AND field_worker_id IS NULL;
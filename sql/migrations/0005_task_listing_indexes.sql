@@ -0,0 +1,14 @@
+-- migrate:no-transaction
+-- Keyset pagination on (created_at, id), newest first, for each listing scope
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_service_requests_user_created
+    ON service_requests (user_id, created_at DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_service_requests_worker_created
+    ON service_requests (field_worker_id, created_at DESC, id DESC)
+    WHERE field_worker_id IS NOT NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_service_requests_created
+    ON service_requests (created_at DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_service_requests_status_created_desc
+    ON service_requests (status, created_at DESC, id DESC);
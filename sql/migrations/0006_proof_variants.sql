@@ -0,0 +1,26 @@
+-- Derived images (thumbnails, previews) per proof: {"thumb": {"path": ..., "width": ..., ...}, ...}
+ALTER TABLE task_proofs ADD COLUMN IF NOT EXISTS variants JSONB NOT NULL DEFAULT '{}'::jsonb;
+
+-- Durable work queue for the proof image pipeline. Jobs are claimed with a lease
+-- (locked_until); a job whose worker crashed is picked up again once the lease expires.
+CREATE TABLE IF NOT EXISTS proof_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    proof_id INTEGER NOT NULL REFERENCES task_proofs(id) ON DELETE CASCADE,
+    status VARCHAR(20) NOT NULL DEFAULT 'PENDING' CHECK (status IN ('PENDING', 'RUNNING', 'DONE', 'FAILED')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    run_after TIMESTAMP NOT NULL DEFAULT NOW(),
+    locked_until TIMESTAMP,
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_proof_jobs_runnable
+    ON proof_jobs (run_after)
+    WHERE status IN ('PENDING', 'RUNNING');
+
+-- Queue existing proofs
+INSERT INTO proof_jobs (proof_id)
+SELECT id FROM task_proofs
+WHERE variants = '{}'::jsonb AND image_path IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM proof_jobs);
@@ -0,0 +1,36 @@
+-- Access tokens carry role/approval claims and are authorized without a users lookup.
+-- Any change that would make those claims stale records a revocation here; tokens for
+-- that user issued at or before revoked_at fall back to the database check.
+CREATE TABLE IF NOT EXISTS token_revocations (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    reason VARCHAR(30) NOT NULL,
+    revoked_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+);
+
+-- Incremental refresh reads everything newer than the last seen revoked_at
+CREATE INDEX IF NOT EXISTS idx_token_revocations_revoked_at ON token_revocations (revoked_at);
+
+CREATE OR REPLACE FUNCTION users_revoke_tokens() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO token_revocations (user_id, reason)
+    VALUES (
+        NEW.id,
+        CASE
+            WHEN OLD.is_active IS DISTINCT FROM NEW.is_active THEN 'active_changed'
+            WHEN OLD.role IS DISTINCT FROM NEW.role THEN 'role_changed'
+            ELSE 'approval_changed'
+        END
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_revoke_tokens ON users;
+CREATE TRIGGER users_revoke_tokens
+    AFTER UPDATE OF is_active, is_approved, role ON users
+    FOR EACH ROW
+    WHEN (OLD.is_active IS DISTINCT FROM NEW.is_active
+          OR OLD.is_approved IS DISTINCT FROM NEW.is_approved
+          OR OLD.role IS DISTINCT FROM NEW.role)
+    EXECUTE FUNCTION users_revoke_tokens();
@@ -0,0 +1,30 @@
+-- Coordinates for tasks and field workers, plus a PostGIS-free spatial index:
+-- the globe is cut into GEO_CELL_DEGREES x GEO_CELL_DEGREES cells (app/services/geo.py
+-- must use the same size) and workers carry their cell id in a generated column.
+-- Nearest-worker lookups read rings of cells around the task through a btree index.
+ALTER TABLE service_requests
+    ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION CHECK (latitude BETWEEN -90 AND 90),
+    ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION CHECK (longitude BETWEEN -180 AND 180);
+
+ALTER TABLE service_requests DROP CONSTRAINT IF EXISTS service_requests_coordinates_pair;
+ALTER TABLE service_requests ADD CONSTRAINT service_requests_coordinates_pair
+    CHECK ((latitude IS NULL) = (longitude IS NULL));
+
+ALTER TABLE users
+    ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION CHECK (latitude BETWEEN -90 AND 90),
+    ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION CHECK (longitude BETWEEN -180 AND 180),
+    ADD COLUMN IF NOT EXISTS location_updated_at TIMESTAMP;
+
+-- 0.1 degree cells: 1800 rows x 3600 columns, id = row * 3600 + column
+CREATE OR REPLACE FUNCTION geo_cell(lat DOUBLE PRECISION, lon DOUBLE PRECISION) RETURNS BIGINT AS $$
+    SELECT LEAST(floor((lat + 90) / 0.1), 1799)::bigint * 3600
+         + LEAST(floor((lon + 180) / 0.1), 3599)::bigint
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+ALTER TABLE users
+    ADD COLUMN IF NOT EXISTS geo_cell BIGINT GENERATED ALWAYS AS (geo_cell(latitude, longitude)) STORED;
+
+-- Only dispatchable workers with a known position are ever searched
+CREATE INDEX IF NOT EXISTS idx_users_field_worker_geo_cell
+    ON users (geo_cell)
+    WHERE role = 'FIELD_WORKER' AND is_active = TRUE AND is_approved = TRUE AND geo_cell IS NOT NULL;
@@ -0,0 +1,53 @@
+-- migrate:no-transaction
+-- Pre-aggregated analytics (app/services/analytics.py). Dashboards read only these
+-- tables; a background job recomputes the buckets touched by service_requests rows
+-- whose updated_at moved past the stored watermark.
+--
+-- completion_sketch is a mergeable log-bucket histogram of completed_at - created_at
+-- in seconds: {"<index>": count}, index = ceil(ln(seconds) / ln(gamma)), 0 for < 1s.
+-- Sketches from any set of buckets are merged by summing counts per index, so
+-- percentiles over a date range never touch the base table.
+
+CREATE TABLE IF NOT EXISTS task_rollups_hourly (
+    bucket TIMESTAMP NOT NULL,
+    urgency VARCHAR(10) NOT NULL,
+    created BIGINT NOT NULL DEFAULT 0,          -- by created_at hour
+    completed BIGINT NOT NULL DEFAULT 0,        -- by completed_at hour, from here on
+    completion_seconds_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    completion_sketch JSONB NOT NULL DEFAULT '{}'::jsonb,
+    rated BIGINT NOT NULL DEFAULT 0,
+    rating_sum BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, urgency)
+);
+
+CREATE TABLE IF NOT EXISTS worker_rollups_daily (
+    day DATE NOT NULL,
+    field_worker_id INTEGER NOT NULL,
+    completed BIGINT NOT NULL DEFAULT 0,
+    completion_seconds_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    completion_sketch JSONB NOT NULL DEFAULT '{}'::jsonb,
+    rated BIGINT NOT NULL DEFAULT 0,
+    rating_sum BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, field_worker_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_worker_rollups_daily_worker
+    ON worker_rollups_daily (field_worker_id, day);
+
+CREATE TABLE IF NOT EXISTS analytics_watermarks (
+    name VARCHAR(50) PRIMARY KEY,
+    value TIMESTAMP NOT NULL
+);
+
+-- gamma = (1 + 0.02) / (1 - 0.02): 2% relative error; must match analytics.SKETCH_GAMMA
+CREATE OR REPLACE FUNCTION analytics_sketch_index(seconds DOUBLE PRECISION) RETURNS INTEGER AS $$
+    SELECT CASE WHEN seconds < 1 THEN 0 ELSE ceil(ln(seconds) / ln(1.02 / 0.98))::int END
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Watermark scan and completed-hour recomputes
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_service_requests_updated_at
+    ON service_requests (updated_at);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_service_requests_completed_at
+    ON service_requests (completed_at)
+    WHERE completed_at IS NOT NULL;
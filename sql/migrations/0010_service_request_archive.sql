@@ -0,0 +1,114 @@
+-- migrate:no-transaction
+-- Archive for completed service requests (app/services/archival.py).
+--
+-- service_requests keeps open work plus recently completed tasks, so its indexes and
+-- working set stay bounded. A background job moves COMPLETED tasks older than
+-- ARCHIVE_AFTER_DAYS, with their proofs, into the archive tables below. These are
+-- partitioned by the task's created_at month; the job creates partitions as needed.
+-- Summary counters are unaffected: the move sets fieldops.archiving, which the
+-- counter trigger skips. Readers that need full history (analytics rollups,
+-- include_archived listings, proof downloads) use the *_all views.
+
+CREATE TABLE IF NOT EXISTS service_requests_archive (
+    id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    field_worker_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    title VARCHAR(255) NOT NULL,
+    description TEXT,
+    location VARCHAR(255),
+    urgency VARCHAR(10),
+    status VARCHAR(20),
+    created_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP,
+    completed_at TIMESTAMP,
+    rating INTEGER,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    archived_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE INDEX IF NOT EXISTS idx_service_requests_archive_user_created
+    ON service_requests_archive (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_service_requests_archive_worker_created
+    ON service_requests_archive (field_worker_id, created_at DESC, id DESC)
+    WHERE field_worker_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_service_requests_archive_created
+    ON service_requests_archive (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_service_requests_archive_completed_at
+    ON service_requests_archive (completed_at);
+
+CREATE TABLE IF NOT EXISTS task_proofs_archive (
+    id INTEGER NOT NULL,
+    task_id INTEGER NOT NULL,
+    image_path TEXT,
+    notes TEXT,
+    uploaded_at TIMESTAMP,
+    variants JSONB NOT NULL DEFAULT '{}'::jsonb,
+    task_created_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (id, task_created_at)
+) PARTITION BY RANGE (task_created_at);
+
+CREATE INDEX IF NOT EXISTS idx_task_proofs_archive_task_id
+    ON task_proofs_archive (task_id);
+
+CREATE OR REPLACE VIEW service_requests_all AS
+    SELECT id, user_id, field_worker_id, title, description, location, urgency, status,
+           created_at, updated_at, completed_at, rating, latitude, longitude
+    FROM service_requests
+    UNION ALL
+    SELECT id, user_id, field_worker_id, title, description, location, urgency, status,
+           created_at, updated_at, completed_at, rating, latitude, longitude
+    FROM service_requests_archive;
+
+CREATE OR REPLACE VIEW task_proofs_all AS
+    SELECT id, task_id, image_path, notes, uploaded_at, variants FROM task_proofs
+    UNION ALL
+    SELECT id, task_id, image_path, notes, uploaded_at, variants FROM task_proofs_archive;
+
+-- Old completed tasks are found through this index, oldest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_service_requests_archivable
+    ON service_requests (completed_at)
+    WHERE status = 'COMPLETED';
+
+CREATE OR REPLACE FUNCTION stats_service_requests_changed() RETURNS trigger AS $$
+BEGIN
+    -- The archival job moves rows between tables; the tasks themselves don't change
+    IF current_setting('fieldops.archiving', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO stats_counters (scope, scope_id, key, value)
+        SELECT k.scope, k.scope_id, k.key, SUM(d.delta)
+        FROM (SELECT user_id, field_worker_id, status, 1 AS delta FROM new_rows) d
+        CROSS JOIN LATERAL stats_task_keys(d.user_id, d.field_worker_id, d.status) k
+        GROUP BY k.scope, k.scope_id, k.key
+        HAVING SUM(d.delta) <> 0
+        ORDER BY k.scope, k.scope_id, k.key
+        ON CONFLICT (scope, scope_id, key) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO stats_counters (scope, scope_id, key, value)
+        SELECT k.scope, k.scope_id, k.key, SUM(d.delta)
+        FROM (
+            SELECT user_id, field_worker_id, status, 1 AS delta FROM new_rows
+            UNION ALL
+            SELECT user_id, field_worker_id, status, -1 AS delta FROM old_rows
+        ) d
+        CROSS JOIN LATERAL stats_task_keys(d.user_id, d.field_worker_id, d.status) k
+        GROUP BY k.scope, k.scope_id, k.key
+        HAVING SUM(d.delta) <> 0
+        ORDER BY k.scope, k.scope_id, k.key
+        ON CONFLICT (scope, scope_id, key) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    ELSE
+        INSERT INTO stats_counters (scope, scope_id, key, value)
+        SELECT k.scope, k.scope_id, k.key, SUM(d.delta)
+        FROM (SELECT user_id, field_worker_id, status, -1 AS delta FROM old_rows) d
+        CROSS JOIN LATERAL stats_task_keys(d.user_id, d.field_worker_id, d.status) k
+        GROUP BY k.scope, k.scope_id, k.key
+        HAVING SUM(d.delta) <> 0
+        ORDER BY k.scope, k.scope_id, k.key
+        ON CONFLICT (scope, scope_id, key) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
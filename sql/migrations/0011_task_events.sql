@@ -0,0 +1,21 @@
+-- Task history: one row per status change or assignment, written in batches by the
+-- write-behind buffer in app/services/task_history.py. No foreign key to
+-- service_requests: history outlives archival and deletes, and COPY stays a plain append.
+CREATE TABLE IF NOT EXISTS task_events (
+    id BIGSERIAL PRIMARY KEY,
+    task_id INTEGER NOT NULL,
+    event_type VARCHAR(20) NOT NULL,
+    from_status VARCHAR(20),
+    to_status VARCHAR(20),
+    field_worker_id INTEGER,
+    actor_id INTEGER,
+    occurred_at TIMESTAMP NOT NULL,
+    details JSONB NOT NULL DEFAULT '{}'::jsonb
+);
+
+-- A task's timeline (time-in-state, disputes)
+CREATE INDEX IF NOT EXISTS idx_task_events_task_occurred
+    ON task_events (task_id, occurred_at);
+
+CREATE INDEX IF NOT EXISTS idx_task_events_occurred_at
+    ON task_events (occurred_at);
@@ -0,0 +1,41 @@
+-- Rollup buckets a task has left (app/services/analytics.py). The watermark scan only
+-- sees a task's current created_at/completed_at, so when a task is reopened, or its
+-- times otherwise change, the buckets it used to count in would keep the stale counts.
+-- This trigger records the old times; the next refresh recomputes those buckets too
+-- and deletes the rows in the same transaction.
+CREATE TABLE IF NOT EXISTS analytics_stale_buckets (
+    id BIGSERIAL PRIMARY KEY,
+    created_at TIMESTAMP,
+    completed_at TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION analytics_service_requests_changed() RETURNS trigger AS $$
+BEGIN
+    -- Archived rows stay visible to the rollups through service_requests_all
+    IF current_setting('fieldops.archiving', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'UPDATE' THEN
+        INSERT INTO analytics_stale_buckets (created_at, completed_at)
+        SELECT o.created_at, o.completed_at
+        FROM old_rows o
+        JOIN new_rows n ON n.id = o.id
+        WHERE n.created_at IS DISTINCT FROM o.created_at
+           OR (o.completed_at IS NOT NULL
+               AND (n.completed_at IS DISTINCT FROM o.completed_at OR n.status IS DISTINCT FROM o.status));
+    ELSE
+        INSERT INTO analytics_stale_buckets (created_at, completed_at)
+        SELECT created_at, completed_at FROM old_rows;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS service_requests_analytics_update ON service_requests;
+CREATE TRIGGER service_requests_analytics_update AFTER UPDATE ON service_requests
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION analytics_service_requests_changed();
+DROP TRIGGER IF EXISTS service_requests_analytics_delete ON service_requests;
+CREATE TRIGGER service_requests_analytics_delete AFTER DELETE ON service_requests
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION analytics_service_requests_changed();
@@ -0,0 +1,95 @@
+-- Sharded global counters. Every task or user write updates the scope_id 0 rows
+-- ('tasks' and 'users'), so with one row per key concurrent writers queued on the
+-- same row locks. Those scopes now spread over 16 rows (slots) per key, picked by
+-- backend pid: concurrent transactions run on different connections and so mostly on
+-- different rows. Readers sum the slots (app/api/v1/utils.py); a single slot can go
+-- negative when a task is counted in one slot and uncounted in another. Per-user and
+-- per-worker scopes keep a single row (slot 0); their writers rarely overlap.
+ALTER TABLE stats_counters ADD COLUMN IF NOT EXISTS slot SMALLINT NOT NULL DEFAULT 0;
+ALTER TABLE stats_counters DROP CONSTRAINT IF EXISTS stats_counters_pkey;
+ALTER TABLE stats_counters ADD PRIMARY KEY (scope, scope_id, key, slot);
+
+-- 16 slots; app code only ever sums them, so this can change without a data migration
+CREATE OR REPLACE FUNCTION stats_slot(p_scope TEXT) RETURNS SMALLINT AS $$
+    SELECT CASE WHEN p_scope IN ('tasks', 'users') THEN pg_backend_pid() % 16 ELSE 0 END::smallint
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION stats_users_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO stats_counters (scope, scope_id, key, slot, value)
+        SELECT k.scope, k.scope_id, k.key, stats_slot(k.scope), SUM(d.delta)
+        FROM (SELECT role, is_active, is_approved, 1 AS delta FROM new_rows) d
+        CROSS JOIN LATERAL stats_user_keys(d.role, d.is_active, d.is_approved) k
+        GROUP BY k.scope, k.scope_id, k.key
+        HAVING SUM(d.delta) <> 0
+        ORDER BY k.scope, k.scope_id, k.key
+        ON CONFLICT (scope, scope_id, key, slot) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO stats_counters (scope, scope_id, key, slot, value)
+        SELECT k.scope, k.scope_id, k.key, stats_slot(k.scope), SUM(d.delta)
+        FROM (
+            SELECT role, is_active, is_approved, 1 AS delta FROM new_rows
+            UNION ALL
+            SELECT role, is_active, is_approved, -1 AS delta FROM old_rows
+        ) d
+        CROSS JOIN LATERAL stats_user_keys(d.role, d.is_active, d.is_approved) k
+        GROUP BY k.scope, k.scope_id, k.key
+        HAVING SUM(d.delta) <> 0
+        ORDER BY k.scope, k.scope_id, k.key
+        ON CONFLICT (scope, scope_id, key, slot) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    ELSE
+        INSERT INTO stats_counters (scope, scope_id, key, slot, value)
+        SELECT k.scope, k.scope_id, k.key, stats_slot(k.scope), SUM(d.delta)
+        FROM (SELECT role, is_active, is_approved, -1 AS delta FROM old_rows) d
+        CROSS JOIN LATERAL stats_user_keys(d.role, d.is_active, d.is_approved) k
+        GROUP BY k.scope, k.scope_id, k.key
+        HAVING SUM(d.delta) <> 0
+        ORDER BY k.scope, k.scope_id, k.key
+        ON CONFLICT (scope, scope_id, key, slot) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION stats_service_requests_changed() RETURNS trigger AS $$
+BEGIN
+    -- The archival job moves rows between tables; the tasks themselves don't change
+    IF current_setting('fieldops.archiving', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO stats_counters (scope, scope_id, key, slot, value)
+        SELECT k.scope, k.scope_id, k.key, stats_slot(k.scope), SUM(d.delta)
+        FROM (SELECT user_id, field_worker_id, status, 1 AS delta FROM new_rows) d
+        CROSS JOIN LATERAL stats_task_keys(d.user_id, d.field_worker_id, d.status) k
+        GROUP BY k.scope, k.scope_id, k.key
+        HAVING SUM(d.delta) <> 0
+        ORDER BY k.scope, k.scope_id, k.key
+        ON CONFLICT (scope, scope_id, key, slot) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO stats_counters (scope, scope_id, key, slot, value)
+        SELECT k.scope, k.scope_id, k.key, stats_slot(k.scope), SUM(d.delta)
+        FROM (
+            SELECT user_id, field_worker_id, status, 1 AS delta FROM new_rows
+            UNION ALL
+            SELECT user_id, field_worker_id, status, -1 AS delta FROM old_rows
+        ) d
+        CROSS JOIN LATERAL stats_task_keys(d.user_id, d.field_worker_id, d.status) k
+        GROUP BY k.scope, k.scope_id, k.key
+        HAVING SUM(d.delta) <> 0
+        ORDER BY k.scope, k.scope_id, k.key
+        ON CONFLICT (scope, scope_id, key, slot) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    ELSE
+        INSERT INTO stats_counters (scope, scope_id, key, slot, value)
+        SELECT k.scope, k.scope_id, k.key, stats_slot(k.scope), SUM(d.delta)
+        FROM (SELECT user_id, field_worker_id, status, -1 AS delta FROM old_rows) d
+        CROSS JOIN LATERAL stats_task_keys(d.user_id, d.field_worker_id, d.status) k
+        GROUP BY k.scope, k.scope_id, k.key
+        HAVING SUM(d.delta) <> 0
+        ORDER BY k.scope, k.scope_id, k.key
+        ON CONFLICT (scope, scope_id, key, slot) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;